@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+"""
+Measures membership tests and prefix completion on large choice sets.
+
+Compares the indexed Choices against the plain list of strings options
+used to keep.
+
+    % python benchmarks/bench_choices.py [-n NUM]
+"""
+import argparse
+from common import timeit, print_table
+
+from creoconfig.choices import Choices
+
+
+def run(num, lookups=1000):
+    values = ['host-%06d.example.com' % i for i in range(num)]
+    step = max(1, num // lookups)
+    probes = values[::step][:lookups]
+    prefixes = [p[:-len('.example.com') - 1] for p in probes]
+    plain = list(values)
+    choices = Choices(values)
+
+    rows = []
+    for name, contains, complete in [
+            ('list', lambda v: v in plain,
+             lambda p: [v for v in plain if v.startswith(p)]),
+            ('Choices', lambda v: v in choices, choices.complete)]:
+        member = timeit(lambda: [contains(v) for v in probes], repeat=1)
+        prefix = timeit(lambda: [complete(p) for p in prefixes], repeat=1)
+        rows.append([name, '%.4f' % (member * 1000 / len(probes)),
+                     '%.4f' % (prefix * 1000 / len(prefixes))])
+    print("Choices with %d values" % num)
+    print_table(['store', 'ms/lookup', 'ms/completion'], rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('-n', '--num', type=int, default=100000,
+                        help='number of choices')
+    args = parser.parse_args()
+    run(args.num)
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+"""
+Compares file size and load time of XmlStorageBackend for each
+compression codec.
+
+    % python benchmarks/bench_compression.py [-n NUM_KEYS]
+"""
+import os
+import argparse
+from common import timeit, tempdir, populate, print_table
+
+from creoconfig import compression
+from creoconfig.storagebackend import XmlStorageBackend
+
+
+def run(num):
+    rows = []
+    plain_size = None
+    with tempdir() as path:
+        for codec in [compression.PLAIN] + compression.available_codecs():
+            filename = os.path.join(path, 'config_%s.xml' % codec)
+            populate(XmlStorageBackend(filename, compression=codec), num)
+            size = os.path.getsize(filename)
+            plain_size = plain_size or size
+            load = timeit(lambda: XmlStorageBackend(filename))
+            rows.append([codec, size, '%.1f%%' % (100.0 * size / plain_size),
+                         '%.2f' % (load * 1000)])
+    print("XmlStorageBackend with %d keys" % num)
+    print_table(['codec', 'bytes', 'ratio', 'load ms'], rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('-n', '--num', type=int, default=10000,
+                        help='number of keys to store')
+    args = parser.parse_args()
+    run(args.num)
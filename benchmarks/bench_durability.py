@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Measures write throughput under each fsync policy and checks that the
+config still parses after a crash.
+
+For every policy a child process rewrites an xml config as fast as it
+can and is killed with SIGKILL at a random moment. The file is then
+loaded again, it must parse and hold every key. The old in place write
+is included for comparison.
+
+    % python benchmarks/bench_durability.py [-n NUM] [--crashes CRASHES]
+"""
+import os
+import sys
+import time
+import random
+import signal
+import argparse
+from common import timeit, tempdir, populate, print_table
+
+from creoconfig.storagebackend import XmlStorageBackend
+
+
+class InPlaceXmlStorageBackend(XmlStorageBackend):
+    """Truncates and rewrites the live file like older versions did"""
+
+    def _replace(self):
+        return self._open('wb')
+
+
+POLICIES = [
+    ('always', XmlStorageBackend, {'fsync': 'always'}),
+    ('batched', XmlStorageBackend, {'fsync': 'batched'}),
+    ('never', XmlStorageBackend, {'fsync': 'never'}),
+    ('in place (old)', InPlaceXmlStorageBackend, {}),
+]
+
+
+def writer(cls, filename, kwargs):
+    """Runs in the child, rewrites the config until it is killed"""
+    backend = cls(filename, autosync=False, **kwargs)
+    i = 0
+    while True:
+        backend.set('key0', 'value number %d' % i)
+        backend.sync()
+        i += 1
+
+
+def crash(cls, filename, kwargs, num, max_delay):
+    """Kills a writer at a random moment, returns an error or None"""
+    pid = os.fork()
+    if pid == 0:
+        try:
+            writer(cls, filename, kwargs)
+        finally:
+            os._exit(1)
+    time.sleep(random.uniform(0, max_delay))
+    os.kill(pid, signal.SIGKILL)
+    os.waitpid(pid, 0)
+    try:
+        loaded = len(XmlStorageBackend(filename, autosync=False))
+    except RuntimeError:
+        return 'invalid xml'
+    if loaded != num:
+        return '%d of %d keys' % (loaded, num)
+    return None
+
+
+def run(num, crashes, writes):
+    if not hasattr(os, 'fork'):
+        sys.exit("This benchmark forks a writer to kill it")
+    rows = []
+    with tempdir() as path:
+        for name, cls, kwargs in POLICIES:
+            filename = os.path.join(path, 'config.xml')
+            backend = populate(cls(filename, autosync=False, **kwargs), num)
+            elapsed = timeit(lambda: backend.sync(), repeat=1, number=writes)
+            failures = []
+            for _ in range(crashes):
+                populate(cls(filename, autosync=False, **kwargs), num)
+                error = crash(cls, filename, kwargs, num, elapsed * 3)
+                if error is not None:
+                    failures.append(error)
+            for f in os.listdir(path):
+                os.remove(os.path.join(path, f))
+            rows.append([name, '%.1f' % (1 / elapsed),
+                         '%d/%d' % (crashes - len(failures), crashes),
+                         failures[0] if failures else ''])
+    print("Rewriting a config of %d keys" % num)
+    print_table(['policy', 'writes/s', 'intact', 'first failure'], rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('-n', '--num', type=int, default=200,
+                        help='number of keys')
+    parser.add_argument('--crashes', type=int, default=20,
+                        help='number of simulated crashes per policy')
+    parser.add_argument('--writes', type=int, default=10,
+                        help='number of writes timed per policy')
+    args = parser.parse_args()
+    run(args.num, args.crashes, args.writes)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""
+Compares load, get, set and sync times of the structured file backends.
+
+    % python benchmarks/bench_formats.py [-n NUM_KEYS [NUM_KEYS ...]]
+"""
+import os
+import argparse
+from common import timeit, tempdir, populate, print_table
+
+from creoconfig.storagebackend import (
+    ConfigParserStorageBackend,
+    JsonStorageBackend,
+    XmlStorageBackend,
+    json
+)
+
+
+BACKENDS = [
+    ('xml', XmlStorageBackend),
+    ('ini', ConfigParserStorageBackend),
+    ('json', JsonStorageBackend),
+]
+
+
+def measure(cls, filename, num):
+    populate(cls(filename), num)
+    load = timeit(lambda: cls(filename))
+    s = cls(filename, autosync=False)
+    keys = ['key%d' % i for i in range(0, num, max(1, num // 100))]
+    get = timeit(lambda: [s.get(k) for k in keys]) / len(keys)
+    setitem = timeit(lambda: [s.set(k, 'new value') for k in keys]) / len(keys)
+    sync = timeit(s.sync)
+    return [os.path.getsize(filename), load, get, setitem, sync]
+
+
+def run(sizes):
+    print("json codec: %s" % json.__name__)
+    rows = []
+    with tempdir() as path:
+        for num in sizes:
+            for name, cls in BACKENDS:
+                filename = os.path.join(path, '%s_%d.%s' % (name, num, name))
+                size, load, get, setitem, sync = measure(cls, filename, num)
+                rows.append([name, num, size] + ['%.4f' % (t * 1000) for t in
+                            (load, get, setitem, sync)])
+    print_table(['backend', 'keys', 'bytes', 'load ms', 'get ms', 'set ms',
+                 'sync ms'], rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('-n', '--num', type=int, nargs='+',
+                        default=[100, 1000, 10000],
+                        help='number of keys to store')
+    args = parser.parse_args()
+    run(args.num)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+Measures the startup cost of a short lived process using creoconfig.
+
+Each snippet runs in a fresh interpreter. With python 3.7 or newer the
+cumulative import time reported by `python -X importtime` is shown too.
+
+    % python benchmarks/bench_import.py [-r REPEAT]
+"""
+import re
+import sys
+import argparse
+import subprocess
+from common import timeit, print_table
+
+
+SNIPPETS = [
+    ('interpreter', 'pass'),
+    ('mem config', 'from creoconfig import Config; Config().key = 1'),
+    ('xml config', 'from creoconfig import Config; '
+                   'Config("xml://bench_import.xml?autosync=false").key = 1'),
+    ('eager imports', 'import readline, ConfigParser, hmac, hashlib; '
+                      'import xml.dom.minidom, xml.etree.cElementTree'),
+]
+if sys.version_info[0] > 2:
+    SNIPPETS[-1] = ('eager imports', 'import readline, configparser, hmac, '
+                    'hashlib, xml.dom.minidom, xml.etree.ElementTree')
+
+
+def import_time(code):
+    """Returns the cumulative import time in us from -X importtime"""
+    proc = subprocess.Popen([sys.executable, '-X', 'importtime', '-c', code],
+                            stderr=subprocess.PIPE, stdout=subprocess.PIPE)
+    _, err = proc.communicate()
+    total = 0
+    for line in err.decode().splitlines():
+        match = re.match(r'import time:\s+\d+ \|\s+(\d+) \|\s{1,2}(\S+)', line)
+        if match:
+            total += int(match.group(1))
+    return total
+
+
+def run(repeat):
+    importtime = sys.version_info >= (3, 7)
+    rows = []
+    for name, code in SNIPPETS:
+        elapsed = timeit(lambda: subprocess.check_call(
+            [sys.executable, '-c', code]), repeat=repeat)
+        row = [name, '%.1f' % (elapsed * 1000)]
+        if importtime:
+            row.append('%.1f' % (import_time(code) / 1000.0))
+        rows.append(row)
+    headers = ['snippet', 'wall ms']
+    if importtime:
+        headers.append('import ms')
+    print_table(headers, rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('-r', '--repeat', type=int, default=10,
+                        help='number of runs, the best is reported')
+    args = parser.parse_args()
+    run(args.repeat)
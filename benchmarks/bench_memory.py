@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Measures the memory used per key by the storage backends.
+
+A config with NUM keys is written once, then every backend loads it in a
+fresh interpreter which reports the growth of its resident set size.
+
+    % python benchmarks/bench_memory.py [-n NUM]
+"""
+import os
+import sys
+import argparse
+import subprocess
+from common import tempdir, populate, print_table
+
+from creoconfig.registry import open_backend
+
+
+BACKENDS = [
+    ('xml', 'config.xml'),
+    ('json', 'config.json'),
+    ('multiini', 'config.ini'),
+]
+
+# Runs in the child process, prints the RSS growth in bytes
+MEASURE = '''
+import sys
+sys.path.insert(0, %(root)r)
+import gc
+from creoconfig.registry import open_backend
+
+
+def rss():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * %(pagesize)d
+
+# Import the parsers before measuring
+open_backend(%(empty)r)
+gc.collect()
+before = rss()
+backend = open_backend(%(uri)r)
+assert len(backend) == %(num)d
+gc.collect()
+print(rss() - before)
+'''
+
+
+def measure(uri, empty, num):
+    code = MEASURE % {'root': os.path.realpath('.'), 'uri': uri,
+                      'empty': empty, 'num': num,
+                      'pagesize': os.sysconf('SC_PAGE_SIZE')}
+    output = subprocess.check_output([sys.executable, '-c', code])
+    return int(output.strip())
+
+
+def run(num):
+    if not os.path.exists('/proc/self/statm'):
+        sys.exit("This benchmark reads the RSS from /proc/self/statm")
+    rows = []
+    with tempdir() as path:
+        for scheme, name in BACKENDS:
+            uri = '%s://%s' % (scheme, os.path.join(path, name))
+            empty = '%s://%s' % (scheme, os.path.join(path, 'empty_' + name))
+            populate(open_backend(uri), num)
+            growth = measure(uri, empty, num)
+            rows.append([scheme, '%.1f' % (growth / 1024.0 / 1024),
+                         '%d' % (growth / num)])
+    print("Resident memory after loading %d keys" % num)
+    print_table(['backend', 'MiB', 'bytes/key'], rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('-n', '--num', type=int, default=100000,
+                        help='number of keys')
+    args = parser.parse_args()
+    run(args.num)
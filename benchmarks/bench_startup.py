@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+"""
+Measures the time to create a file backed Config with many defaults.
+
+Compares the in memory defaults overlay against writing every default
+to the backend the way Config used to do it on construction.
+
+    % python benchmarks/bench_startup.py [-n NUM_DEFAULTS]
+"""
+import os
+import argparse
+from common import timeit, tempdir, print_table
+
+from creoconfig import Config
+
+
+def overlay(filename, defaults):
+    Config(filename, defaults=defaults)
+
+
+def write_each(filename, defaults):
+    c = Config(filename)
+    for k, v in defaults.iteritems():
+        c[k] = v
+
+
+def run(num):
+    defaults = dict(('key%d' % i, 'value %d' % i) for i in range(num))
+    rows = []
+    with tempdir() as path:
+        for name, func in [('write each default', write_each),
+                           ('defaults overlay', overlay)]:
+            filename = os.path.join(path, '%s.xml' % func.__name__)
+            elapsed = timeit(lambda: func(filename, defaults), repeat=1)
+            rows.append([name, '%.2f' % (elapsed * 1000)])
+    print("Config startup with %d defaults" % num)
+    print_table(['method', 'ms'], rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('-n', '--num', type=int, default=300,
+                        help='number of defaults')
+    args = parser.parse_args()
+    run(args.num)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""
+Measures what tracing costs a Config read.
+
+Reads are timed before any hook was registered, while a hook is
+registered and again after it was removed. The disabled rows should match
+since removing the last hook puts the original methods back. The eager
+debug message every accessor used to format is timed for comparison.
+
+    % python benchmarks/bench_tracing.py [-n NUM]
+"""
+import logging
+import argparse
+from common import timeit, print_table
+
+from creoconfig import Config, tracing
+
+
+logger = logging.getLogger('creoconfig.config')
+
+
+def run(num):
+    c = Config()
+    for i in range(100):
+        c['key%d' % i] = 'value number %d' % i
+    keys = ['key%d' % (i % 100) for i in range(num)]
+
+    def reads():
+        for key in keys:
+            c[key]
+
+    def eager_reads():
+        for key in keys:
+            logger.debug("Config.__getitem__(%s)" % key)
+            c[key]
+
+    def hook(span):
+        pass
+
+    rows = [('disabled, never enabled', timeit(reads, repeat=5))]
+    with tracing.traced(hook):
+        rows.append(('one hook registered', timeit(reads, repeat=5)))
+    rows.append(('disabled, after removing it', timeit(reads, repeat=5)))
+    rows.append(('eager debug formatting', timeit(eager_reads, repeat=5)))
+    print("%d reads of a Config" % num)
+    print_table(['tracing', 'us/read', 'relative'], [
+        [name, '%.3f' % (t * 1e6 / num), '%.2fx' % (t / rows[0][1])]
+        for name, t in rows])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('-n', '--num', type=int, default=100000,
+                        help='number of reads')
+    args = parser.parse_args()
+    run(args.num)
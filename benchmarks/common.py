@@ -0,0 +1,64 @@
+"""
+Helpers shared by the creoconfig benchmark scripts
+
+The benchmarks are run from the repository root, for example:
+
+    % python benchmarks/bench_compression.py
+"""
+import os
+import sys
+import time
+import shutil
+import logging
+import tempfile
+import contextlib
+sys.path.append(os.path.realpath('.'))
+logging.basicConfig(level=logging.ERROR)
+
+
+def timeit(func, repeat=3, number=1):
+    """Returns the best time in seconds of `repeat` runs of `func`"""
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        for _ in range(number):
+            func()
+        elapsed = (time.time() - start) / number
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+@contextlib.contextmanager
+def tempdir():
+    """Creates a scratch directory which is removed afterwards"""
+    path = tempfile.mkdtemp(prefix='creoconfig_bench_')
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def populate(backend, num, prefix='key'):
+    """Fills `backend` with `num` keys and writes it once"""
+    autosync = getattr(backend, 'autosync', None)
+    if autosync:
+        backend.autosync = False
+    for i in range(num):
+        backend.set('%s%d' % (prefix, i), 'value number %d' % i)
+    if autosync is not None:
+        backend.sync()
+        backend.autosync = autosync
+    return backend
+
+
+def print_table(headers, rows):
+    """Prints `rows` as a simple aligned text table"""
+    rows = [[str(c) for c in row] for row in rows]
+    widths = [max([len(str(h))] + [len(r[i]) for r in rows])
+              for i, h in enumerate(headers)]
+    fmt = '  '.join('%%-%ds' % w for w in widths)
+    print(fmt % tuple(headers))
+    print(fmt % tuple('-' * w for w in widths))
+    for row in rows:
+        print(fmt % tuple(row))
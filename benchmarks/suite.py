@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+"""
+Measures how the storage backends scale with the number of keys.
+
+    % python benchmarks/suite.py --save benchmarks/baselines/local.json
+    % python benchmarks/suite.py --compare benchmarks/baselines/local.json
+
+With `--compare` the run fails when an operation is slower than the
+baseline by more than `--threshold` (a fraction, 0.25 is 25% slower).
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+from common import timeit, tempdir, populate, print_table
+
+from creoconfig.storagebackend import (
+    MemStorageBackend,
+    ConfigParserStorageBackend,
+    JsonStorageBackend,
+    XmlStorageBackend
+)
+
+
+BACKENDS = {
+    'mem': MemStorageBackend,
+    'ini': ConfigParserStorageBackend,
+    'xml': XmlStorageBackend,
+    'json': JsonStorageBackend,
+}
+
+OPERATIONS = ['load', 'get', 'set', 'delete', 'iter', 'len', 'sync',
+              'last_modified']
+
+# Timings below this many seconds are too noisy to compare
+MIN_TIME = 1e-5
+
+
+def open_backend(name, filename, data):
+    """Opens a backend, memory backends are filled from `data` instead"""
+    if name == 'mem':
+        backend = MemStorageBackend()
+        backend.store = dict(data)
+        return backend
+    return BACKENDS[name](filename, autosync=False)
+
+
+def bench_backend(name, filename, num, sample):
+    """Returns the time in seconds of each operation
+
+    `get`, `set`, `delete` and `last_modified` are the average of a single
+    call on `sample` keys, the other operations are timed as a whole.
+    """
+    cls = BACKENDS[name]
+    if name == 'mem':
+        data = dict(populate(MemStorageBackend(), num).store)
+    else:
+        data = None
+        populate(cls(filename), num)
+    keys = ['key%d' % i for i in range(0, num, max(1, num // sample))]
+    s = open_backend(name, filename, data)
+
+    results = {}
+    results['load'] = timeit(lambda: open_backend(name, filename, data))
+    results['get'] = timeit(lambda: [s.get(k) for k in keys]) / len(keys)
+    results['last_modified'] = timeit(
+        lambda: [s.last_modified(k) for k in keys]) / len(keys)
+    results['iter'] = timeit(lambda: list(iter(s)))
+    results['len'] = timeit(lambda: len(s))
+    results['set'] = timeit(
+        lambda: [s.set(k, 'new value') for k in keys]) / len(keys)
+    results['delete'] = timeit(
+        lambda: [s.delete(k) for k in keys], repeat=1) / len(keys)
+    results['sync'] = timeit(s.sync) if name != 'mem' else 0.0
+    return results
+
+
+def run(backends, sizes, sample):
+    results = {}
+    with tempdir() as path:
+        for name in backends:
+            results[name] = {}
+            for num in sizes:
+                filename = os.path.join(path, '%s_%d.%s' % (name, num, name))
+                results[name][str(num)] = bench_backend(
+                    name, filename, num, sample)
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'time': time.time(),
+            'sample': sample,
+        },
+        'results': results,
+    }
+
+
+def report(results):
+    rows = []
+    for name in sorted(results):
+        for num in sorted(results[name], key=int):
+            ops = results[name][num]
+            rows.append([name, num] + ['%.4f' % (ops[op] * 1000)
+                                       for op in OPERATIONS])
+    print_table(['backend', 'keys'] + ['%s ms' % op for op in OPERATIONS],
+                rows)
+
+
+def compare(results, baseline, threshold):
+    """Prints the changes against `baseline` and returns the regressions"""
+    rows = []
+    regressions = []
+    for name in sorted(results):
+        for num in sorted(results[name], key=int):
+            for op in OPERATIONS:
+                try:
+                    old = baseline[name][num][op]
+                except KeyError:
+                    continue
+                new = results[name][num][op]
+                if max(old, new) < MIN_TIME:
+                    continue
+                ratio = new / old if old else float('inf')
+                regressed = ratio > 1 + threshold
+                if regressed:
+                    regressions.append((name, num, op, ratio))
+                rows.append([name, num, op, '%.4f' % (old * 1000),
+                             '%.4f' % (new * 1000), '%.2fx' % ratio,
+                             'REGRESSION' if regressed else ''])
+    print_table(['backend', 'keys', 'op', 'base ms', 'new ms', 'ratio', ''],
+                rows)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip(),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-b', '--backend', nargs='+', choices=sorted(BACKENDS),
+                        default=sorted(BACKENDS), help='backends to measure')
+    parser.add_argument('-n', '--sizes', type=int, nargs='+',
+                        default=[10, 100, 1000, 10000, 100000],
+                        help='number of keys to measure with')
+    parser.add_argument('--sample', type=int, default=100,
+                        help='number of keys used for single key operations')
+    parser.add_argument('--save', metavar='FILE',
+                        help='store the results as a json baseline')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='compare the results against a json baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed slowdown before failing a comparison')
+    args = parser.parse_args(argv)
+
+    data = run(args.backend, args.sizes, args.sample)
+    report(data['results'])
+
+    if args.save:
+        dirname = os.path.dirname(args.save)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        with open(args.save, 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        print("Saved baseline to %s" % args.save)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        print("")
+        regressions = compare(data['results'], baseline, args.threshold)
+        if regressions:
+            print("\n%d operations regressed by more than %d%%" % (
+                len(regressions), args.threshold * 100))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
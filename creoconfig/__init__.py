@@ -3,9 +3,13 @@ creoconfig
 """
 import exceptions
 from config import Config
+from configdiff import diff, ConfigDiff
+from registry import register_backend, open_backend, open_shared
 
 
-__all__ = ['creoconfig', 'exceptions', 'storagebackend']
+__all__ = ['creoconfig', 'exceptions', 'storagebackend', 'Config',
+           'diff', 'ConfigDiff', 'register_backend', 'open_backend',
+           'open_shared']
 
 __title__ = 'creoconfig'
 __version__ = '0.2.0'
@@ -0,0 +1,4 @@
+import sys
+from creoconfig.cli import main
+
+sys.exit(main())
@@ -0,0 +1,209 @@
+"""
+Choices
+
+The allowed values of an option. Membership is a set lookup and the
+values are also kept sorted so completing a prefix is a binary search
+followed by a walk over the matches only.
+
+Choices can also come from a provider, a callable or generator which is
+only run the first time the choices are used. Its result is memoized per
+provider so options sharing a provider only compute it once.
+"""
+import time
+import bisect
+import weakref
+import threading
+
+
+class Choices(object):
+    """Allowed values of an option, stored as strings"""
+
+    def __init__(self, values=()):
+        self.ordered = []
+        self.values = set()
+        # Types of the values before they were converted to strings
+        self.types = set()
+        for value in values:
+            self.types.add(type(value))
+            value = str(value)
+            if value not in self.values:
+                self.values.add(value)
+                self.ordered.append(value)
+        self.sorted = sorted(self.values)
+
+    def __contains__(self, value):
+        try:
+            return value in self.values
+        except TypeError:
+            return False
+
+    def __iter__(self):
+        return iter(self.ordered)
+
+    def __len__(self):
+        return len(self.ordered)
+
+    def __eq__(self, other):
+        if isinstance(other, Choices):
+            return self.ordered == other.ordered
+        return self.ordered == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def complete(self, prefix, limit=None):
+        """Returns the sorted choices starting with `prefix`"""
+        choices = self.sorted
+        i = bisect.bisect_left(choices, prefix)
+        matches = []
+        while i < len(choices) and choices[i].startswith(prefix):
+            matches.append(choices[i])
+            if limit is not None and len(matches) >= limit:
+                break
+            i += 1
+        return matches
+
+    def summary(self, limit=10):
+        """Returns the first `limit` choices followed by the count of the
+        remaining ones"""
+        if len(self.ordered) <= limit:
+            return ', '.join(self.ordered)
+        return '%s, ... (%d more)' % (', '.join(self.ordered[:limit]),
+                                      len(self.ordered) - limit)
+
+    def __repr__(self):
+        return '[%s]' % self.summary()
+
+
+class Completer(object):
+    """readline completer offering the choices matching the typed text"""
+
+    def __init__(self, choices):
+        self.choices = choices
+        self.text = None
+        self.matches = []
+
+    def __call__(self, text, state):
+        if text != self.text:
+            self.text = text
+            self.matches = self.choices.complete(text)
+        if state < len(self.matches):
+            return self.matches[state]
+        return None
+
+
+class _Provided(object):
+    """Memoized choices of one provider, computed under its own lock"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.choices = None
+        self.expires = None
+
+
+# Memoized choices of every provider, keyed by a weak reference so they
+# are dropped with the provider
+_provided = {}
+_provided_lock = threading.Lock()
+
+
+def _provider_key(provider, forget=None):
+    """A bound method is created on every attribute access, it is keyed by
+    its instance and function instead"""
+    im_self = getattr(provider, 'im_self', None)
+    try:
+        if im_self is not None:
+            return (weakref.ref(im_self, forget), provider.im_func)
+        return weakref.ref(provider, forget)
+    except TypeError:
+        # Builtins can not be referenced weakly, they are kept
+        return provider
+
+
+def _entry(provider):
+    key = _provider_key(provider)
+    with _provided_lock:
+        entry = _provided.get(key)
+        if entry is None:
+            stored = []
+            # Runs when the provider is collected, a dict pop needs no lock
+            forget = lambda ref: _provided.pop(stored[0], None)
+            stored.append(_provider_key(provider, forget))
+            entry = _provided[stored[0]] = _Provided()
+    return entry
+
+
+def provided_choices(provider, ttl=None):
+    """Returns the Choices of `provider` computing them only if required
+
+    The result is kept until it is `ttl` seconds old, forever if ttl is
+    None. A generator can only be consumed once so its result never
+    expires. Concurrent callers wait for a single computation.
+    """
+    entry = _entry(provider)
+    with entry.lock:
+        now = time.time()
+        if entry.choices is not None and (entry.expires is None or
+                                          entry.expires > now):
+            return entry.choices
+        if callable(provider):
+            entry.choices = Choices(provider())
+            entry.expires = None if ttl is None else now + ttl
+        else:
+            entry.choices = Choices(provider)
+            entry.expires = None
+        return entry.choices
+
+
+def clear_provided_choices():
+    """Forgets the memoized choices of every provider"""
+    with _provided_lock:
+        _provided.clear()
+
+
+class LazyChoices(object):
+    """
+    Choices computed by `provider` on first use.
+
+    `check` is called with the Choices whenever a new result is computed,
+    it can raise to reject them.
+    """
+    def __init__(self, provider, ttl=None, check=None):
+        self.provider = provider
+        self.ttl = ttl
+        self.check = check
+        self._checked = None
+
+    def resolve(self):
+        choices = provided_choices(self.provider, self.ttl)
+        if choices is not self._checked:
+            if self.check is not None:
+                self.check(choices)
+            self._checked = choices
+        return choices
+
+    def __contains__(self, value):
+        return value in self.resolve()
+
+    def __iter__(self):
+        return iter(self.resolve())
+
+    def __len__(self):
+        return len(self.resolve())
+
+    def __eq__(self, other):
+        return self.resolve() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def complete(self, prefix, limit=None):
+        return self.resolve().complete(prefix, limit)
+
+    def summary(self, limit=10):
+        return self.resolve().summary(limit)
+
+    def __repr__(self):
+        if self._checked is None:
+            return '<choices from %r>' % (self.provider,)
+        return repr(self._checked)
@@ -0,0 +1,221 @@
+"""
+Command line interface
+
+    % python -m creoconfig settings.xml set db_host localhost
+    % python -m creoconfig settings.xml get db_host
+    localhost
+    % python -m creoconfig json://settings.json apply changes.txt
+
+`apply` reads one operation per line from a file or stdin and runs all of
+them with a single load and a single write of the config:
+
+    set db_host localhost
+    set motd "hello world"
+    delete old_key
+    get db_host
+
+Only the backend named by the config URI is imported.
+"""
+import sys
+import logging
+from config import deferred_sync
+from registry import open_backend, parse_uri
+
+
+logger = logging.getLogger(__name__)
+
+
+class CliError(Exception):
+    pass
+
+
+def _get(backend, key, default=None):
+    try:
+        return backend.get(key)
+    except KeyError:
+        if default is not None:
+            return default
+        raise CliError("key '%s' was not found" % key)
+
+
+def _delete(backend, key):
+    try:
+        backend.delete(key)
+    except KeyError:
+        raise CliError("key '%s' was not found" % key)
+
+
+def _save(backend):
+    if getattr(backend, 'dirty', False):
+        backend.sync()
+
+
+def cmd_get(backend, args, stdin, stdout):
+    stdout.write('%s\n' % _get(backend, args.key, args.default))
+
+
+def cmd_set(backend, args, stdin, stdout):
+    backend.set(args.key, args.value)
+    _save(backend)
+
+
+def cmd_delete(backend, args, stdin, stdout):
+    _delete(backend, args.key)
+    _save(backend)
+
+
+def cmd_dump(backend, args, stdin, stdout):
+    import streaming
+    streaming.export(backend.iteritems(), stdout, args.format)
+
+
+def parse_operation(line):
+    """Returns the `(op, args)` of one line of an apply script or None"""
+    import shlex
+    try:
+        words = shlex.split(line, comments=True)
+    except ValueError, msg:
+        raise CliError("invalid line %r: %s" % (line, msg))
+    if not words:
+        return None
+    op, args = words[0].lower(), words[1:]
+    expected = {'get': 1, 'set': 2, 'delete': 1}.get(op)
+    if expected is None:
+        raise CliError("unknown operation '%s'" % op)
+    if len(args) != expected:
+        raise CliError("'%s' takes %d argument%s: %r" % (
+            op, expected, 's' if expected > 1 else '', line.strip()))
+    return op, args
+
+
+def read_script(f):
+    """Returns the operations of an apply script, checking every line"""
+    operations = []
+    for lineno, line in enumerate(f, 1):
+        try:
+            operation = parse_operation(line)
+        except CliError, msg:
+            raise CliError("line %d: %s" % (lineno, msg))
+        if operation is not None:
+            operations.append(operation)
+    return operations
+
+
+def check_operations(backend, operations):
+    """Raises CliError if an operation reads or deletes a key which does
+    not exist at that point of the script"""
+    exists = {}
+    for i, (op, words) in enumerate(operations, 1):
+        key = words[0]
+        if op == 'set':
+            exists[key] = True
+            continue
+        found = exists[key] if key in exists else key in backend
+        if not found:
+            raise CliError("operation %d: key '%s' was not found" % (i, key))
+        if op == 'delete':
+            exists[key] = False
+
+
+def cmd_apply(backend, args, stdin, stdout):
+    if args.script == '-':
+        operations = read_script(stdin)
+    else:
+        with open(args.script) as f:
+            operations = read_script(f)
+    # The whole script is checked before anything is changed
+    check_operations(backend, operations)
+    with deferred_sync(backend):
+        for op, words in operations:
+            if op == 'get':
+                stdout.write('%s\n' % _get(backend, *words))
+            elif op == 'set':
+                backend.set(*words)
+            else:
+                _delete(backend, *words)
+    _save(backend)
+    logger.info("Applied %d operations", len(operations))
+
+
+def cmd_fsck(backend, args, stdin, stdout):
+    from fsck import fsck
+    scheme, path, options = parse_uri(args.config)
+    if scheme.lower() != 'xml' or not path:
+        raise CliError("fsck only checks xml configs, not '%s'" %
+                       args.config)
+    report = fsck(path, repair=args.repair,
+                  compression=options.get('compression'))
+    stdout.write('%s\n' % report)
+    if not report.ok and not args.repair:
+        return 1
+
+
+def cmd_edit(backend, args, stdin, stdout):
+    from config import Config
+    from config_gui import edit
+    edit(Config(backend=backend, batch=True), rows=args.rows)
+
+
+def build_parser():
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='creoconfig', description='Reads and changes creoconfig files.')
+    parser.add_argument('config', help="config file or backend URI such as "
+                                       "'json://settings.json'")
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='log what is being done')
+    commands = parser.add_subparsers(title='commands')
+
+    p = commands.add_parser('get', help='print the value of a key')
+    p.add_argument('key')
+    p.add_argument('-d', '--default', help='printed if the key is not set')
+    p.set_defaults(func=cmd_get)
+
+    p = commands.add_parser('set', help='store the value of a key')
+    p.add_argument('key')
+    p.add_argument('value')
+    p.set_defaults(func=cmd_set)
+
+    p = commands.add_parser('delete', help='remove a key')
+    p.add_argument('key')
+    p.set_defaults(func=cmd_delete)
+
+    p = commands.add_parser('dump', help='write every key to stdout')
+    p.add_argument('-f', '--format', default='jsonl',
+                   choices=['jsonl', 'xml', 'ini'])
+    p.set_defaults(func=cmd_dump)
+
+    p = commands.add_parser('apply', help='run the get, set and delete '
+                            'operations of a script with a single write')
+    p.add_argument('script', nargs='?', default='-',
+                   help="file with one operation per line, '-' for stdin")
+    p.set_defaults(func=cmd_apply)
+
+    p = commands.add_parser('edit', help='open the graphical editor')
+    p.add_argument('--rows', type=int, default=25,
+                   help='number of keys shown at once')
+    p.set_defaults(func=cmd_edit)
+
+    p = commands.add_parser('fsck', help='check an xml config for '
+                            'duplicate and orphaned entries')
+    p.add_argument('-r', '--repair', action='store_true',
+                   help='rewrite the file without them')
+    p.set_defaults(func=cmd_fsck, backend=False)
+    return parser
+
+
+def main(argv=None, stdin=None, stdout=None):
+    """Runs the command line tool and returns its exit status"""
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else
+                        logging.WARNING)
+    backend = None
+    if getattr(args, 'backend', True):
+        backend = open_backend(args.config)
+    try:
+        return args.func(backend, args, stdin, stdout) or 0
+    except CliError, msg:
+        sys.stderr.write('creoconfig: %s\n' % msg)
+        return 1
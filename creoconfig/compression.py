@@ -0,0 +1,82 @@
+"""
+Compression
+
+Transparent compression support for the file based storage backends.
+Compressed files are detected by their magic bytes when reading and by
+their file extension when a new file is written.
+"""
+import os
+from lazyimport import LazyModule, is_available
+
+bz2 = LazyModule('bz2')
+gzip = LazyModule('gzip')
+lzma = LazyModule('lzma', 'backports.lzma')
+
+
+# Codec name used for files which are stored without compression
+PLAIN = 'plain'
+
+# Magic bytes at the start of a file for each supported codec
+MAGIC = {
+    'gzip': b'\x1f\x8b',
+    'bz2': b'BZh',
+    'lzma': b'\xfd7zXZ\x00',
+}
+
+EXTENSIONS = {
+    '.gz': 'gzip',
+    '.gzip': 'gzip',
+    '.bz2': 'bz2',
+    '.xz': 'lzma',
+    '.lzma': 'lzma',
+}
+
+
+def available_codecs():
+    """Returns the codecs which can be used in this python installation"""
+    codecs = ['gzip', 'bz2']
+    if is_available(lzma):
+        codecs.append('lzma')
+    return codecs
+
+
+def detect(filename):
+    """Returns the codec the file was compressed with or None"""
+    with open(filename, 'rb') as f:
+        header = f.read(max(len(m) for m in MAGIC.values()))
+    for codec, magic in MAGIC.items():
+        if header.startswith(magic):
+            return codec
+    return None
+
+
+def codec_for_extension(filename):
+    """Returns the codec implied by the extension of `filename` or None"""
+    return EXTENSIONS.get(os.path.splitext(filename)[1].lower())
+
+
+def open_file(filename, mode='rb', codec=None):
+    """Opens `filename` and transparently (de)compresses its content
+
+    When reading without a `codec` the magic bytes of the file are used
+    to find the codec. When writing the extension of the file is used.
+    Pass `PLAIN` as the codec to disable compression.
+    Decompression is streamed so the content is never held in memory twice.
+    """
+    if codec is None:
+        if 'r' in mode:
+            codec = detect(filename)
+        else:
+            codec = codec_for_extension(filename)
+    if codec in (None, PLAIN):
+        return open(filename, mode)
+    if codec == 'gzip':
+        return gzip.GzipFile(filename, mode)
+    if codec == 'bz2':
+        return bz2.BZ2File(filename, mode)
+    if codec == 'lzma':
+        if not is_available(lzma):
+            raise RuntimeError("lzma compression requires the 'lzma' or "
+                               "'backports.lzma' module.")
+        return lzma.LZMAFile(filename, mode)
+    raise ValueError("Unknown compression codec '%s'" % codec)
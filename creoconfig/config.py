@@ -4,17 +4,36 @@ creoconfig
 Allows the central control and management of applications via
 a centralized configuration management system.
 """
+import os
 import re
+import time
 import logging
+import contextlib
 import collections
-import configobject
-from exceptions import BatchModeUnableToPrompt
-from storagebackend import MemStorageBackend, XmlStorageBackend
+from exceptions import BatchModeUnableToPrompt, IllegalArgumentError
+from registry import open_backend, open_shared
 
 
 logger = logging.getLogger(__name__)
 
 
+@contextlib.contextmanager
+def _undeferred(backend):
+    yield backend
+
+
+def deferred_sync(backend):
+    """Returns the `deferred_sync` block of `backend`
+
+    Backends without one, like the ones added with `register_backend`,
+    get a block which does nothing and write every change as it is made.
+    """
+    deferred = getattr(backend, 'deferred_sync', None)
+    if deferred is None:
+        return _undeferred(backend)
+    return deferred()
+
+
 # This is a global environment settings attribute dictionary
 # it is used for storing all config information once read in.
 class Config(collections.MutableMapping):
@@ -23,15 +42,33 @@ class Config(collections.MutableMapping):
     it is used for storing all config information once read in.
     """
 
-    def __init__(self, filename=None, defaults={}, batch=False, *args, **kwargs):
+    def __init__(self, filename=None, defaults={}, batch=False, backend=None,
+                 history=None, history_age=None, shared=False,
+                 env_prefix=None, env_override=True, *args, **kwargs):
         """Defined the config variables and their validation methods
 
         filename - if you wish the configuration to persist specify save location
+            This can also be a backend URI such as 'json://settings.json'
+            or 'mem://', see `registry.open_backend`.
+        defaults - values used for keys which are not found in the backend.
+            These are kept in memory and only written with `save_defaults`.
+        backend - storage backend instance to use instead of `filename`
+        history - number of previous versions to keep for every key, which
+            enables `history` and `get(key, as_of=...)`. File backends keep
+            the history in a '.history' file next to the config.
+        history_age - drop versions older than this many seconds
+        shared - use the backend shared by every other shared Config of
+            the same file in this process, see `registry.open_shared`.
+        env_prefix - take values from the environment variables starting
+            with this prefix, 'APP_' maps APP_DB_HOST to the key db_host.
+            The environment is read once, see `refresh_env`.
+        env_override - environment values take precedence over the
+            backend, otherwise they are only used for keys it does not have.
         """
-        if filename is None:
-            backend = MemStorageBackend()
-        else:
-            backend = XmlStorageBackend(filename)
+        if backend is None and shared:
+            backend = open_shared(filename or 'mem://')
+        elif backend is None:
+            backend = open_backend(filename or 'mem://')
         super(Config, self).__setattr__('_store', backend)
         super(Config, self).__setattr__('_isbatch', batch)
         # Store the variables which have a help menu. When one of these
@@ -39,9 +76,50 @@ class Config(collections.MutableMapping):
         # If batch mode is enabled then an Exception will be thrown
         super(Config, self).__setattr__('_available_keywords', [])
 
-        # add the defaults if any were specified
-        for k, v in defaults.iteritems():
-            self._set(k, v)
+        # Defaults are a fallback overlay on top of the backend. Values are
+        # stored as strings just like the backend would return them.
+        super(Config, self).__setattr__(
+            '_defaults', dict((k, str(v)) for k, v in defaults.iteritems()))
+        # Created by the first `subscribe` so writes stay cheap without
+        # any subscribers.
+        super(Config, self).__setattr__('_subscriptions', None)
+
+        if history:
+            from history import KeyHistory
+            path = getattr(backend, 'filename', None)
+            history = KeyHistory(
+                path=path + '.history' if path else None,
+                max_versions=10 if history is True else int(history),
+                max_age=history_age)
+        else:
+            history = None
+        super(Config, self).__setattr__('_history', history)
+
+        # Only created once a key has an expiry so reads of configs
+        # without any stay free of the check.
+        expiries = getattr(backend, 'expiries', dict)()
+        if expiries:
+            from expiry import ExpirySchedule
+            expiries = ExpirySchedule(expiries)
+        super(Config, self).__setattr__('_expiry', expiries or None)
+        super(Config, self).__setattr__('_reaper', None)
+
+        super(Config, self).__setattr__('_env_prefix', env_prefix)
+        super(Config, self).__setattr__('_env_override', env_override)
+        super(Config, self).__setattr__('_env', None)
+        if env_prefix:
+            self.refresh_env()
+
+    def save_defaults(self):
+        """Writes the defaults which are not stored yet to the backend
+
+        All of the values are written with a single sync of the backend.
+        """
+        with deferred_sync(self._store):
+            for k, v in self._defaults.iteritems():
+                if k not in self._store:
+                    self._store.set(k, v)
+        return True
 
     @classmethod
     def _check_key_name(cls, name):
@@ -59,8 +137,94 @@ class Config(collections.MutableMapping):
 
         Responsible for actually deleting a key-value pair. This needs
         to be separated out so that delattr and delitem don't clash.
+        The default for the key is removed as well so it does not reappear.
         """
-        return self._store.delete(key)
+        with self._expiry_sync(key):
+            if key in self._defaults:
+                del self._defaults[key]
+                try:
+                    result = self._store.delete(key)
+                except KeyError:
+                    result = None
+            else:
+                result = self._store.delete(key)
+            self._clear_expiry(key)
+        if self._history is not None:
+            self._history.record(key, None)
+        if self._subscriptions is not None:
+            self._subscriptions.notify('delete', key)
+        return result
+
+    def _expiry_sync(self, key):
+        """Writes a change of `key` and the removal of its expiry with one
+        sync, keys without an expiry skip the block"""
+        if self._expiry is not None and key in self._expiry:
+            return deferred_sync(self._store)
+        return _undeferred(self._store)
+
+    def _clear_expiry(self, key):
+        if self._expiry is not None and self._expiry.cancel(key):
+            set_expiry = getattr(self._store, 'set_expiry', None)
+            if set_expiry is not None:
+                set_expiry(key, None)
+
+    def _expire(self, key):
+        """Removes the expired `key` from the backend"""
+        with self._expiry_sync(key):
+            self._clear_expiry(key)
+            try:
+                self._store.delete(key)
+            except KeyError:
+                return False
+        if self._history is not None:
+            self._history.record(key, None)
+        if self._subscriptions is not None:
+            self._subscriptions.notify('delete', key)
+        return True
+
+    def evict_expired(self):
+        """Deletes every key whose ttl has passed, returns the keys"""
+        if self._expiry is None:
+            return []
+        expired = self._expiry.pop_expired()
+        if expired:
+            with deferred_sync(self._store):
+                set_expiry = getattr(self._store, 'set_expiry', None)
+                for key in expired:
+                    if set_expiry is not None:
+                        set_expiry(key, None)
+                    self._expire(key)
+        return expired
+
+    def ttl(self, key):
+        """Returns the seconds until `key` expires or None"""
+        if self._expiry is None:
+            return None
+        at = self._expiry.expires_at(key)
+        if at is None:
+            return None
+        return max(0.0, at - time.time())
+
+    def start_reaper(self, interval=1.0):
+        """Starts a thread deleting keys as soon as they expire
+
+        Without the reaper expired keys are only removed when they are
+        read or the Config is iterated. The reaper deletes keys from its
+        own thread so the backend must tolerate that.
+        """
+        if self._reaper is None:
+            from expiry import ExpirySchedule, Reaper
+            if self._expiry is None:
+                super(Config, self).__setattr__('_expiry', ExpirySchedule())
+            reaper = Reaper(self._expiry, self.evict_expired, interval)
+            super(Config, self).__setattr__('_reaper', reaper)
+            reaper.start()
+        return self._reaper
+
+    def stop_reaper(self):
+        if self._reaper is not None:
+            self._reaper.stop()
+            super(Config, self).__setattr__('_reaper', None)
 
     def __delitem__(self, key):
         return self._delete(key)
@@ -71,10 +235,11 @@ class Config(collections.MutableMapping):
         except KeyError, msg:
             raise AttributeError(msg)
 
-    def get(self, key, default=None):
+    def get(self, key, default=None, as_of=None):
         """Gets the value associated with the key
 
-        First tests the backend to see if the key is stored. If the key does
+        First tests the backend to see if the key is stored, then the
+        `defaults` the Config was created with. If the key does
         not exists and a `default` value was passed in then this will be
         returned. If no value is stored and default is not set then it will
         try to see if someone has defined the key via the `add_option` method.
@@ -85,6 +250,10 @@ class Config(collections.MutableMapping):
         Params:
             key: string identifier for the value
             default: if key is not found the default is returned.
+            as_of: epoch time to look the value up at, this requires the
+                Config to be created with `history`. Keys which never
+                changed since the history was enabled return their
+                current value.
 
         Returns:
             Value stored via the `key` or and Exception
@@ -97,46 +266,325 @@ class Config(collections.MutableMapping):
             TooManyRetries: When prompted user is unable to enter in
                 a valid value based on `add_option` specifications.
         """
+        if as_of is not None:
+            if self._history is None:
+                raise IllegalArgumentError(
+                    "'as_of' requires the Config to be created with history.")
+            if key in self._history:
+                try:
+                    return self._history.value_at(key, as_of)
+                except KeyError:
+                    if default is not None:
+                        return default
+                    raise
+        if self._env is not None and self._env_override and key in self._env:
+            return self._env[key]
+        if self._expiry is not None and self._expiry.expired(key):
+            self._expire(key)
         try:
             val = self._store.get(key)
         except KeyError:
+            if self._env is not None and key in self._env:
+                return self._env[key]
+            try:
+                return self._defaults[key]
+            except KeyError:
+                pass
             val = default
             if val is None and not default:
                 return self._auto_prompt(key)
         return val
 
+    def _env_value(self, key, value):
+        """Converts an environment value to the type of its option"""
+        for option in self._available_keywords:
+            if option.name == key:
+                # Checked like a prompted answer, as a string
+                if option.choices and value not in option.choices:
+                    logger.warn("Ignoring %s%s=%r which is not one of: %s",
+                                self._env_prefix, key.upper(), value,
+                                option.choices.summary())
+                    return None
+                try:
+                    return option.returntype(value)
+                except (ValueError, TypeError):
+                    logger.warn("Ignoring %s%s=%r which is not of type %s",
+                                self._env_prefix, key.upper(), value,
+                                option.returntype.__name__)
+                    return None
+        return value
+
+    def refresh_env(self):
+        """Reads the environment variables under `env_prefix` again
+
+        The environment is scanned once and the values are kept so
+        lookups do not need to query the environment.
+        """
+        prefix = self._env_prefix
+        if not prefix:
+            raise IllegalArgumentError(
+                "The Config was not created with an 'env_prefix'.")
+        env = {}
+        for name, value in os.environ.items():
+            if name.startswith(prefix) and len(name) > len(prefix):
+                key = name[len(prefix):].lower()
+                value = self._env_value(key, value)
+                if value is not None:
+                    env[key] = value
+        super(Config, self).__setattr__('_env', env)
+        return env
+
+    def history(self, key):
+        """Returns the kept `(timestamp, value)` versions of `key`
+
+        Versions are sorted oldest first, a value of None is a deletion.
+        """
+        if self._history is None:
+            raise IllegalArgumentError(
+                "History is not enabled for this Config.")
+        return self._history.history(key)
+
     def last_modified(self, key):
-        return self._store.last_modified(key)
+        try:
+            return self._store.last_modified(key)
+        except KeyError:
+            if key in self._defaults:
+                return None
+            raise
 
     def __getitem__(self, key):
-        logger.debug("Config.__getitem__(%s)" % key)
         return self.get(key)
 
     def __getattr__(self, key):
         """__get_attr__ will raise the correct exception if key is not found"""
-        logger.debug("Config.__getattr__(%s)" % key)
         try:
             return self.get(key)
         except KeyError, msg:
             raise AttributeError(msg)
 
+    def set(self, key, value, ttl=None):
+        """Stores `value` under `key`
+
+        With `ttl` the key expires that many seconds from now. Writing
+        the key again without a ttl removes its expiry.
+        """
+        if ttl is None:
+            return self._set(key, value)
+        at = time.time() + ttl
+        with deferred_sync(self._store):
+            result = self._set(key, value)
+            if self._expiry is None:
+                from expiry import ExpirySchedule
+                super(Config, self).__setattr__('_expiry', ExpirySchedule())
+            self._expiry.schedule(key, at)
+            set_expiry = getattr(self._store, 'set_expiry', None)
+            if set_expiry is not None:
+                set_expiry(key, at)
+        return result
+
     def _set(self, key, value):
-        logger.debug("Config.set(%s, %s)" % (key, value))
-        return self._store.set(key, str(value))
+        value = str(value)
+        with self._expiry_sync(key):
+            result = self._store.set(key, value)
+            self._clear_expiry(key)
+        if self._history is not None:
+            self._history.record(key, value)
+        if self._subscriptions is not None:
+            self._subscriptions.notify('set', key, value)
+        return result
 
     def __setitem__(self, key, value):
-        logger.debug("Config.__setitem__(%s, %s)" % (key, value))
         return self._set(key, value)
 
     def __setattr__(self, key, value):
-        logger.debug("Config.__setattr__(%s, %s)" % (key, value))
         return self._set(key, value)
 
+    def _overlays(self):
+        """The environment values and defaults read on top of the backend"""
+        return [d for d in (self._env, self._defaults) if d]
+
     def __iter__(self):
-        return self._store.__iter__()
+        if self._expiry is not None:
+            self.evict_expired()
+        if not self._overlays():
+            return self._store.__iter__()
+        return self._iter_with_overlays()
+
+    def _iter_with_overlays(self):
+        seen = set()
+        for k in self._store:
+            seen.add(k)
+            yield k
+        for overlay in self._overlays():
+            for k in overlay:
+                if k not in seen:
+                    seen.add(k)
+                    yield k
 
     def __len__(self):
-        return len(self._store)
+        if self._expiry is not None:
+            self.evict_expired()
+        overlays = self._overlays()
+        if not overlays:
+            return len(self._store)
+        return len(set(self._store).union(*overlays))
+
+    def iteritems(self):
+        """Yields every `(key, value)` pair with one pass over the backend
+
+        The values are the ones `get` returns, the environment and the
+        defaults apply in the same order.
+        """
+        if self._expiry is not None:
+            self.evict_expired()
+        overlays = self._overlays()
+        if not overlays:
+            for item in self._store.iteritems():
+                yield item
+            return
+        env = self._env if self._env_override and self._env else {}
+        seen = set()
+        for k, v in self._store.iteritems():
+            seen.add(k)
+            yield k, env.get(k, v)
+        for overlay in overlays:
+            for k, v in overlay.iteritems():
+                if k not in seen:
+                    seen.add(k)
+                    yield k, v
+
+    def items(self):
+        return list(self.iteritems())
+
+    def apply_patch(self, patch):
+        """Applies a `ConfigDiff` from `creoconfig.diff` to this Config
+
+        Added and changed keys are set and removed keys are deleted. All
+        changes are written to the backend with a single sync. Returns the
+        number of changes made.
+        """
+        count = 0
+        with deferred_sync(self._store):
+            for k, v in patch.added.iteritems():
+                self._set(k, v)
+                count += 1
+            for k, (old, new) in patch.changed.iteritems():
+                self._set(k, new)
+                count += 1
+            for k in patch.removed:
+                try:
+                    self._delete(k)
+                    count += 1
+                except KeyError:
+                    pass
+        return count
+
+    def export(self, stream, format='jsonl'):
+        """Writes every key to `stream` and returns the number written
+
+        Entries are read from the backend and written one at a time so
+        memory use does not grow with the size of the config. `format`
+        is one of 'xml', 'jsonl' or 'ini'.
+        """
+        import streaming
+        # Typed environment values are written as strings like stored ones
+        return streaming.export(((k, str(v)) for k, v in self.iteritems()),
+                                stream, format)
+
+    def import_(self, stream, format='jsonl', chunk_size=1000):
+        """Sets every key read from `stream`, returns the number imported
+
+        The keys are committed in chunks of `chunk_size` with a single
+        sync of the backend per chunk.
+        """
+        import streaming
+        count = 0
+        for chunk in streaming.chunks(streaming.read(stream, format),
+                                      chunk_size):
+            with deferred_sync(self._store):
+                for k, v in chunk:
+                    self._set(k, v)
+            count += len(chunk)
+        return count
+
+    def compact(self):
+        """Rewrites the config file in its minimal form
+
+        Duplicate and orphaned entries left in the file are dropped and
+        pending changes are written with it. Returns the `FsckReport` with
+        the size and entries reclaimed.
+        """
+        compact = getattr(self._store, 'compact', None)
+        if compact is None:
+            raise IllegalArgumentError(
+                "The %s backend does not support compaction." %
+                type(self._store).__name__)
+        return compact()
+
+    def sync(self):
+        """Writes the pending changes of the backend
+
+        Backends with deferred writes, like 'multiini://', only write on
+        `sync`, `close` or when they are garbage collected.
+        """
+        sync = getattr(self._store, 'sync', None)
+        if sync is not None:
+            sync()
+        return True
+
+    def close(self):
+        """Stops the reaper, writes the pending changes and closes the
+        backend if it can be closed"""
+        self.stop_reaper()
+        close = getattr(self._store, 'close', None)
+        if close is not None:
+            close()
+        elif getattr(self._store, 'dirty', False):
+            self._store.sync()
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def subscribe(self, pattern, callback, queued=False):
+        """Calls `callback` whenever a key matching `pattern` changes
+
+        `pattern` is a glob if it contains `*`, `?` or `[`, otherwise it
+        matches all keys starting with it. The callback receives a
+        `ChangeEvent(action, key, value)` where action is 'set' or 'delete'.
+        With `queued` the callback runs on a worker thread instead of
+        inside the write.
+
+        Returns the Subscription which can be passed to `unsubscribe`.
+        """
+        if self._subscriptions is None:
+            from subscriptions import SubscriptionIndex
+            super(Config, self).__setattr__(
+                '_subscriptions', SubscriptionIndex())
+        return self._subscriptions.add(pattern, callback, queued)
+
+    def unsubscribe(self, subscription):
+        subscription.cancel()
+        return True
+
+    def reload(self):
+        """Reads the backend again and notifies subscribers of changes"""
+        if self._subscriptions is None:
+            self._store.reload()
+            return True
+        before = dict(self._store.iteritems())
+        self._store.reload()
+        after = dict(self._store.iteritems())
+        for k, v in after.iteritems():
+            if k not in before or before[k] != v:
+                self._subscriptions.notify('set', k, v)
+        for k in before:
+            if k not in after:
+                self._subscriptions.notify('delete', k)
+        return True
 
     def _auto_prompt(self, key):
         """
@@ -164,14 +612,17 @@ class Config(collections.MutableMapping):
         super(Config, self).__setattr__('_isbatch', False)
 
     def add_option(self, *args, **kwargs):
-        self._available_keywords.append(
-            configobject.ConfigObject(*args, **kwargs)
-        )
+        from configobject import ConfigObject
+        option = ConfigObject(*args, **kwargs)
+        self._available_keywords.append(option)
+        if self._env_prefix and option.name in self._env:
+            # Convert the environment value to the type of the option
+            self.refresh_env()
         return True
 
     def prompt(self):
         for k in self._available_keywords:
-            if k.name not in self._store:
+            if k.name not in self._store and k.name not in self._defaults:
                 if self._isbatch:
                     raise BatchModeUnableToPrompt(
                         "%s not found. Please exit batchmode to start wizard "
@@ -1,45 +1,272 @@
-#!/usr/bin/python3
-# http://www.python-course.eu/tkinter_entry_widgets.php
-# from Tkinter import (
-#     Frame,
-#     Label,
-#     Entry,
-#     Button
-# )
-import Tkinter
+"""
+Config editor
 
+A Tk editor for any Config, also available from the command line:
 
-fields = 'Last Name', 'First Name', 'Job', 'Country'
+    % python -m creoconfig settings.xml edit
 
+The key list only creates widgets for the rows which are visible so it
+stays responsive with tens of thousands of keys. Typing in the search box
+narrows the previous matches instead of searching every key again, and
+edits are collected and written in one batch once typing has paused.
+"""
+import bisect
+import logging
+from config import deferred_sync
+from lazyimport import LazyModule
 
-def fetch(entries):
-    for entry in entries:
-        field = entry[0]
-        text  = entry[1].get()
-        print('%s: "%s"' % (field, text))
+Tkinter = LazyModule('Tkinter', 'tkinter')
 
 
-def makeform(root, fields):
-    entries = []
-    for field in fields:
-        row = Tkinter.Frame(root)
-        lab = Tkinter.Label(row, width=15, text=field, anchor='w')
-        ent = Tkinter.Entry(row)
-        row.pack(side=Tkinter.TOP, fill=Tkinter.X, padx=5, pady=5)
-        lab.pack(side=Tkinter.LEFT)
-        ent.pack(side=Tkinter.RIGHT, expand=Tkinter.YES, fill=Tkinter.X)
-        entries.append((field, ent))
-    return entries
+logger = logging.getLogger(__name__)
 
 
-if __name__ == '__main__':
+class KeyIndex(object):
+    """Sorted keys with an incremental substring search"""
+
+    def __init__(self, keys=()):
+        self.keys = sorted(keys)
+        self.query = ''
+        self.matches = self.keys
+
+    def add(self, key):
+        i = bisect.bisect_left(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            self.keys.insert(i, key)
+            self.search(self.query, force=True)
+
+    def remove(self, key):
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            del self.keys[i]
+            self.search(self.query, force=True)
+
+    def search(self, query, force=False):
+        """Returns the sorted keys containing `query`
+
+        When `query` extends the previous one only the previous matches
+        are searched again.
+        """
+        query = query.lower()
+        if query == self.query and not force:
+            return self.matches
+        if query.startswith(self.query) and not force:
+            candidates = self.matches
+        else:
+            candidates = self.keys
+        if query:
+            self.matches = [k for k in candidates if query in k.lower()]
+        else:
+            self.matches = self.keys
+        self.query = query
+        return self.matches
+
+
+class Debouncer(object):
+    """
+    Collects edits and applies them in one batch once no edit has been
+    made for `delay` milliseconds.
+
+    `after` and `after_cancel` are the scheduling functions of a Tk
+    widget, or anything which behaves the same.
+    """
+    def __init__(self, config, after, after_cancel, delay=500):
+        self.config = config
+        self.after = after
+        self.after_cancel = after_cancel
+        self.delay = delay
+        self.pending = {}
+        self._timer = None
+
+    def schedule(self, key, value):
+        self.pending[key] = value
+        if self._timer is not None:
+            self.after_cancel(self._timer)
+        self._timer = self.after(self.delay, self._elapsed)
+
+    def _elapsed(self):
+        self._timer = None
+        self.flush()
+
+    def flush(self):
+        """Writes every pending edit with a single sync of the backend"""
+        if self._timer is not None:
+            self.after_cancel(self._timer)
+            self._timer = None
+        if not self.pending:
+            return 0
+        pending, self.pending = self.pending, {}
+        with deferred_sync(self.config._store):
+            for key, value in pending.iteritems():
+                self.config[key] = value
+        logger.debug("Saved %d edits", len(pending))
+        return len(pending)
+
+
+def check_value(option, value):
+    """Returns an error message if `value` is invalid for `option`"""
+    if option is None:
+        return None
+    if option.choices and value not in option.choices:
+        return "Must be one of: %s" % option.choices.summary()
+    try:
+        option.returntype(value)
+    except ValueError:
+        return "Must be of type %s" % option.returntype.__name__
+    return None
+
+
+class VirtualList(object):
+    """
+    List showing `rows` items at a time. Only the visible rows have a
+    widget, scrolling changes their text.
+    """
+    def __init__(self, parent, rows=25, width=40, on_select=None):
+        self.frame = Tkinter.Frame(parent)
+        self.rows = rows
+        self.items = []
+        self.offset = 0
+        self.selected = None
+        self.on_select = on_select
+        self.scrollbar = Tkinter.Scrollbar(self.frame, command=self.yview)
+        self.scrollbar.pack(side=Tkinter.RIGHT, fill=Tkinter.Y)
+        self.labels = []
+        for row in range(rows):
+            label = Tkinter.Label(self.frame, width=width, anchor='w')
+            label.pack(side=Tkinter.TOP, fill=Tkinter.X)
+            label.bind('<Button-1>', lambda e, row=row: self.click(row))
+            label.bind('<MouseWheel>', self.wheel)
+            label.bind('<Button-4>', lambda e: self.scroll(-3))
+            label.bind('<Button-5>', lambda e: self.scroll(3))
+            self.labels.append(label)
+
+    def set_items(self, items):
+        self.items = items
+        self.offset = 0
+        self.render()
+
+    def max_offset(self):
+        return max(0, len(self.items) - self.rows)
+
+    def scroll(self, rows):
+        self.offset = min(max(0, self.offset + rows), self.max_offset())
+        self.render()
+
+    def wheel(self, event):
+        self.scroll(-1 if event.delta > 0 else 1)
+
+    def yview(self, *args):
+        """Scrollbar callback"""
+        if args[0] == 'moveto':
+            self.offset = int(float(args[1]) * len(self.items))
+            self.scroll(0)
+        elif args[0] == 'scroll':
+            step = self.rows if args[2] == 'pages' else 1
+            self.scroll(int(args[1]) * step)
+
+    def click(self, row):
+        index = self.offset + row
+        if index < len(self.items):
+            self.selected = self.items[index]
+            self.render()
+            if self.on_select is not None:
+                self.on_select(self.selected)
+
+    def render(self):
+        visible = self.items[self.offset:self.offset + self.rows]
+        for i, label in enumerate(self.labels):
+            text = visible[i] if i < len(visible) else ''
+            relief = 'sunken' if text and text == self.selected else 'flat'
+            label.config(text=text, relief=relief)
+        if self.items:
+            first = float(self.offset) / len(self.items)
+            last = float(self.offset + len(visible)) / len(self.items)
+            self.scrollbar.set(first, last)
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+
+class ConfigEditor(object):
+    """Editor window bound to `config`"""
+
+    def __init__(self, root, config, rows=25, delay=500):
+        self.root = root
+        self.config = config
+        self.options = dict((o.name, o) for o in config._available_keywords)
+        self.index = KeyIndex(set(config).union(self.options))
+        self.saver = Debouncer(config, root.after, root.after_cancel, delay)
+        self.key = None
+        self._loading = False
+
+        root.title('creoconfig - %s' % getattr(
+            config._store, 'filename', type(config._store).__name__))
+        self.search = Tkinter.StringVar()
+        self.search.trace('w', lambda *args: self.refresh())
+        search = Tkinter.Entry(root, textvariable=self.search)
+        search.pack(side=Tkinter.TOP, fill=Tkinter.X, padx=5, pady=5)
+
+        self.list = VirtualList(root, rows=rows, on_select=self.select)
+        self.list.frame.pack(side=Tkinter.LEFT, fill=Tkinter.Y, padx=5)
+
+        form = Tkinter.Frame(root)
+        form.pack(side=Tkinter.LEFT, fill=Tkinter.BOTH, expand=Tkinter.YES,
+                  padx=5)
+        self.name = Tkinter.Label(form, anchor='w', font='TkHeadingFont')
+        self.name.pack(side=Tkinter.TOP, fill=Tkinter.X)
+        self.help = Tkinter.Label(form, anchor='w', justify='left',
+                                  wraplength=300)
+        self.help.pack(side=Tkinter.TOP, fill=Tkinter.X)
+        self.value = Tkinter.StringVar()
+        self.value.trace('w', lambda *args: self.edited())
+        self.entry = Tkinter.Entry(form, textvariable=self.value)
+        self.entry.pack(side=Tkinter.TOP, fill=Tkinter.X, pady=5)
+        self.error = Tkinter.Label(form, anchor='w', fg='red')
+        self.error.pack(side=Tkinter.TOP, fill=Tkinter.X)
+        Tkinter.Button(form, text='Quit', command=self.close).pack(
+            side=Tkinter.BOTTOM, anchor='e')
+        root.protocol('WM_DELETE_WINDOW', self.close)
+        self.refresh()
+
+    def refresh(self):
+        self.list.set_items(self.index.search(self.search.get()))
+
+    def select(self, key):
+        option = self.options.get(key)
+        self.key = key
+        self.name.config(text=key)
+        help = ''
+        if option is not None:
+            help = option.help or ''
+            if option.choices:
+                help += '\nChoices: %s' % option.choices.summary()
+        self.help.config(text=help)
+        self._loading = True
+        try:
+            self.value.set(self.saver.pending.get(
+                key, self.config.get(key, '') or ''))
+        except Exception, msg:
+            self.value.set('')
+            logger.debug("No value for '%s': %s", key, msg)
+        finally:
+            self._loading = False
+        self.error.config(text='')
+
+    def edited(self):
+        if self._loading or self.key is None:
+            return
+        value = self.value.get()
+        error = check_value(self.options.get(self.key), value)
+        self.error.config(text=error or '')
+        if error is None:
+            self.saver.schedule(self.key, value)
+
+    def close(self):
+        self.saver.flush()
+        self.root.destroy()
+
+
+def edit(config, rows=25):
+    """Opens the editor for `config` and returns when it is closed"""
     root = Tkinter.Tk()
-    ents = makeform(root, fields)
-    root.bind('<Return>', (lambda event, e=ents: fetch(e)))
-    b1 = Tkinter.Button(
-        root, text='Show',
-        command=(lambda e=ents: fetch(e)))
-    b1.pack(side=Tkinter.LEFT, padx=5, pady=5)
-    b2 = Tkinter.Button(root, text='Quit', command=root.quit)
-    b2.pack(side=Tkinter.LEFT, padx=5, pady=5)
+    ConfigEditor(root, config, rows=rows)
     root.mainloop()
@@ -0,0 +1,55 @@
+"""
+ConfigDiff
+
+Compares two configs in a single pass over each of them.
+"""
+import collections
+
+
+class ConfigDiff(collections.namedtuple('ConfigDiff',
+                                        'added removed changed')):
+    """
+    The changes which turn one config into another.
+
+    added   - {key: value} of keys only found in the new config
+    removed - {key: value} of keys only found in the old config
+    changed - {key: (old value, new value)} of keys with a new value
+    """
+    __slots__ = ()
+
+    def __nonzero__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    def reverse(self):
+        """Returns the diff which undoes this one"""
+        return ConfigDiff(
+            dict(self.removed), dict(self.added),
+            dict((k, (new, old)) for k, (old, new) in
+                 self.changed.iteritems()))
+
+
+def _iteritems(config):
+    iteritems = getattr(config, 'iteritems', None)
+    if iteritems is None:
+        return iter(config.items())
+    return iteritems()
+
+
+def diff(a, b):
+    """Returns the `ConfigDiff` which turns config `a` into config `b`
+
+    `a` and `b` can be Configs, storage backends or plain dicts. Each of
+    them is read once with `iteritems` so the diff is O(n).
+    """
+    old = dict(_iteritems(a))
+    added = {}
+    changed = {}
+    for key, value in _iteritems(b):
+        try:
+            old_value = old.pop(key)
+        except KeyError:
+            added[key] = value
+            continue
+        if old_value != value:
+            changed[key] = (old_value, value)
+    return ConfigDiff(added, old, changed)
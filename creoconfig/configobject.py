@@ -4,11 +4,8 @@ creoconfig
 Allows the central control and management of applications via
 a centralized configuration management system.
 """
-try:
-    """ReadLine will enhance the raw_input and allow history"""
-    import readline
-except ImportError:
-    pass
+import types
+from choices import Choices, Completer, LazyChoices
 from exceptions import (
     TooManyRetries,
     IllegalArgumentError
@@ -21,7 +18,7 @@ class ConfigObject(object):
     create a useful interactive prompt for the user to enter in the value.
     """
     def __init__(self, name, prefix='', help=None, type=None,
-                 choices={}, default=None, retries=3):
+                 choices={}, default=None, retries=3, choices_ttl=None):
         self.name = str(name)
         self.prefix = prefix
         self.help = help
@@ -40,6 +37,12 @@ class ConfigObject(object):
                     "'default' must be the same base class as 'type': "
                     "%s != %s" % (self.default, self.returntype))
 
+        # A provider of choices is only called when they are first used
+        if callable(choices) or isinstance(choices, types.GeneratorType):
+            self.choices = LazyChoices(choices, ttl=choices_ttl,
+                                       check=self._check_choices)
+            return
+
         # Choices should always be stores as string type
         if choices:
             if isinstance(choices, (str, unicode)):
@@ -53,18 +56,55 @@ class ConfigObject(object):
                         "%s != %s" % (x, self.returntype))
 
         # map choices to string items since all comparasons are string based.
-        self.choices = map(str, choices)
+        self.choices = Choices(choices)
+
+    def _check_choices(self, choices):
+        for t in choices.types:
+            if not issubclass(t, self.returntype):
+                raise IllegalArgumentError(
+                    "'choices' must be iterable and the same class as "
+                    "'type'. Item type mismatch for: "
+                    "%s != %s" % (t, self.returntype))
 
     def __repr__(self):
         return "%s %s: %s (%s)" % (self.name, self.returntype,
                                    self.choices, self.default)
 
     def prompt(self):
+        """Asks for the value, tab completes the choices
+
+        The completer is only installed while prompting. GNU readline
+        completes on tab by default so its key bindings, including those
+        of ~/.inputrc, are left alone. libedit is bound to complete on tab
+        and stays bound, readline can not report the previous binding to
+        restore it.
+        """
+        try:
+            """ReadLine will enhance the raw_input and allow history"""
+            import readline
+        except ImportError:
+            readline = None
+
+        if readline is not None and self.choices:
+            # Complete the choices on tab, the whole line is the value
+            completer = readline.get_completer()
+            delims = readline.get_completer_delims()
+            readline.set_completer(Completer(self.choices))
+            readline.set_completer_delims('')
+            if 'libedit' in (readline.__doc__ or ''):
+                readline.parse_and_bind('bind ^I rl_complete')
+            try:
+                return self._prompt()
+            finally:
+                readline.set_completer(completer)
+                readline.set_completer_delims(delims)
+        return self._prompt()
 
+    def _prompt(self):
         self.msg = self.prefix
 
         if self.choices:
-            self.msg += " [%s]" % ', '.join(self.choices)
+            self.msg += " [%s]" % self.choices.summary()
 
         if self.default:
             self.msg += " (%s)" % str(self.default)
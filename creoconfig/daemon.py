@@ -0,0 +1,314 @@
+"""
+Daemon
+
+A local process which owns a storage backend and serves it to many
+clients over a unix domain socket. Clients keep a cache of the values
+they have read and the daemon pushes an invalidation to every other
+client whenever a key is changed.
+
+The protocol is one json object per line. Requests carry an `id` which
+is echoed in the response, pushed notices carry no `id`:
+
+    {"id": 1, "op": "get", "key": "db_host"}
+    {"id": 1, "value": "localhost"}
+    {"op": "invalidate", "key": "db_host"}
+
+An invalidation with a null key drops every cached value, it is sent
+when the daemon reads its backend again.
+"""
+import os
+import json
+import time
+import socket
+import logging
+import threading
+import SocketServer
+from exceptions import RemoteError
+from storagebackend import MemStorageBackend
+
+
+logger = logging.getLogger(__name__)
+
+
+class _DaemonHandler(SocketServer.StreamRequestHandler):
+    """Serves the requests of one connected client"""
+
+    def setup(self):
+        SocketServer.StreamRequestHandler.setup(self)
+        self.lock = threading.Lock()
+        self.server.add_client(self)
+
+    def send(self, message):
+        data = json.dumps(message) + '\n'
+        with self.lock:
+            self.wfile.write(data)
+            self.wfile.flush()
+
+    def handle(self):
+        for line in iter(self.rfile.readline, ''):
+            try:
+                request = json.loads(line)
+            except ValueError:
+                logger.warn("Ignoring invalid request: %r", line)
+                continue
+            response = {'id': request.get('id')}
+            try:
+                response['value'] = self.server.execute(self, request)
+            except KeyError, msg:
+                response['error'] = 'KeyError'
+                response['message'] = str(msg)
+            except Exception, msg:
+                response['error'] = type(msg).__name__
+                response['message'] = str(msg)
+            try:
+                self.send(response)
+            except socket.error:
+                break
+
+    def finish(self):
+        self.server.remove_client(self)
+        SocketServer.StreamRequestHandler.finish(self)
+
+
+class ConfigDaemon(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    """
+    Serves `backend` on the unix socket `path`.
+
+    All backend operations are serialized so the backend does not need
+    to be thread safe.
+    """
+    daemon_threads = True
+
+    def __init__(self, backend, path):
+        self.backend = backend
+        self.path = path
+        self.backend_lock = threading.Lock()
+        self.clients = set()
+        self.clients_lock = threading.Lock()
+        if os.path.exists(path):
+            os.remove(path)
+        SocketServer.UnixStreamServer.__init__(self, path, _DaemonHandler)
+        self._thread = None
+
+    def add_client(self, client):
+        with self.clients_lock:
+            self.clients.add(client)
+
+    def remove_client(self, client):
+        with self.clients_lock:
+            self.clients.discard(client)
+
+    def invalidate(self, key, origin=None):
+        """Pushes an invalidation for `key` to every client but `origin`"""
+        with self.clients_lock:
+            clients = list(self.clients)
+        for client in clients:
+            if client is origin:
+                continue
+            try:
+                client.send({'op': 'invalidate', 'key': key})
+            except socket.error:
+                self.remove_client(client)
+
+    def execute(self, client, request):
+        op = request.get('op')
+        key = request.get('key')
+        with self.backend_lock:
+            if op == 'get':
+                return self.backend.get(key)
+            elif op == 'set':
+                self.backend.set(key, request.get('value'))
+            elif op == 'delete':
+                self.backend.delete(key)
+            elif op == 'keys':
+                return list(self.backend)
+            elif op == 'items':
+                return list(self.backend.iteritems())
+            elif op == 'len':
+                return len(self.backend)
+            elif op == 'last_modified':
+                return self.backend.last_modified(key)
+            elif op == 'expiries':
+                return getattr(self.backend, 'expiries', dict)()
+            elif op == 'set_expiry':
+                if hasattr(self.backend, 'set_expiry'):
+                    self.backend.set_expiry(key, request.get('at'))
+                return True
+            elif op == 'reload':
+                if hasattr(self.backend, 'reload'):
+                    self.backend.reload()
+                key = None
+            elif op == 'sync':
+                if hasattr(self.backend, 'sync'):
+                    self.backend.sync()
+                return True
+            else:
+                raise ValueError("Unknown operation '%s'" % op)
+        # Only modifications get here
+        self.invalidate(key, origin=client)
+        return True
+
+    def start(self, poll_interval=0.05):
+        """Serves requests from a background thread"""
+        self._thread = threading.Thread(
+            target=self.serve_forever, args=(poll_interval,))
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops serving and removes the socket file"""
+        self.shutdown()
+        self.server_close()
+        with self.clients_lock:
+            clients = list(self.clients)
+        for client in clients:
+            try:
+                client.connection.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class DaemonStorageBackend(MemStorageBackend):
+    """
+    Storage backend which forwards every operation to a ConfigDaemon.
+
+    Values which have been read are cached locally until the daemon
+    pushes an invalidation for them. The daemon applies every change as
+    it is made, so `deferred_sync` has nothing to group on this side.
+    """
+    def __init__(self, path, timeout=10.0, *args, **kwargs):
+        self.path = path
+        self.timeout = timeout
+        self.cache = {}
+        # Incremented on every invalidation so that a value fetched while
+        # an invalidation arrived is not cached.
+        self._epoch = 0
+        self._next_id = 0
+        self._responses = {}
+        self._cond = threading.Condition()
+        self._send_lock = threading.Lock()
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(path)
+        self._rfile = self._sock.makefile('rb')
+        self._reader = threading.Thread(target=self._read_loop)
+        self._reader.daemon = True
+        self._reader.start()
+
+    def _read_loop(self):
+        try:
+            for line in iter(self._rfile.readline, ''):
+                message = json.loads(line)
+                with self._cond:
+                    if message.get('id') is None:
+                        if message.get('op') == 'invalidate':
+                            self._epoch += 1
+                            if message.get('key') is None:
+                                self.cache.clear()
+                            else:
+                                self.cache.pop(message.get('key'), None)
+                    else:
+                        self._responses[message['id']] = message
+                        self._cond.notify_all()
+        except (socket.error, ValueError):
+            pass
+        # The daemon went away, nothing in the cache can be trusted
+        with self._cond:
+            self.cache.clear()
+            self._responses[None] = {'error': 'RemoteError',
+                                     'message': 'Connection to the config '
+                                                'daemon was closed.'}
+            self._cond.notify_all()
+
+    def _request(self, op, **kwargs):
+        with self._cond:
+            self._next_id += 1
+            request_id = self._next_id
+        kwargs.update(id=request_id, op=op)
+        with self._send_lock:
+            self._sock.sendall(json.dumps(kwargs) + '\n')
+        deadline = time.time() + self.timeout
+        with self._cond:
+            while (request_id not in self._responses and
+                   None not in self._responses):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise RemoteError("Timeout waiting for the config "
+                                      "daemon on '%s'." % self.path)
+                self._cond.wait(remaining)
+            response = self._responses.pop(request_id, None) or \
+                self._responses[None]
+        if 'error' in response:
+            if response['error'] == 'KeyError':
+                raise KeyError(response['message'])
+            raise RemoteError("%s: %s" % (response['error'],
+                                          response['message']))
+        return response.get('value')
+
+    def __getitem__(self, key):
+        try:
+            return self.cache[key]
+        except KeyError:
+            pass
+        epoch = self._epoch
+        value = self._request('get', key=key)
+        with self._cond:
+            if epoch == self._epoch:
+                self.cache[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        epoch = self._epoch
+        self._request('set', key=key, value=value)
+        with self._cond:
+            if epoch == self._epoch:
+                self.cache[key] = value
+            else:
+                # Another client may have changed it since
+                self.cache.pop(key, None)
+        return True
+
+    def __delitem__(self, key):
+        with self._cond:
+            self.cache.pop(key, None)
+        self._request('delete', key=key)
+
+    def __iter__(self):
+        return iter(self._request('keys'))
+
+    def __len__(self):
+        return self._request('len')
+
+    def iteritems(self):
+        return iter(self.items())
+
+    def items(self):
+        return [tuple(item) for item in self._request('items')]
+
+    def last_modified(self, key):
+        return self._request('last_modified', key=key)
+
+    def expiries(self):
+        return self._request('expiries')
+
+    def set_expiry(self, key, at):
+        return self._request('set_expiry', key=key, at=at)
+
+    def reload(self):
+        """Makes the daemon read its backend again and drops the cache"""
+        with self._cond:
+            self._epoch += 1
+            self.cache.clear()
+        return self._request('reload')
+
+    def sync(self):
+        return self._request('sync')
+
+    def close(self):
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self._sock.close()
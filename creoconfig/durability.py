@@ -0,0 +1,145 @@
+"""
+Durability
+
+Files are never rewritten in place. The new content goes to a temporary
+file next to the real file (a symlink is followed) which is renamed over
+it, so a crash or a concurrent reader only ever sees the old or the new
+file.
+
+How hard the data is pushed to the disk is chosen by the fsync policy:
+
+    always   fsync the file before it is renamed and the directory after,
+             every write survives a power failure once sync returns
+    batched  fsync the file before it is renamed, so a power failure
+             leaves the old or the new content. The directories are
+             fsynced together by the first write `BATCH_INTERVAL` seconds
+             after the previous batch and when the process exits, a power
+             failure can bring back the old content of that window
+    never    leave it to the operating system, only process crashes are
+             covered, a power failure can leave an empty or partial file
+"""
+import os
+import time
+import atexit
+import thread
+import shutil
+import logging
+import threading
+import contextlib
+from compression import PLAIN, open_file, codec_for_extension
+from exceptions import IllegalArgumentError
+
+
+logger = logging.getLogger(__name__)
+
+
+ALWAYS = 'always'
+BATCHED = 'batched'
+NEVER = 'never'
+POLICIES = (ALWAYS, BATCHED, NEVER)
+
+# Seconds between the fsyncs of batched writes
+BATCH_INTERVAL = 1.0
+
+
+def check_policy(policy):
+    if policy not in POLICIES:
+        raise IllegalArgumentError("Unknown fsync policy '%s', use one of: "
+                                   "%s" % (policy, ', '.join(POLICIES)))
+    return policy
+
+
+def fsync_path(path):
+    """Flushes the file or directory `path` to the disk"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_directory(path):
+    """Flushes the entries of directory `path`, making renames durable"""
+    if os.name == 'nt':
+        # Directories can not be opened on windows
+        return
+    fsync_path(path)
+
+
+def _replace(src, dst):
+    if os.name == 'nt' and os.path.exists(dst):
+        # Windows can not rename over an existing file
+        os.remove(dst)
+    os.rename(src, dst)
+
+
+class _Batch(object):
+    """Directories with renames whose fsync is still due"""
+
+    def __init__(self):
+        self.pending = set()
+        self.last = time.time()
+        self._lock = threading.Lock()
+
+    def add(self, directory):
+        with self._lock:
+            self.pending.add(directory)
+            due = time.time() - self.last >= BATCH_INTERVAL
+        if due:
+            self.flush()
+
+    def flush(self):
+        """fsyncs every pending directory"""
+        with self._lock:
+            pending, self.pending = self.pending, set()
+            self.last = time.time()
+        for directory in pending:
+            try:
+                fsync_directory(directory)
+            except OSError, msg:
+                # The directory was removed since
+                logger.debug("Skipping fsync of '%s': %s", directory, msg)
+        return len(pending)
+
+
+_batch = _Batch()
+atexit.register(_batch.flush)
+
+
+def flush():
+    """fsyncs the batched renames now, returns how many directories were
+    due"""
+    return _batch.flush()
+
+
+@contextlib.contextmanager
+def atomic_write(filename, codec=None, fsync=BATCHED):
+    """Opens a temporary file which replaces `filename` when the block
+    exits without an exception
+
+    `codec` compresses the content, by default it follows the extension
+    of `filename`. An existing file keeps its permissions and a symlink
+    keeps pointing to the file, which is replaced instead.
+    """
+    check_policy(fsync)
+    if codec is None:
+        codec = codec_for_extension(filename) or PLAIN
+    filename = os.path.realpath(filename)
+    directory = os.path.dirname(os.path.abspath(filename))
+    tmp = os.path.join(directory, '.%s.%d.%d.tmp' % (
+        os.path.basename(filename), os.getpid(), thread.get_ident()))
+    try:
+        with open_file(tmp, 'wb', codec) as f:
+            yield f
+        if os.path.exists(filename):
+            shutil.copymode(filename, tmp)
+        if fsync != NEVER:
+            fsync_path(tmp)
+        _replace(tmp, filename)
+        if fsync == ALWAYS:
+            fsync_directory(directory)
+        elif fsync == BATCHED:
+            _batch.add(directory)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
@@ -30,3 +30,13 @@ class TooManyRetries(ConfigException):
 class SignatureError(ConfigException):
     """Config entry has been modified external to this config application"""
     pass
+
+
+class ReadOnlyError(ConfigException):
+    """Thrown when trying to modify a read only storage backend"""
+    pass
+
+
+class RemoteError(ConfigException):
+    """The config daemon was unable to complete a request"""
+    pass
@@ -0,0 +1,118 @@
+"""
+Expiry
+
+Keeps track of when keys expire. The expiry times are kept in a dict
+for O(1) lookups of a single key and in a min-heap ordered by time so
+the keys which expired can be found in O(log n) each without looking at
+the keys which have not.
+
+Rescheduled or cancelled keys leave their old entry in the heap, these
+are skipped when they reach the top.
+"""
+import time
+import heapq
+import logging
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+class ExpirySchedule(object):
+    """Expiry times of keys, `at` is an epoch time"""
+
+    def __init__(self, expiries=None):
+        self.expires = dict(expiries or {})
+        self.heap = [(at, key) for key, at in self.expires.iteritems()]
+        heapq.heapify(self.heap)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.expires)
+
+    def __contains__(self, key):
+        return key in self.expires
+
+    def schedule(self, key, at):
+        with self.lock:
+            self.expires[key] = at
+            heapq.heappush(self.heap, (at, key))
+            self._trim()
+
+    def cancel(self, key):
+        """Forgets the expiry of `key`, returns True if it had one"""
+        with self.lock:
+            return self.expires.pop(key, None) is not None
+
+    def expires_at(self, key):
+        return self.expires.get(key)
+
+    def expired(self, key, now=None):
+        at = self.expires.get(key)
+        if at is None:
+            return False
+        return at <= (time.time() if now is None else now)
+
+    def next_expiry(self):
+        """Returns the earliest expiry time or None"""
+        with self.lock:
+            self._skip_stale()
+            return self.heap[0][0] if self.heap else None
+
+    def pop_expired(self, now=None):
+        """Removes and returns the keys which expired by `now`"""
+        now = time.time() if now is None else now
+        expired = []
+        with self.lock:
+            while True:
+                self._skip_stale()
+                if not self.heap or self.heap[0][0] > now:
+                    break
+                at, key = heapq.heappop(self.heap)
+                del self.expires[key]
+                expired.append(key)
+        return expired
+
+    def _skip_stale(self):
+        heap = self.heap
+        while heap and self.expires.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+
+    def _trim(self):
+        # Rebuild when stale entries make up most of the heap
+        if len(self.heap) > 2 * len(self.expires) + 64:
+            self.heap = [(at, key) for key, at in self.expires.iteritems()]
+            heapq.heapify(self.heap)
+
+
+class Reaper(threading.Thread):
+    """
+    Background thread calling `evict` whenever a key is due to expire.
+
+    It sleeps until the next expiry in `schedule` or at most `interval`
+    seconds, so keys scheduled while it sleeps are picked up in time.
+    """
+    def __init__(self, schedule, evict, interval=1.0):
+        super(Reaper, self).__init__(name='creoconfig-reaper')
+        self.daemon = True
+        self.schedule = schedule
+        self.evict = evict
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.evict()
+            except Exception:
+                logger.exception("Failed to evict expired keys")
+            at = self.schedule.next_expiry()
+            timeout = self.interval
+            if at is not None:
+                timeout = max(0.0, min(timeout, at - time.time()))
+            self.stopped.wait(timeout)
+
+    def stop(self):
+        self.stopped.set()
+        if self is not threading.current_thread():
+            self.join()
@@ -0,0 +1,134 @@
+"""
+Fsck
+
+Checks xml config files for the damage older versions and manual edits
+leave behind and rewrites them to their minimal form:
+
+    duplicates   variables holding several name or value children, or
+                 several variables with the same name
+    orphans      elements which are not a variable and variables without
+                 a name or value
+    signatures   variables whose signature does not match their value
+
+A rewrite goes to a temporary file which is renamed over the original,
+so the config is never left half written.
+"""
+import os
+import logging
+from compression import open_file
+from durability import ALWAYS, atomic_write
+from storagebackend import ElementTree, FileStorageBackend, XmlStorageBackend
+
+
+logger = logging.getLogger(__name__)
+
+
+class FsckReport(object):
+    """Findings of a check and the result of the rewrite"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.duplicates = []
+        self.orphans = []
+        self.bad_signatures = []
+        self.entries_before = 0
+        self.entries_after = None
+        self.bytes_before = 0
+        self.bytes_after = None
+        self.repaired = False
+
+    @property
+    def ok(self):
+        return not (self.duplicates or self.orphans or self.bad_signatures)
+
+    @property
+    def reclaimed_bytes(self):
+        if self.bytes_after is None:
+            return 0
+        return self.bytes_before - self.bytes_after
+
+    @property
+    def reclaimed_entries(self):
+        if self.entries_after is None:
+            return 0
+        return self.entries_before - self.entries_after
+
+    def __str__(self):
+        lines = ["%s: %s" % (self.filename, 'ok' if self.ok else 'damaged')]
+        for title, names in [('duplicate', self.duplicates),
+                             ('orphaned', self.orphans),
+                             ('signature mismatch', self.bad_signatures)]:
+            if names:
+                lines.append("  %d %s: %s" % (len(names), title,
+                                              ', '.join(names)))
+        lines.append("  %d entries, %d bytes" % (self.entries_before,
+                                                 self.bytes_before))
+        if self.repaired:
+            lines.append("  rewritten with %d entries, %d bytes: reclaimed "
+                         "%d entries, %d bytes" % (
+                             self.entries_after, self.bytes_after,
+                             self.reclaimed_entries, self.reclaimed_bytes))
+        return '\n'.join(lines)
+
+
+def check(filename, compression=None):
+    """Returns the FsckReport of the xml config `filename`"""
+    report = FsckReport(filename)
+    if not os.path.exists(filename):
+        return report
+    report.bytes_before = os.path.getsize(filename)
+    with open_file(filename, 'rb', compression) as f:
+        try:
+            root = ElementTree.parse(f).getroot()
+        except SyntaxError, msg:
+            raise RuntimeError("FATAL: XML settings file '%s' is invalid: "
+                               "%s" % (filename, msg))
+    seen = set()
+    for i, elem in enumerate(root):
+        report.entries_before += 1
+        names = elem.findall('name')
+        values = elem.findall('value')
+        name = (names[-1].text or '').strip() if names else ''
+        if elem.tag != 'var' or not name or not values:
+            report.orphans.append(name or '<%s #%d>' % (elem.tag, i))
+            continue
+        if len(names) > 1 or len(values) > 1 or name in seen:
+            report.duplicates.append(name)
+        seen.add(name)
+        value = values[-1]
+        sig = elem.get('signature')
+        if sig is not None and not FileStorageBackend.validate(
+                sig, name, (value.text or '').strip(),
+                value.get('type') or 'str'):
+            report.bad_signatures.append(name)
+    return report
+
+
+def rewrite(backend, report=None):
+    """Writes `backend` to its file atomically and completes `report`"""
+    with atomic_write(backend.filename, backend.compression,
+                      backend.fsync) as f:
+        f.write(backend.prettify(backend.tree().getroot()).encode('utf-8'))
+    backend.dirty = False
+    if report is not None:
+        report.entries_after = len(backend)
+        report.bytes_after = os.path.getsize(backend.filename)
+        report.repaired = True
+    return report
+
+
+def fsck(filename, repair=False, compression=None):
+    """Checks the xml config `filename` and rewrites it with `repair`
+
+    The rewrite keeps the last value of every variable and drops the
+    orphans. Signatures are kept as they are so `last_modified` still
+    notices values which were edited by hand.
+    """
+    report = check(filename, compression)
+    if repair and report.entries_before:
+        backend = XmlStorageBackend(filename, autosync=False,
+                                    compression=compression, fsync=ALWAYS)
+        rewrite(backend, report)
+        logger.info("Compacted '%s', reclaimed %d bytes", filename,
+                    report.reclaimed_bytes)
+    return report
@@ -0,0 +1,156 @@
+"""
+History
+
+Keeps previous versions of every key so a value can be looked up as it
+was at an earlier time. History is kept apart from the storage backend
+so reading the current value does not get any slower.
+
+When a `path` is given every change is appended to that file as a json
+line `[timestamp, key, value]`, a value of null records a deletion. The
+file is only read the first time the history is queried.
+"""
+import os
+import time
+import bisect
+import logging
+from lazyimport import LazyModule
+
+json = LazyModule('json')
+
+
+logger = logging.getLogger(__name__)
+
+
+class _Versions(object):
+    """Parallel lists of timestamps and values of one key, oldest first"""
+    __slots__ = ('times', 'values')
+
+    def __init__(self):
+        self.times = []
+        self.values = []
+
+
+class KeyHistory(object):
+    """
+    Bounded version history per key.
+
+    `max_versions` limits the number of versions kept per key and
+    `max_age` drops versions older than that many seconds. The newest
+    version of a key is always kept.
+    """
+    def __init__(self, path=None, max_versions=10, max_age=None):
+        self.path = path
+        self.max_versions = max_versions
+        self.max_age = max_age
+        self.keys = {}
+        self._loaded = path is None or not os.path.exists(path)
+        # Lines in the history file, used to decide when to compact it
+        self._lines = 0
+
+    def _prune(self, versions, now):
+        excess = len(versions.times) - self.max_versions
+        if self.max_versions and excess > 0:
+            del versions.times[:excess]
+            del versions.values[:excess]
+        if self.max_age is not None:
+            cutoff = now - self.max_age
+            old = bisect.bisect_left(versions.times, cutoff)
+            old = min(old, len(versions.times) - 1)
+            if old > 0:
+                del versions.times[:old]
+                del versions.values[:old]
+
+    def _add(self, key, value, timestamp):
+        versions = self.keys.get(key)
+        if versions is None:
+            versions = self.keys[key] = _Versions()
+        if versions.times and timestamp < versions.times[-1]:
+            # Keep the versions sorted even if the clock went backwards
+            timestamp = versions.times[-1]
+        versions.times.append(timestamp)
+        versions.values.append(value)
+        return versions
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        # Lines appended by `record` so far are read again
+        self._lines = 0
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    timestamp, key, value = json.loads(line)
+                except ValueError:
+                    logger.warn("Skipping corrupt line in history file "
+                                "'%s': %r", self.path, line)
+                    continue
+                self._add(key, value, timestamp)
+                self._lines += 1
+        now = time.time()
+        for versions in self.keys.values():
+            self._prune(versions, now)
+        self._compact_if_needed()
+
+    def _count(self):
+        return sum(len(v.times) for v in self.keys.values())
+
+    def _compact_if_needed(self):
+        # Until the file is loaded only the appended lines are known,
+        # so it is loaded after 100 of them and compacted if required
+        if self._lines > 2 * self._count() + 100:
+            if self._loaded:
+                self.compact()
+            else:
+                self._load()
+
+    def record(self, key, value, timestamp=None):
+        """Records that `key` changed to `value`, None for a deletion"""
+        timestamp = time.time() if timestamp is None else timestamp
+        if self.path is not None:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps([timestamp, key, value]) + '\n')
+            self._lines += 1
+        if self._loaded:
+            self._prune(self._add(key, value, timestamp), timestamp)
+        if self.path is not None:
+            self._compact_if_needed()
+
+    def history(self, key):
+        """Returns the `(timestamp, value)` versions of `key`, oldest first"""
+        self._load()
+        versions = self.keys.get(key)
+        if versions is None:
+            return []
+        return zip(versions.times, versions.values)
+
+    def value_at(self, key, timestamp):
+        """Returns the value `key` had at `timestamp`
+
+        Raises KeyError if the key did not exist at that time or if no
+        version that old has been kept.
+        """
+        self._load()
+        versions = self.keys.get(key)
+        if versions is not None:
+            i = bisect.bisect_right(versions.times, timestamp)
+            if i > 0 and versions.values[i - 1] is not None:
+                return versions.values[i - 1]
+        raise KeyError("key '%s' has no value as of %s" % (key, timestamp))
+
+    def __contains__(self, key):
+        self._load()
+        return key in self.keys
+
+    def compact(self):
+        """Rewrites the history file with only the retained versions"""
+        if self.path is None:
+            return
+        from compression import PLAIN
+        from durability import atomic_write
+        self._load()
+        with atomic_write(self.path, PLAIN) as f:
+            for key, versions in self.keys.iteritems():
+                for timestamp, value in zip(versions.times, versions.values):
+                    f.write(json.dumps([timestamp, key, value]) + '\n')
+        self._lines = self._count()
@@ -0,0 +1,57 @@
+"""
+LazyImport
+
+Defers importing heavy modules until they are actually used so that
+importing creoconfig stays cheap for short lived processes.
+"""
+import importlib
+
+
+class LazyModule(object):
+    """
+    Stands in for a module until one of its attributes is accessed.
+
+    Several module names can be given, the first one which can be
+    imported is used. This allows optional faster implementations to be
+    preferred over the standard library module.
+    """
+    def __init__(self, *names):
+        self.__dict__['_names'] = names
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            for name in self._names:
+                try:
+                    module = importlib.import_module(name)
+                    break
+                except ImportError:
+                    continue
+            else:
+                raise ImportError("None of the modules %s could be "
+                                  "imported." % ', '.join(self._names))
+            self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        module = self.__dict__['_module']
+        if module is None:
+            return "<lazy module %s>" % '|'.join(self._names)
+        return repr(module)
+
+
+def is_available(module):
+    """Returns True if the (lazy) module can be imported"""
+    if isinstance(module, LazyModule):
+        try:
+            module._load()
+        except ImportError:
+            return False
+    return module is not None
@@ -0,0 +1,356 @@
+"""
+Metrics
+
+Counters and histograms of what a Config and its backend are doing,
+rendered in the Prometheus text exposition format:
+
+    >>> from creoconfig import metrics
+    >>> metrics.instrument(config)
+    >>> print metrics.exposition()
+    >>> metrics.serve(9184)
+
+Only instrumented instances are measured. Their methods are wrapped on
+the instance itself, so other configs and the classes are untouched and
+a read only pays for one counter increment.
+"""
+import os
+import time
+import bisect
+import logging
+import weakref
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5,
+                   1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if value == float('-inf'):
+        return '-Inf'
+    return repr(float(value))
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, str(value).replace('\\', r'\\')
+                     .replace('\n', r'\n').replace('"', r'\"'))
+        for name, value in pairs)
+
+
+class _CounterChild(object):
+    __slots__ = ('value', 'lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+class _HistogramChild(object):
+    __slots__ = ('buckets', 'counts', 'sum', 'lock')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+
+class _GaugeChild(object):
+    """A gauge value which is set instead of computed"""
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = None
+
+    def set(self, value):
+        self.value = value
+
+    def __call__(self):
+        return self.value
+
+
+class Metric(object):
+    """A named metric with one child per combination of label values"""
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.children = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise RuntimeError("Must be implemented in child class.")
+
+    def child(self, *values):
+        """Returns the child of the label `values`, creating it if needed"""
+        if len(values) != len(self.labels):
+            raise ValueError("%s takes the labels %s" % (
+                self.name, ', '.join(self.labels)))
+        values = tuple(str(v) for v in values)
+        try:
+            return self.children[values]
+        except KeyError:
+            with self._lock:
+                return self.children.setdefault(values, self._new_child())
+
+    def samples(self):
+        """Returns the `(suffix, label values, extra labels, value)` of
+        every sample"""
+        raise RuntimeError("Must be implemented in child class.")
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.help),
+                 '# TYPE %s %s' % (self.name, self.type)]
+        for suffix, values, extra, value in self.samples():
+            lines.append('%s%s%s %s' % (
+                self.name, suffix, _format_labels(self.labels, values, extra),
+                _format_value(value)))
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.child().inc(amount)
+
+    def value(self, *values):
+        child = self.children.get(tuple(str(v) for v in values))
+        return 0.0 if child is None else child.value
+
+    def samples(self):
+        for values, child in sorted(self.children.items()):
+            yield '', values, (), child.value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.child().observe(value)
+
+    def samples(self):
+        for values, child in sorted(self.children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),),
+                                    child.counts):
+                cumulative += count
+                yield '_bucket', values, [('le', _format_value(bound))], \
+                    cumulative
+            yield '_sum', values, (), child.sum
+            yield '_count', values, (), cumulative
+
+
+class Gauge(Metric):
+    """A metric whose values are set on a child or computed by callbacks
+    when rendered"""
+    type = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self.child().set(value)
+
+    def set_function(self, func, *values):
+        """Reports the result of `func()` for the label `values`, no
+        sample is reported while it returns None"""
+        with self._lock:
+            self.children[tuple(str(v) for v in values)] = func
+
+    def remove(self, *values):
+        with self._lock:
+            self.children.pop(tuple(str(v) for v in values), None)
+
+    def samples(self):
+        for values, func in sorted(self.children.items()):
+            value = func()
+            if value is not None:
+                yield '', values, (), value
+
+
+class MetricRegistry(object):
+    """The metrics of creoconfig"""
+
+    def __init__(self):
+        self.operations = Counter(
+            'creoconfig_backend_operations_total',
+            'Operations run on the storage backends.', ('backend', 'op'))
+        self.sync_seconds = Histogram(
+            'creoconfig_sync_duration_seconds',
+            'Time spent writing the backends to storage.', ('backend',))
+        self.reloads = Counter(
+            'creoconfig_reloads_total',
+            'Times the backends were read again from storage.', ('backend',))
+        self.signature_mismatches = Counter(
+            'creoconfig_signature_mismatches_total',
+            'Values whose signature did not match, usually edited by hand.',
+            ('backend',))
+        self.prompts = Counter(
+            'creoconfig_prompt_fallbacks_total',
+            'Missing keys which were answered by prompting or by the default '
+            'of their option.')
+        self.file_size = Gauge(
+            'creoconfig_file_size_bytes',
+            'Size of the backing files.', ('backend', 'path'))
+        self.metrics = [self.operations, self.sync_seconds, self.reloads,
+                        self.signature_mismatches, self.prompts,
+                        self.file_size]
+
+    def exposition(self):
+        """Returns every metric in the Prometheus text format"""
+        return ''.join(m.render() + '\n' for m in self.metrics)
+
+
+REGISTRY = MetricRegistry()
+
+
+def exposition(registry=None):
+    return (registry or REGISTRY).exposition()
+
+
+def _file_size(ref):
+    def size():
+        backend = ref()
+        if backend is None:
+            return None
+        try:
+            return os.path.getsize(backend.filename)
+        except OSError:
+            return None
+    return size
+
+
+def _wrap_counted(backend, name, counter):
+    # The method is looked up on the class at call time, so methods patched
+    # later, e.g. by tracing, still run. The instance is held weakly so the
+    # wrapper does not keep it alive.
+    cls, ref = type(backend), weakref.ref(backend)
+
+    def counted(*args, **kwargs):
+        counter.inc()
+        return getattr(cls, name)(ref(), *args, **kwargs)
+    setattr(backend, name, counted)
+
+
+def _wrap_timed(backend, name, histogram):
+    cls, ref = type(backend), weakref.ref(backend)
+
+    def timed(*args, **kwargs):
+        start = time.time()
+        try:
+            return getattr(cls, name)(ref(), *args, **kwargs)
+        finally:
+            histogram.observe(time.time() - start)
+    setattr(backend, name, timed)
+
+
+def instrument_backend(backend, registry=None):
+    """Collects the metrics of `backend` until it is garbage collected"""
+    registry = registry or REGISTRY
+    if getattr(backend, '_metrics', None) is registry:
+        return backend
+    label = type(backend).__name__
+    for op in ('get', 'set', 'delete'):
+        if hasattr(backend, op):
+            _wrap_counted(backend, op, registry.operations.child(label, op))
+    if hasattr(backend, 'sync'):
+        _wrap_timed(backend, 'sync', registry.sync_seconds.child(label))
+    if hasattr(backend, 'reload'):
+        _wrap_counted(backend, 'reload', registry.reloads.child(label))
+    if hasattr(backend, 'signature_mismatch'):
+        _wrap_counted(backend, 'signature_mismatch',
+                      registry.signature_mismatches.child(label))
+    if isinstance(getattr(backend, 'filename', None), basestring):
+        path = os.path.abspath(backend.filename)
+        # The sample goes away with the backend
+        ref = weakref.ref(backend,
+                          lambda ref: registry.file_size.remove(label, path))
+        registry.file_size.set_function(_file_size(ref), label, path)
+    backend._metrics = registry
+    return backend
+
+
+def instrument(config, registry=None):
+    """Collects the metrics of `config` and of its backend"""
+    registry = registry or REGISTRY
+    instrument_backend(config._store, registry)
+    if config.__dict__.get('_metrics') is not registry:
+        prompts = registry.prompts.child()
+        auto_prompt = config._auto_prompt
+
+        def counted(key):
+            value = auto_prompt(key)
+            prompts.inc()
+            return value
+        # Config.__setattr__ would store these as config values
+        object.__setattr__(config, '_auto_prompt', counted)
+        object.__setattr__(config, '_metrics', registry)
+    return config
+
+
+def serve(port=9184, address='127.0.0.1', registry=None):
+    """Serves the metrics on http://address:port/metrics from a daemon
+    thread and returns the server, call its `shutdown` to stop it"""
+    import BaseHTTPServer
+    registry = registry or REGISTRY
+
+    class MetricsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = registry.exposition()
+            self.send_response(200)
+            self.send_header('Content-Type',
+                             'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(format, *args)
+
+    server = BaseHTTPServer.HTTPServer((address, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever,
+                              name='creoconfig-metrics')
+    thread.daemon = True
+    thread.start()
+    logger.info("Serving metrics on http://%s:%d/metrics", address,
+                server.server_port)
+    return server
@@ -0,0 +1,126 @@
+"""
+Registry
+
+Selects the storage backend from a URI such as `xml://settings.xml` or
+`ini:///etc/app/settings.cfg?section=app`. Backends are registered by
+their import path so their module is only imported on first use.
+"""
+import os
+import weakref
+import importlib
+import threading
+
+
+# Plain filenames without a scheme use this backend
+DEFAULT_SCHEME = 'xml'
+
+_backends = {
+    'mem': 'creoconfig.storagebackend:MemStorageBackend',
+    'xml': 'creoconfig.storagebackend:XmlStorageBackend',
+    'ini': 'creoconfig.storagebackend:ConfigParserStorageBackend',
+    'multiini': 'creoconfig.storagebackend:IniStorageBackend',
+    'json': 'creoconfig.storagebackend:JsonStorageBackend',
+    'shard': 'creoconfig.storagebackend:ShardedStorageBackend',
+    'shm': 'creoconfig.sharedmem:SharedMemStorageBackend',
+    'daemon': 'creoconfig.daemon:DaemonStorageBackend',
+}
+
+# Backends handed out by `open_shared` while anything still uses them
+_shared = weakref.WeakValueDictionary()
+_shared_lock = threading.Lock()
+
+
+def register_backend(scheme, backend):
+    """Registers a backend class for `scheme`
+
+    `backend` is either the class itself or its import path written as
+    'package.module:ClassName' which is imported when first used.
+    """
+    _backends[scheme.lower()] = backend
+
+
+def get_backend(scheme):
+    """Returns the backend class registered for `scheme`"""
+    try:
+        backend = _backends[scheme.lower()]
+    except KeyError:
+        raise ValueError("No storage backend registered for '%s://'. "
+                         "Known schemes: %s" % (
+                             scheme, ', '.join(sorted(_backends))))
+    if isinstance(backend, basestring):
+        module, _, name = backend.partition(':')
+        backend = getattr(importlib.import_module(module), name)
+        _backends[scheme.lower()] = backend
+    return backend
+
+
+def _option(value):
+    if value.lower() in ('true', 'yes', 'on'):
+        return True
+    if value.lower() in ('false', 'no', 'off'):
+        return False
+    return value
+
+
+def parse_uri(uri):
+    """Splits `uri` into its scheme, path and options
+
+    Options come from the query string and are passed to the backend
+    as keyword arguments. A URI without a scheme is a plain filename.
+    """
+    scheme, sep, rest = uri.partition('://')
+    if not sep:
+        return DEFAULT_SCHEME, uri, {}
+    path, _, query = rest.partition('?')
+    options = {}
+    if query:
+        from urlparse import parse_qsl
+        options = dict((k, _option(v)) for k, v in parse_qsl(query))
+    return scheme, path, options
+
+
+def open_backend(uri, **kwargs):
+    """Creates the storage backend described by `uri`
+
+    Extra keyword arguments are passed to the backend and take precedence
+    over options given in the URI.
+    """
+    scheme, path, options = parse_uri(uri)
+    options.update(kwargs)
+    backend = get_backend(scheme)
+    if path:
+        return backend(path, **options)
+    return backend(**options)
+
+
+def _file_state(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime, st.st_size
+
+
+def open_shared(uri, **kwargs):
+    """Returns the backend for `uri` shared with every other caller
+
+    Backends are interned per process on their scheme, resolved path and
+    options, so every Config opened this way on the same file uses one
+    parsed copy and sees the writes made through the others. The backend
+    is read again when the file changed on disk since it was last opened
+    and it has no unsaved changes.
+    """
+    scheme, path, options = parse_uri(uri)
+    options.update(kwargs)
+    key = (scheme.lower(), os.path.realpath(path) if path else path,
+           tuple(sorted(options.items())))
+    with _shared_lock:
+        backend = _shared.get(key)
+        if backend is None:
+            backend = open_backend(uri, **kwargs)
+            _shared[key] = backend
+        elif path and not getattr(backend, 'dirty', False):
+            if _file_state(path) != backend._shared_state:
+                backend.reload()
+        backend._shared_state = _file_state(path) if path else None
+    return backend
@@ -0,0 +1,237 @@
+"""
+SharedMem
+
+Publishes a read only snapshot of a config into shared memory so that
+the workers of a pre-fork server can use it without parsing anything.
+
+The snapshot is a memory mapped file (kept in /dev/shm when available)
+with a compact, offset indexed layout:
+
+    header  magic, layout version, generation, entry count
+    index   one (key offset, key length, value offset, value length)
+            record per entry, sorted by key
+    data    the encoded keys and values
+
+Every publish writes a new segment and renames it over the old one. The
+generation in the header of the replaced segment is then bumped so
+attached workers can see that they should re-attach.
+"""
+import os
+import mmap
+import struct
+import logging
+import tempfile
+import collections
+from config import Config
+from exceptions import ReadOnlyError, ConfigException
+
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'CCSM'
+LAYOUT_VERSION = 1
+# magic, layout version, flags, generation, entry count, data offset
+HEADER = struct.Struct('<4sHHQII')
+# key offset, key length, value offset, value length
+INDEX = struct.Struct('<IIII')
+# Offset of the generation counter inside the header
+GENERATION_OFFSET = 8
+GENERATION = struct.Struct('<Q')
+
+
+def segment_path(name):
+    """Returns the path of the shared memory segment called `name`
+
+    Names containing a path separator are used as they are.
+    """
+    if os.sep in name:
+        return name
+    if os.path.isdir('/dev/shm'):
+        return os.path.join('/dev/shm', name)
+    return os.path.join(tempfile.gettempdir(), name)
+
+
+def _encode(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return str(value)
+
+
+def pack(items, generation=1):
+    """Returns the segment bytes holding the `(key, value)` pairs"""
+    entries = sorted((_encode(k), _encode(v)) for k, v in items)
+    data_offset = HEADER.size + INDEX.size * len(entries)
+    index = []
+    data = []
+    offset = data_offset
+    for key, value in entries:
+        index.append(INDEX.pack(offset, len(key),
+                                offset + len(key), len(value)))
+        data.append(key)
+        data.append(value)
+        offset += len(key) + len(value)
+    header = HEADER.pack(MAGIC, LAYOUT_VERSION, 0, generation,
+                         len(entries), data_offset)
+    return b''.join([header] + index + data)
+
+
+class SharedConfigPublisher(object):
+    """
+    Writes snapshots of a config into the shared memory segment `name`.
+
+    The publisher keeps the current segment open so it can flag it as
+    replaced on the next publish.
+    """
+    def __init__(self, name):
+        self.path = segment_path(name)
+        self.generation = 0
+        self._mm = None
+
+    def publish(self, config):
+        """Publishes the content of `config` and returns its generation"""
+        items = getattr(config, 'iteritems', config.items)()
+        self.generation += 1
+        tmp = '%s.%d.tmp' % (self.path, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(pack(items, self.generation))
+        os.rename(tmp, self.path)
+
+        # Let workers attached to the old segment know it was replaced
+        if self._mm is not None:
+            GENERATION.pack_into(self._mm, GENERATION_OFFSET, self.generation)
+            self._mm.close()
+        with open(self.path, 'r+b') as f:
+            self._mm = mmap.mmap(f.fileno(), 0)
+        logger.debug("Published generation %d to %s",
+                     self.generation, self.path)
+        return self.generation
+
+    def close(self, unlink=False):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if unlink and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class SharedMemStorageBackend(collections.Mapping):
+    """
+    Read only storage backend on top of a published shared memory segment.
+
+    Lookups are a binary search over the sorted index so nothing has to
+    be parsed when attaching. With `auto_reattach` every lookup first
+    checks whether a newer generation was published.
+    """
+    def __init__(self, name, auto_reattach=False, *args, **kwargs):
+        self.path = segment_path(name)
+        self.auto_reattach = auto_reattach
+        self._mm = None
+        self.attach()
+
+    def attach(self):
+        """Maps the current segment into memory"""
+        if self._mm is not None:
+            self._mm.close()
+        with open(self.path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, _, self.generation, self.count,
+         self.data_offset) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != LAYOUT_VERSION:
+            raise ConfigException("'%s' is not a creoconfig shared memory "
+                                  "segment." % self.path)
+        return self.generation
+
+    def stale(self):
+        """Returns True if a newer generation has been published"""
+        current, = GENERATION.unpack_from(self._mm, GENERATION_OFFSET)
+        return current != self.generation
+
+    def refresh(self):
+        """Re-attaches if the segment is stale, returns True if it did"""
+        if self.stale():
+            self.attach()
+            return True
+        return False
+
+    def _entry(self, i):
+        return INDEX.unpack_from(self._mm, HEADER.size + INDEX.size * i)
+
+    def _key(self, i):
+        koff, klen, _, _ = self._entry(i)
+        return self._mm[koff:koff + klen]
+
+    def __getitem__(self, key):
+        if self.auto_reattach:
+            self.refresh()
+        key = _encode(key)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            koff, klen, voff, vlen = self._entry(mid)
+            k = self._mm[koff:koff + klen]
+            if k < key:
+                lo = mid + 1
+            elif k > key:
+                hi = mid
+            else:
+                return self._mm[voff:voff + vlen]
+        raise KeyError("key %s was not found in shared config" % key)
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self._key(i)
+
+    def iteritems(self):
+        for i in range(self.count):
+            koff, klen, voff, vlen = self._entry(i)
+            yield self._mm[koff:koff + klen], self._mm[voff:voff + vlen]
+
+    def items(self):
+        return list(self.iteritems())
+
+    def __len__(self):
+        return self.count
+
+    def get(self, key):
+        """Override the default get since we want to throw an exception
+        if a key is not found
+        """
+        return self.__getitem__(key)
+
+    def _read_only(self, *args, **kwargs):
+        raise ReadOnlyError("Shared config '%s' is read only." % self.path)
+
+    # deferred_sync only groups writes, on this backend it fails up front
+    set = delete = __setitem__ = __delitem__ = _read_only
+    set_expiry = deferred_sync = _read_only
+
+    def expiries(self):
+        """Keys do not expire in a published snapshot"""
+        return {}
+
+    def reload(self):
+        """Maps the current generation again"""
+        self.attach()
+
+    def last_modified(self, key):
+        """Not supported for this backend"""
+        self[key]
+        return None
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+
+def publish(config, name):
+    """Publishes `config` once and returns the publisher for updates"""
+    publisher = SharedConfigPublisher(name)
+    publisher.publish(config)
+    return publisher
+
+
+def attach(name, auto_reattach=True):
+    """Returns a read only Config view of the shared segment `name`"""
+    return Config(backend=SharedMemStorageBackend(
+        name, auto_reattach=auto_reattach), batch=True)
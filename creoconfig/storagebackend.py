@@ -2,25 +2,43 @@
 StorageBackend
 """
 import os
+import re
 import time
-import hmac
-import hashlib
+import atexit
 import logging
+import weakref
+import contextlib
 import collections
-import ConfigParser
-try:
-    from xml.etree import cElementTree as ElementTree
-except ImportError:
-    from xml.etree import ElementTree
-from xml.dom import minidom
+from lazyimport import LazyModule
+from compression import PLAIN, detect, open_file
+from durability import BATCHED, atomic_write, check_policy
+
+# The parsers and hashing modules are only imported once a file backend
+# uses them, this keeps memory only configs cheap to import.
+hmac = LazyModule('hmac')
+hashlib = LazyModule('hashlib')
+ConfigParser = LazyModule('ConfigParser')
+ElementTree = LazyModule('xml.etree.cElementTree', 'xml.etree.ElementTree')
+minidom = LazyModule('xml.dom.minidom')
+# Use a faster json codec if one has been installed
+json = LazyModule('ujson', 'simplejson', 'json')
 
 
 logger = logging.getLogger(__name__)
 
 
+def _utf8(value):
+    # Values are utf-8 encoded str, json and callers may hand out unicode
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
 class MemStorageBackend(collections.MutableMapping):
     def __init__(self, *args, **kwargs):
         self.store = {}
+        # Expiry epoch times of keys, only kept in memory by this backend
+        self.expiry = {}
 
     def __setitem__(self, key, value):
         self.store[key] = value
@@ -38,6 +56,13 @@ class MemStorageBackend(collections.MutableMapping):
     def __len__(self):
         return len(self.store)
 
+    def iteritems(self):
+        """Yields every `(key, value)` pair in a single pass of the store"""
+        return self.store.iteritems()
+
+    def items(self):
+        return list(self.iteritems())
+
     def set(self, key, value):
         return self.__setitem__(key, value)
 
@@ -54,29 +79,152 @@ class MemStorageBackend(collections.MutableMapping):
         """Not supported yet for this backend"""
         return None
 
+    def expiries(self):
+        """Returns the `{key: epoch}` expiry times set with `set_expiry`"""
+        return dict(self.expiry)
+
+    def set_expiry(self, key, at):
+        """Sets the epoch time `key` expires at, None removes it"""
+        if at is None:
+            self.expiry.pop(key, None)
+        else:
+            self.expiry[key] = at
+
+    def reload(self):
+        """Memory backends have nothing to read again"""
+        pass
+
+    @contextlib.contextmanager
+    def deferred_sync(self):
+        """Groups several changes into a single write to disk
+
+        Memory backends have nothing to write so this does nothing.
+        """
+        yield self
+
 
 class FileStorageBackend(MemStorageBackend):
-    def __init__(self, filename, *args, **kwargs):
+    def __init__(self, filename, autosync=True, compression=None,
+                 fsync=BATCHED, *args, **kwargs):
         self.filename = filename
+        # When autosync is disabled changes are only written to disk
+        # when `sync` is called explicitly.
+        self.autosync = autosync
+        # Compression codec of the file. None will detect it from the
+        # existing file or from the file extension for new files.
+        self.compression = compression
+        # How hard writes are pushed to the disk, see `durability`
+        self.fsync = check_policy(fsync)
+        self.dirty = False
         super(FileStorageBackend, self).__init__(*args, **kwargs)
 
+    def exists(self):
+        """Returns True if the backing file exists and is not empty"""
+        return (os.path.exists(self.filename) and
+                os.path.getsize(self.filename) > 0)
+
+    def _open(self, mode='rb'):
+        """Opens the backing file compressing or decompressing as required"""
+        if self.compression is None and 'r' in mode:
+            # Keep writing the file with the codec it was found with
+            self.compression = detect(self.filename) or PLAIN
+        return open_file(self.filename, mode, self.compression)
+
+    def _replace(self):
+        """Opens a temporary file which atomically replaces the backing
+        file once it is closed"""
+        return atomic_write(self.filename, self.compression, self.fsync)
+
+    def _changed(self):
+        """Called after every modification of the store"""
+        if self.autosync:
+            self.sync()
+        else:
+            self.dirty = True
+
+    def load(self):
+        raise RuntimeError("Must be implemented in child class.")
+
+    def reload(self):
+        """Discards unsaved changes and reads the file again"""
+        self.load()
+        self.dirty = False
+
     def sync(self):
         raise RuntimeError("Must be implemented in child class.")
 
+    def signature_mismatch(self, key):
+        """Called when the signature of `key` does not match its value,
+        returns the last modified time to report for it"""
+        logger.warn("Key '%s' signature mismatch. Setting last modified "
+                    "time to NOW()", key)
+        return time.time()
+
+    @contextlib.contextmanager
+    def deferred_sync(self):
+        """Groups several changes into a single write to disk
+
+        Changes made inside the block are written with one `sync` when
+        the block exits, even if an exception was raised.
+        """
+        autosync = self.autosync
+        self.autosync = False
+        try:
+            yield self
+        finally:
+            self.autosync = autosync
+            if autosync and self.dirty:
+                self.sync()
+
+    @staticmethod
+    def sign(*args):
+        """
+        generates a hash signature from the input arguments which
+        can be used to check for future tampering.
+        """
+        sig = hmac.new(b'creoconfig.storagebackend', digestmod=hashlib.sha1)
+        for arg in args:
+            sig.update(bytes(_utf8(arg)))
+        return sig.digest().encode("base64").rstrip('\n')
+
+    @staticmethod
+    def _compare_digest(x, y):
+        return x == y
+        if not (isinstance(x, bytes) and isinstance(y, bytes)):
+            raise TypeError("both inputs should be instances of bytes")
+        if len(x) != len(y):
+            return False
+        result = 0
+        for a, b in zip(x, y):
+            result |= a ^ b
+        return (result == 0)
+
+    @staticmethod
+    def validate(signature, *args):
+        gensig = FileStorageBackend.sign(*args)
+        return FileStorageBackend._compare_digest(
+            bytes(gensig), bytes(signature))
+
 
 class ConfigParserStorageBackend(FileStorageBackend):
-    def __init__(self, filename, section='DEFAULT', *args, **kwargs):
-        self.filename = filename
+    def __init__(self, filename, section='DEFAULT', autosync=True,
+                 compression=None, fsync=BATCHED, *args, **kwargs):
+        super(ConfigParserStorageBackend, self).__init__(
+            filename, autosync=autosync, compression=compression,
+            fsync=fsync)
         self.section = section
+        self.load()
+
+    def load(self):
         self.store = ConfigParser.RawConfigParser()
         # self.store.add_section(self.section)
-        self.store.read(self.filename)
-        # with open(self.filename) as f:
-        #     self.store.readfp(f)
+        if self.exists():
+            with self._open('rb') as f:
+                self.store.readfp(f, self.filename)
 
     def __setitem__(self, key, value):
         self.store.set(self.section, key, value)
-        self.sync()
+        self._changed()
         return True
 
     def __getitem__(self, key):
@@ -91,7 +239,7 @@ class ConfigParserStorageBackend(FileStorageBackend):
     def __delitem__(self, key):
         if not self.store.remove_option(self.section, key):
             raise KeyError("Could not find key '%s' to delete." % key)
-        self.sync()
+        self._changed()
 
     def __iter__(self):
         for k, v in self.store.items(self.section):
@@ -100,99 +248,139 @@ class ConfigParserStorageBackend(FileStorageBackend):
     def __len__(self):
         return len(self.store.items(self.section))
 
+    def iteritems(self):
+        return iter(self.store.items(self.section))
+
     def sync(self):
-        with open(self.filename, 'wb') as f:
+        with self._replace() as f:
             self.store.write(f)
+        self.dirty = False
+
+
+def _intern(name):
+    # Type names repeat for every variable, share a single copy
+    return intern(name) if isinstance(name, str) else name
+
+
+class _Record(object):
+    """One variable of an xml config"""
+    __slots__ = ('name', 'value', 'type', 'timestamp', 'signature',
+                 'expires')
+
+    def __init__(self, name, value, type, timestamp=None, signature=None,
+                 expires=None):
+        self.name = name
+        self.value = value
+        self.type = type
+        self.timestamp = timestamp
+        self.signature = signature
+        self.expires = expires
 
 
 class XmlStorageBackend(ConfigParserStorageBackend):
-    def __init__(self, filename, hashentries=True, *args, **kwargs):
+    """
+    Stores the variables in an xml document.
+
+    The variables are kept in memory as compact records indexed by name,
+    the ElementTree is only built while writing the file.
+    """
+    def __init__(self, filename, hashentries=True, autosync=True,
+                 compression=None, fsync=BATCHED, *args, **kwargs):
         # Specify the name of the xml element for variables
         self.version = '1.0.0'
-        self.filename = filename
+        FileStorageBackend.__init__(self, filename, autosync=autosync,
+                                    compression=compression, fsync=fsync)
         self.hashentries = hashentries
-        if os.path.exists(self.filename) and os.path.getsize(self.filename) > 0:
-            with open(self.filename) as f:
+        self.load()
+
+    def load(self):
+        self.store = {}
+        # Names in file order. Deleted names are left in place and skipped,
+        # the list is compacted once they make up half of it.
+        self.order = []
+        if self.exists():
+            with self._open('rb') as f:
                 try:
-                    self.store = ElementTree.parse(f)
-                except ElementTree.ParseError:
+                    self._parse(f)
+                except SyntaxError:
                     raise RuntimeError("""FATAL: XML settings file is invalid!
                         Please check the file '%s' with an xml linter to ensure
                         the syntax is correct and that is also conforms to the
                         formatting for a valid config file. If in doubt rename
                         this file and run this command again to generate a
                         clean template.""" % self.filename)
-                self.version = self.store.getroot().get('version')
-        else:
-            # Create a basic config file with no variables
-            config = ElementTree.Element('config')
-            config.set('version', self.version)
-            self.store = ElementTree.ElementTree(config)
 
         if self.version != '1.0.0':
             print "XML file is not a valid configuration version."
 
-    @staticmethod
-    def sign(*args):
-        """
-        generates a hash signature from the input arguments which
-        can be used to check for future tampering.
-        """
-        sig = hmac.new(b'creoconfig.storagebackend', digestmod=hashlib.sha1)
-        for arg in args:
-            sig.update(bytes(arg))
-        return sig.digest().encode("base64").rstrip('\n')
+    def _parse(self, f):
+        root = None
+        for event, elem in ElementTree.iterparse(f, ('start', 'end')):
+            if root is None:
+                root = elem
+                self.version = root.get('version')
+            elif event == 'end' and elem.tag == 'var':
+                record = self._record(elem)
+                root.clear()
+                if record is None:
+                    logger.warn("Skipping variable without a name or value "
+                                "in '%s'", self.filename)
+                    continue
+                if record.name not in self.store:
+                    self.order.append(record.name)
+                self.store[record.name] = record
 
     @staticmethod
-    def _compare_digest(x, y):
-        return x == y
-        if not (isinstance(x, bytes) and isinstance(y, bytes)):
-            raise TypeError("both inputs should be instances of bytes")
-        if len(x) != len(y):
-            return False
-        result = 0
-        for a, b in zip(x, y):
-            result |= a ^ b
-        return (result == 0)
+    def _record(var):
+        """Builds the record of a `var` element
 
-    @staticmethod
-    def validate(signature, *args):
-        gensig = XmlStorageBackend.sign(*args)
-        return XmlStorageBackend._compare_digest(
-            bytes(gensig), bytes(signature))
+        Files written by older versions may hold several name and value
+        children per variable, the last one is the current value. Returns
+        None for a variable without a name or value.
+        """
+        names = var.findall('name')
+        values = var.findall('value')
+        if not names or not values or not (names[-1].text or '').strip():
+            return None
+        value = values[-1]
+        text = (value.text or '').strip()
+        if not text and var.find('default') is not None:
+            text = (var.find('default').text or '').strip()
+        timestamp = var.get('timestamp')
+        expires = var.get('expires')
+        return _Record(
+            names[-1].text.strip(), text,
+            _intern(value.get('type') or 'str'),
+            float(timestamp) if timestamp is not None else None,
+            var.get('signature'),
+            float(expires) if expires is not None else None)
 
     def __setitem__(self, key, value):
-        # If the value exists just replace it otherwise create new
         if not isinstance(key, basestring):
             raise TypeError("Key must be of string type")
-        node = None
-        for var in self.store.iter('var'):
-            if var.find('name').text.strip() == key:
-                node = var
-        if node is None:
-            node = ElementTree.SubElement(self.store.getroot(), 'var')
-        node_name = ElementTree.SubElement(node, 'name')
-        node_value = ElementTree.SubElement(node, 'value')
-        node_name.text = key
-        node_value.text = str(value)
-        # We also will store the original type of the value
-        node_value.set('type', type(value).__name__)
-
+        record = _Record(key, str(value), type(value).__name__)
         # Check if we should add the hash signature
         if self.hashentries:
-            node.set('timestamp', str(time.time()))
-            sig = self.sign(key, str(value), type(value).__name__)
-            node.set('signature', sig)
+            record.timestamp = time.time()
+            record.signature = self.sign(key, record.value, record.type)
+        old = self.store.get(key)
+        if old is None:
+            self.order.append(key)
+            if len(self.order) > 2 * len(self.store) + 16:
+                self._compact_order()
+        else:
+            record.expires = old.expires
+        self.store[key] = record
         # Save this new information to disk
-        self.sync()
+        self._changed()
         return True
 
     def __getitem__(self, key):
         """TODO: Still need to use 'type' attr to cast value"""
-        for var in self.store.iter('var'):
-            if var.find('name').text.strip() == key:
-                return var.find('value').text.strip() or var.find('default').text.strip()
-        raise KeyError("name %s was not found in xml file!" % key)
+        try:
+            return self.store[key].value
+        except (KeyError, TypeError):
+            raise KeyError("name %s was not found in xml file!" % key)
 
     def last_modified(self, key):
         """
@@ -200,50 +388,101 @@ class XmlStorageBackend(ConfigParserStorageBackend):
 
         raises a keyerror if key does not exist.
         """
-        for var in self.store.iter('var'):
-            if var.find('name').text.strip() == key:
-                if self.hashentries:
-                    ts = var.get('timestamp')
-                    # Need to detect of config was modified outside of this
-                    # program. Check the signature hash to ensure it is the
-                    # same
-                    val = var.get('value')
-                    typ = var.get('type')
-                    sig = var.get('signature')
-                    valid = self.validate(sig, key, val, typ)
-                    if valid:
-                        logger.debug("Signature for key '%s' is valid!" % key)
-                        return float(ts)
-                    else:
-                        logger.warn("Key '%s' signature mismatch. Setting last modified time to NOW()" % key)
-                        return time.time()
-                else:
-                    return None
-        raise KeyError("name %s was not found in xml file!" % key)
+        try:
+            record = self.store[key]
+        except KeyError:
+            raise KeyError("name %s was not found in xml file!" % key)
+        if not self.hashentries:
+            return None
+        # Need to detect of config was modified outside of this
+        # program. Check the signature hash to ensure it is the same
+        if record.signature and self.validate(
+                record.signature, key, record.value, record.type):
+            logger.debug("Signature for key '%s' is valid!", key)
+            return record.timestamp
+        return self.signature_mismatch(key)
 
     def __delitem__(self, key):
-        for var in self.store.findall('var'):
-            if var.find('name').text.strip() == key:
-                self.store.getroot().remove(var)
-                # Save this update disk
-                self.sync()
-                return True
-        raise KeyError("key %s was not found in config file" % key)
+        try:
+            del self.store[key]
+        except KeyError:
+            raise KeyError("key %s was not found in config file" % key)
+        # Save this update disk
+        self._changed()
+        return True
 
     def __iter__(self):
-        data = {}
-        for var in self.store.findall('var'):
-            data[var.find('name').text.strip()] = var.find('value').text.strip()
-        return iter(data)
+        return iter(self.store)
 
     def __len__(self):
-        return len(self.store.findall('var'))
+        return len(self.store)
+
+    def iteritems(self):
+        for name, record in self.store.iteritems():
+            yield name, record.value
+
+    def expiries(self):
+        return dict((name, record.expires)
+                    for name, record in self.store.iteritems()
+                    if record.expires is not None)
+
+    def set_expiry(self, key, at):
+        """Stores the expiry as an attribute of the variable"""
+        record = self.store.get(key)
+        if record is not None:
+            record.expires = at
+            self._changed()
+
+    def records(self):
+        """Returns the records in file order"""
+        return [self.store[name] for name in self._compact_order()]
+
+    def _compact_order(self):
+        """Drops the deleted names from the order and returns it"""
+        # A name deleted and set again is listed twice, the last one is
+        # where it was added again.
+        seen = set()
+        order = []
+        for name in reversed(self.order):
+            if name in self.store and name not in seen:
+                seen.add(name)
+                order.append(name)
+        order.reverse()
+        self.order = order
+        return order
+
+    def tree(self):
+        """Builds the ElementTree of the stored variables"""
+        config = ElementTree.Element('config')
+        config.set('version', self.version)
+        for record in self.records():
+            var = ElementTree.SubElement(config, 'var')
+            if record.timestamp is not None:
+                var.set('timestamp', repr(record.timestamp))
+            if record.signature is not None:
+                var.set('signature', record.signature)
+            if record.expires is not None:
+                var.set('expires', repr(record.expires))
+            ElementTree.SubElement(var, 'name').text = record.name
+            value = ElementTree.SubElement(var, 'value')
+            value.text = record.value
+            # We also will store the original type of the value
+            value.set('type', record.type)
+        return ElementTree.ElementTree(config)
 
     def sync(self):
         """Write the xml data to the file with expanded subelements"""
-        with open(self.filename, 'w+') as f:
-            f.write(self.prettify(self.store.getroot()))
-            # self.store.write(f, method='html')
+        with self._replace() as f:
+            f.write(self.prettify(self.tree().getroot()).encode('utf-8'))
+        self.dirty = False
+
+    def compact(self):
+        """Rewrites the file atomically with only the current variables
+
+        Returns the `FsckReport` of the file as it was before.
+        """
+        from fsck import check, rewrite
+        return rewrite(self, check(self.filename, self.compression))
 
     @staticmethod
     def prettify(elem):
@@ -251,3 +490,438 @@ class XmlStorageBackend(ConfigParserStorageBackend):
         rough_string = ElementTree.tostring(elem, 'utf-8')
         reparsed = minidom.parseString(rough_string)
         return reparsed.toprettyxml(indent="\t")
+
+
+class JsonStorageBackend(FileStorageBackend):
+    """
+    Stores the variables in a compact json document.
+
+    Every variable is kept as a list of `[value, type]` followed by the
+    timestamp and signature when `hashentries` is enabled. Expiry times
+    are kept apart in an `expires` object.
+    """
+    def __init__(self, filename, hashentries=True, autosync=True,
+                 compression=None, fsync=BATCHED, *args, **kwargs):
+        super(JsonStorageBackend, self).__init__(
+            filename, autosync=autosync, compression=compression,
+            fsync=fsync)
+        self.version = '1.0.0'
+        self.hashentries = hashentries
+        self.load()
+
+    def load(self):
+        self.store = {}
+        self.expiry = {}
+        if self.exists():
+            with self._open('rb') as f:
+                try:
+                    data = json.load(f)
+                except ValueError:
+                    raise RuntimeError("FATAL: JSON settings file '%s' is "
+                                       "invalid!" % self.filename)
+            self.version = data.get('version')
+            # json decodes every string to unicode, store the same utf-8
+            # str the other backends hold. The decoded entries are popped
+            # as they are converted so both copies are never held at once.
+            entries = data.pop('vars', {})
+            while entries:
+                key, entry = entries.popitem()
+                for i, field in enumerate(entry):
+                    entry[i] = _utf8(field)
+                self.store[_utf8(key)] = entry
+            self.expiry = dict((_utf8(key), at) for key, at in
+                               data.get('expires', {}).iteritems())
+
+        if self.version != '1.0.0':
+            logger.warn("JSON file '%s' has the unsupported configuration "
+                        "version %r.", self.filename, self.version)
+
+    def __setitem__(self, key, value):
+        if not isinstance(key, basestring):
+            raise TypeError("Key must be of string type")
+        key, value = _utf8(key), _utf8(value)
+        entry = [str(value), type(value).__name__]
+        if self.hashentries:
+            entry.append(time.time())
+            entry.append(self.sign(key, entry[0], entry[1]))
+        self.store[key] = entry
+        self._changed()
+        return True
+
+    def iteritems(self):
+        for key, entry in self.store.iteritems():
+            yield key, entry[0]
+
+    def set_expiry(self, key, at):
+        super(JsonStorageBackend, self).set_expiry(key, at)
+        self._changed()
+
+    def __getitem__(self, key):
+        try:
+            return self.store[key][0]
+        except KeyError:
+            raise KeyError("name %s was not found in json file!" % key)
+
+    def __delitem__(self, key):
+        try:
+            del self.store[key]
+        except KeyError:
+            raise KeyError("key %s was not found in config file" % key)
+        self._changed()
+
+    def last_modified(self, key):
+        """
+        Returns the last modified time epoch float if the key exists
+
+        raises a keyerror if key does not exist.
+        """
+        try:
+            entry = self.store[key]
+        except KeyError:
+            raise KeyError("name %s was not found in json file!" % key)
+        if len(entry) < 4:
+            return None
+        val, typ, ts, sig = entry[:4]
+        if self.validate(sig, key, val, typ):
+            logger.debug("Signature for key '%s' is valid!", key)
+            return float(ts)
+        return self.signature_mismatch(key)
+
+    def sync(self):
+        """Write the json document to the file"""
+        data = {'version': self.version, 'vars': self.store}
+        if self.expiry:
+            data['expires'] = self.expiry
+        with self._replace() as f:
+            if json.__name__ == 'ujson':
+                f.write(json.dumps(data))
+            else:
+                f.write(json.dumps(data, separators=(',', ':')))
+        self.dirty = False
+
+
+class ShardedStorageBackend(FileStorageBackend):
+    """
+    Stores every namespace of keys in its own file under `directory`.
+
+    The namespace of a key is the part in front of the first `separator`,
+    keys without a separator are kept in the `default` shard. A shard is
+    only parsed the first time one of its keys is accessed and `sync` only
+    writes the shards which have been modified.
+    """
+    def __init__(self, directory, backend=None, extension='.xml',
+                 separator='.', default='DEFAULT', autosync=True,
+                 fsync=BATCHED, *args, **kwargs):
+        super(ShardedStorageBackend, self).__init__(
+            directory, autosync=autosync, fsync=fsync)
+        self.directory = directory
+        self.backend = backend or XmlStorageBackend
+        self.extension = extension
+        self.separator = separator
+        self.default = default
+        # Loaded shard backends keyed by their namespace
+        self.shards = {}
+        self.dirty_shards = set()
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    def namespace(self, key):
+        """Returns the name of the shard which holds `key`"""
+        if not isinstance(key, basestring):
+            raise TypeError("Key must be of string type")
+        namespace, sep, _ = key.partition(self.separator)
+        if not sep:
+            return self.default
+        if not re.match('^[A-Za-z0-9_-]+$', namespace):
+            raise KeyError("'%s' is not a valid namespace for key '%s'" % (
+                namespace, key))
+        return namespace
+
+    def namespaces(self):
+        """Returns the names of all loaded shards and shards on disk"""
+        names = set(self.shards)
+        for f in os.listdir(self.directory):
+            if f.endswith(self.extension):
+                names.add(f[:-len(self.extension)])
+        return sorted(names)
+
+    def shard(self, namespace):
+        """Returns the backend for `namespace` loading it if required"""
+        try:
+            return self.shards[namespace]
+        except KeyError:
+            filename = os.path.join(self.directory, namespace + self.extension)
+            logger.debug("Loading shard '%s' from %s", namespace, filename)
+            shard = self.backend(filename, autosync=False, fsync=self.fsync)
+            self.shards[namespace] = shard
+            return shard
+
+    def _shard_changed(self, namespace):
+        self.dirty_shards.add(namespace)
+        self._changed()
+
+    def __setitem__(self, key, value):
+        namespace = self.namespace(key)
+        self.shard(namespace).set(key, value)
+        self._shard_changed(namespace)
+        return True
+
+    def __getitem__(self, key):
+        return self.shard(self.namespace(key))[key]
+
+    def __delitem__(self, key):
+        namespace = self.namespace(key)
+        self.shard(namespace).delete(key)
+        self._shard_changed(namespace)
+
+    def __iter__(self):
+        for namespace in self.namespaces():
+            for key in self.shard(namespace):
+                yield key
+
+    def __len__(self):
+        return sum(len(self.shard(ns)) for ns in self.namespaces())
+
+    def iteritems(self):
+        for namespace in self.namespaces():
+            for item in self.shard(namespace).iteritems():
+                yield item
+
+    def last_modified(self, key):
+        return self.shard(self.namespace(key)).last_modified(key)
+
+    def load(self):
+        """Forgets the loaded shards so they are read again on access"""
+        self.shards = {}
+        self.dirty_shards = set()
+
+    def sync(self):
+        """Write every modified shard to its file"""
+        while self.dirty_shards:
+            self.shards[self.dirty_shards.pop()].sync()
+        self.dirty = False
+
+
+class IniSection(collections.MutableMapping):
+    """
+    View of one section of an IniStorageBackend.
+
+    Options are accessed without the section prefix and every change
+    goes through the backend so it is written with the next sync.
+    """
+    def __init__(self, backend, name):
+        # A proxy, so the views cached by the backend do not keep it alive
+        # and its pending changes are written as soon as it is dropped
+        self.backend = weakref.proxy(backend)
+        self.name = name
+
+    def _options(self):
+        return self.backend.sections.get(self.name, {})
+
+    def __getitem__(self, option):
+        try:
+            return self._options()[option]
+        except KeyError:
+            raise KeyError("option %s was not found in section %s" % (
+                option, self.name))
+
+    def __setitem__(self, option, value):
+        self.backend.set_option(self.name, option, value)
+
+    def __delitem__(self, option):
+        self.backend.remove_option(self.name, option)
+
+    def __iter__(self):
+        return iter(self._options())
+
+    def __len__(self):
+        return len(self._options())
+
+    def __repr__(self):
+        return "<IniSection %s of %s>" % (self.name, self.backend.filename)
+
+
+class IniStorageBackend(FileStorageBackend):
+    """
+    Stores the variables in every section of one ini file.
+
+    The section of a key is the part in front of the first `separator`,
+    keys without a separator are kept in the `default` section. Sections
+    are plain ordered dicts so len and iteration do not copy anything, and
+    values are not interpolated.
+
+    Writes are deferred by default: changes are written by `sync` or
+    `close`, when the backend is garbage collected or when the interpreter
+    exits, whichever comes first. Pass `autosync=True` to write every
+    change immediately.
+    """
+    def __init__(self, filename, default='DEFAULT', separator='.',
+                 autosync=False, compression=None, fsync=BATCHED,
+                 *args, **kwargs):
+        super(IniStorageBackend, self).__init__(
+            filename, autosync=autosync, compression=compression,
+            fsync=fsync)
+        self.default = default
+        self.separator = separator
+        self._views = {}
+        self.load()
+
+    def load(self):
+        self.sections = collections.OrderedDict()
+        # Whether the file was read or written, a file which was removed
+        # since is not created again by the pending changes
+        self._on_disk = self.exists()
+        if self._on_disk:
+            with self._open('rb') as f:
+                self._parse(f)
+
+    def _parse(self, lines):
+        options = option = None
+        for lineno, line in enumerate(lines, 1):
+            stripped = line.strip()
+            if not stripped or stripped[0] in '#;':
+                continue
+            if line[0].isspace() and option is not None:
+                # Continuation of a multi line value
+                options[option] += '\n' + stripped
+                continue
+            if stripped[0] == '[' and stripped[-1] == ']':
+                options = self.sections.setdefault(
+                    stripped[1:-1].strip(), collections.OrderedDict())
+                option = None
+                continue
+            match = re.match(r'([^:=]+?)\s*[:=]\s*(.*)$', stripped)
+            if options is None or match is None:
+                raise RuntimeError("FATAL: ini settings file '%s' is invalid "
+                                   "on line %d: %r" % (self.filename, lineno,
+                                                       line))
+            option, value = match.groups()
+            options[option] = value
+
+    def split(self, key):
+        """Returns the `(section, option)` which holds `key`"""
+        if not isinstance(key, basestring):
+            raise TypeError("Key must be of string type")
+        section, sep, option = key.partition(self.separator)
+        if not sep:
+            return self.default, key
+        return section, option
+
+    def _key(self, section, option):
+        if section == self.default:
+            return option
+        return section + self.separator + option
+
+    def section_names(self):
+        return list(self.sections)
+
+    def section(self, name):
+        """Returns a view of the options in section `name`"""
+        try:
+            return self._views[name]
+        except KeyError:
+            view = self._views[name] = IniSection(self, name)
+            return view
+
+    def set_option(self, section, option, value):
+        options = self.sections.get(section)
+        if options is None:
+            options = self.sections[section] = collections.OrderedDict()
+        options[option] = str(value)
+        self._changed()
+        return True
+
+    def remove_option(self, section, option):
+        try:
+            del self.sections[section][option]
+        except KeyError:
+            raise KeyError("key %s was not found in config file" %
+                           self._key(section, option))
+        if not self.sections[section]:
+            del self.sections[section]
+        self._changed()
+
+    def __setitem__(self, key, value):
+        return self.set_option(*(self.split(key) + (value,)))
+
+    def __getitem__(self, key):
+        section, option = self.split(key)
+        try:
+            return self.sections[section][option]
+        except KeyError:
+            raise KeyError("name %s was not found in ini file!" % key)
+
+    def __delitem__(self, key):
+        self.remove_option(*self.split(key))
+
+    def __iter__(self):
+        for section, options in self.sections.iteritems():
+            for option in options:
+                yield self._key(section, option)
+
+    def __len__(self):
+        return sum(len(options) for options in self.sections.itervalues())
+
+    def iteritems(self):
+        for section, options in self.sections.iteritems():
+            for option, value in options.iteritems():
+                yield self._key(section, option), value
+
+    def _changed(self):
+        super(IniStorageBackend, self)._changed()
+        if self.dirty:
+            _dirty_at_exit[id(self)] = self
+
+    def sync(self):
+        """Write every section to the file in a single pass"""
+        lines = []
+        for section, options in self.sections.iteritems():
+            lines.append('[%s]\n' % section)
+            for option, value in options.iteritems():
+                lines.append('%s = %s\n' % (option,
+                                            value.replace('\n', '\n\t')))
+            lines.append('\n')
+        with self._replace() as f:
+            f.write(''.join(lines))
+        self.dirty = False
+        self._on_disk = True
+        _dirty_at_exit.pop(id(self), None)
+
+    def close(self):
+        """Writes any pending changes"""
+        if self.dirty:
+            self.sync()
+
+    def _flush_pending(self):
+        """Writes the pending changes unless the file was removed since it
+        was read or written, returns True if it was written"""
+        if not self.dirty:
+            return False
+        if self._on_disk and not os.path.exists(self.filename):
+            logger.debug("Not recreating the removed '%s'", self.filename)
+            return False
+        try:
+            self.sync()
+        except (IOError, OSError), msg:
+            logger.warn("Could not write the pending changes of '%s': %s",
+                        self.filename, msg)
+            return False
+        return True
+
+    def __del__(self):
+        if getattr(self, 'dirty', False):
+            self._flush_pending()
+
+
+# Ini backends with pending changes which are written when the interpreter
+# exits, keyed by id as mappings are not hashable. A backend collected
+# before writes them itself.
+_dirty_at_exit = weakref.WeakValueDictionary()
+
+
+def _sync_at_exit():
+    for backend in _dirty_at_exit.values():
+        backend._flush_pending()
+
+
+atexit.register(_sync_at_exit)
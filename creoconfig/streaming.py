@@ -0,0 +1,178 @@
+"""
+Streaming
+
+Writes and reads configs one entry at a time so that moving a config
+between backends or formats never needs the whole config in memory.
+
+Supported formats:
+
+    xml     the document written by XmlStorageBackend
+    jsonl   one json list `[key, value]` per line
+    ini     sections of options, keys are written as 'section.option'
+"""
+import re
+import itertools
+from lazyimport import LazyModule
+
+ElementTree = LazyModule('xml.etree.cElementTree', 'xml.etree.ElementTree')
+saxutils = LazyModule('xml.sax.saxutils')
+json = LazyModule('ujson', 'simplejson', 'json')
+
+
+FORMATS = ('xml', 'jsonl', 'ini')
+# Keys without a section are written to this ini section
+INI_DEFAULT = 'DEFAULT'
+
+
+def _text(value):
+    if isinstance(value, unicode):
+        return value
+    return str(value).decode('utf-8')
+
+
+def _str(value):
+    # Config stores utf-8 encoded str values
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
+def iter_xml(items):
+    yield u'<?xml version="1.0" ?>\n<config version="1.0.0">\n'
+    for key, value in items:
+        yield (u'\t<var>\n\t\t<name>%s</name>\n'
+               u'\t\t<value type="str">%s</value>\n\t</var>\n' % (
+                   saxutils.escape(_text(key)), saxutils.escape(_text(value))))
+    yield u'</config>\n'
+
+
+def iter_jsonl(items):
+    for item in items:
+        yield json.dumps(list(item)) + '\n'
+
+
+def iter_ini(items, separator='.'):
+    """Yields the ini lines of `items`
+
+    The options of a section must not be spread over the whole config
+    so the items are grouped by section as they come. A section which
+    appears again later is written as a second header with the same name,
+    which ini readers merge.
+    """
+    def section(item):
+        section, sep, _ = item[0].partition(separator)
+        return section if sep else INI_DEFAULT
+
+    for name, group in itertools.groupby(items, section):
+        yield u'[%s]\n' % _text(name)
+        for key, value in group:
+            if name != INI_DEFAULT:
+                key = key[len(name) + len(separator):]
+            yield u'%s = %s\n' % (_text(key),
+                                   _text(value).replace('\n', '\n\t'))
+        yield u'\n'
+
+
+WRITERS = {
+    'xml': iter_xml,
+    'jsonl': iter_jsonl,
+    'ini': iter_ini,
+}
+
+
+def read_xml(stream):
+    root = None
+    for event, elem in ElementTree.iterparse(stream, ('start', 'end')):
+        if root is None:
+            root = elem
+        elif event == 'end' and elem.tag == 'var':
+            value = elem.find('value')
+            yield (_str(elem.find('name').text.strip()),
+                   _str((value.text or '').strip()))
+            # Drop the parsed entries so memory use stays bounded
+            root.clear()
+
+
+def read_jsonl(stream):
+    for lineno, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            key, value = json.loads(line)
+        except ValueError:
+            raise ValueError("Invalid jsonl entry on line %d: %r" % (
+                lineno, line))
+        yield _str(key), _str(value)
+
+
+def read_ini(stream, separator='.'):
+    section = key = value = None
+    for lineno, line in enumerate(stream, 1):
+        stripped = line.strip()
+        if not stripped or stripped[0] in '#;':
+            continue
+        if line[0].isspace() and key is not None:
+            value += '\n' + stripped
+            continue
+        if key is not None:
+            yield key, value
+            key = None
+        if stripped[0] == '[' and stripped[-1] == ']':
+            section = stripped[1:-1].strip()
+            continue
+        match = re.match(r'([^:=]+?)\s*[:=]\s*(.*)$', stripped)
+        if section is None or match is None:
+            raise ValueError("Invalid ini entry on line %d: %r" % (
+                lineno, line))
+        key, value = match.groups()
+        if section != INI_DEFAULT:
+            key = section + separator + key
+    if key is not None:
+        yield key, value
+
+
+READERS = {
+    'xml': read_xml,
+    'jsonl': read_jsonl,
+    'ini': read_ini,
+}
+
+
+def _lookup(table, format):
+    try:
+        return table[format]
+    except KeyError:
+        raise ValueError("Unknown format '%s', expected one of: %s" % (
+            format, ', '.join(FORMATS)))
+
+
+def export(items, stream, format='jsonl'):
+    """Writes the `(key, value)` pairs to `stream`, returns the count"""
+    writer = _lookup(WRITERS, format)
+    count = [0]
+
+    def counted():
+        for item in items:
+            count[0] += 1
+            yield item
+
+    for chunk in writer(counted()):
+        if not isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        stream.write(chunk)
+    return count[0]
+
+
+def chunks(iterable, size):
+    """Yields lists of at most `size` items from `iterable`"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def read(stream, format='jsonl'):
+    """Yields the `(key, value)` pairs stored in `stream`"""
+    return _lookup(READERS, format)(stream)
@@ -0,0 +1,132 @@
+"""
+Subscriptions
+
+Lets components react to changed keys. A pattern containing one of the
+glob wildcards `*`, `?` or `[` is matched with fnmatch, any other pattern
+matches every key starting with it.
+
+Subscriptions are indexed by the literal prefix of their pattern so a
+change only looks at the subscriptions whose prefix is a prefix of the
+changed key instead of testing every pattern.
+"""
+import re
+import Queue
+import fnmatch
+import logging
+import threading
+import collections
+
+
+logger = logging.getLogger(__name__)
+
+GLOB_CHARS = re.compile(r'[*?\[]')
+
+ChangeEvent = collections.namedtuple('ChangeEvent', 'action key value')
+
+
+class Subscription(object):
+    """A registered callback, call `cancel` to stop receiving changes"""
+
+    def __init__(self, index, pattern, callback, queued=False):
+        self.index = index
+        self.pattern = pattern
+        self.callback = callback
+        self.queued = queued
+        match = GLOB_CHARS.search(pattern)
+        if match is None:
+            self.prefix = pattern
+            self.regex = None
+        else:
+            self.prefix = pattern[:match.start()]
+            self.regex = re.compile(fnmatch.translate(pattern))
+
+    def matches(self, key):
+        return self.regex is None or self.regex.match(key) is not None
+
+    def cancel(self):
+        self.index.remove(self)
+
+    def __repr__(self):
+        return "<Subscription %s -> %r>" % (self.pattern, self.callback)
+
+
+class SubscriptionIndex(object):
+    """
+    Finds the subscriptions for a key by looking up every prefix of the
+    key, so the cost depends on the key length and not on the number of
+    subscriptions.
+
+    Queued subscriptions are delivered from a worker thread which is
+    started when the first one is added.
+    """
+    def __init__(self):
+        self.prefixes = {}
+        self.lock = threading.Lock()
+        self.queue = None
+        self._worker = None
+
+    def __len__(self):
+        return sum(len(subs) for subs in self.prefixes.values())
+
+    def add(self, pattern, callback, queued=False):
+        sub = Subscription(self, pattern, callback, queued)
+        with self.lock:
+            # Copy on write so notify never needs the lock
+            subs = list(self.prefixes.get(sub.prefix, []))
+            subs.append(sub)
+            self.prefixes[sub.prefix] = subs
+            if queued and self._worker is None:
+                self.queue = Queue.Queue()
+                self._worker = threading.Thread(target=self._deliver_loop)
+                self._worker.daemon = True
+                self._worker.start()
+        return sub
+
+    def remove(self, sub):
+        with self.lock:
+            subs = [s for s in self.prefixes.get(sub.prefix, [])
+                    if s is not sub]
+            if subs:
+                self.prefixes[sub.prefix] = subs
+            else:
+                self.prefixes.pop(sub.prefix, None)
+
+    def match(self, key):
+        """Returns the subscriptions interested in `key`"""
+        prefixes = self.prefixes
+        found = []
+        for i in range(len(key) + 1):
+            subs = prefixes.get(key[:i])
+            if subs:
+                found.extend(s for s in subs if s.matches(key))
+        return found
+
+    def notify(self, action, key, value=None):
+        subs = self.match(key)
+        if not subs:
+            return
+        event = ChangeEvent(action, key, value)
+        for sub in subs:
+            if sub.queued:
+                self.queue.put((sub, event))
+            else:
+                self._deliver(sub, event)
+
+    def _deliver(self, sub, event):
+        try:
+            sub.callback(event)
+        except Exception:
+            logger.exception("Subscriber %r failed for %s", sub, event)
+
+    def _deliver_loop(self):
+        while True:
+            sub, event = self.queue.get()
+            try:
+                self._deliver(sub, event)
+            finally:
+                self.queue.task_done()
+
+    def join(self):
+        """Waits until all queued changes have been delivered"""
+        if self.queue is not None:
+            self.queue.join()
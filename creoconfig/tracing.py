@@ -0,0 +1,170 @@
+"""
+Tracing
+
+Hooks called with the timing of every Config and storage backend
+operation:
+
+    >>> from creoconfig import tracing
+    >>> def hook(span):
+    ...     print span.op, span.key, span.duration
+    >>> tracing.add_hook(hook)
+
+The classes are only patched while at least one hook is registered.
+Without hooks the original methods are in place, so tracing costs
+nothing when it is not used.
+"""
+import time
+import logging
+import threading
+import contextlib
+import collections
+import storagebackend
+from config import Config
+
+
+logger = logging.getLogger(__name__)
+
+
+# `component` is the class running the operation and `error` the
+# exception it raised, if any
+Span = collections.namedtuple(
+    'Span', 'op component key start duration error')
+
+# Traced method names and the operation they are reported as
+OPERATIONS = {
+    'get': 'get',
+    '_set': 'set',
+    'set': 'set',
+    '_delete': 'delete',
+    'delete': 'delete',
+    'sync': 'sync',
+    'load': 'parse',
+    'sign': 'sign',
+    'validate': 'validate',
+}
+
+_hooks = ()
+_patched = []
+_lock = threading.Lock()
+# Traced operations running in the current thread
+_running = threading.local()
+
+
+def _classes():
+    classes = [Config]
+    for value in vars(storagebackend).values():
+        if (isinstance(value, type) and
+                issubclass(value, storagebackend.MemStorageBackend)):
+            classes.append(value)
+    return classes
+
+
+def _emit(span):
+    for hook in _hooks:
+        try:
+            hook(span)
+        except Exception:
+            logger.exception("Tracing hook %r failed", hook)
+
+
+def _traced_method(op, func):
+    def traced(self, *args, **kwargs):
+        # Config.set runs through Config._set and a subclass may call the
+        # method it overrides, only the outermost call is reported
+        running = _running.__dict__.setdefault('ops', set())
+        nested = (id(self), op)
+        if nested in running:
+            return func(self, *args, **kwargs)
+        running.add(nested)
+        key = args[0] if args else kwargs.get('key')
+        start = time.time()
+        error = None
+        try:
+            return func(self, *args, **kwargs)
+        except Exception, error:
+            raise
+        finally:
+            running.discard(nested)
+            _emit(Span(op, type(self).__name__, key, start,
+                       time.time() - start, error))
+    traced.__name__ = func.__name__
+    traced.__doc__ = func.__doc__
+    return traced
+
+
+def _traced_static(op, cls, func, key_index):
+    def traced(*args):
+        start = time.time()
+        error = None
+        try:
+            return func(*args)
+        except Exception, error:
+            raise
+        finally:
+            key = args[key_index] if len(args) > key_index else None
+            _emit(Span(op, cls.__name__, key, start, time.time() - start,
+                       error))
+    traced.__name__ = func.__name__
+    traced.__doc__ = func.__doc__
+    return staticmethod(traced)
+
+
+def _install():
+    for cls in _classes():
+        for name, op in OPERATIONS.items():
+            original = cls.__dict__.get(name)
+            if original is None:
+                continue
+            if isinstance(original, staticmethod):
+                # sign(key, ...) and validate(signature, key, ...)
+                func = original.__get__(None, cls)
+                traced = _traced_static(op, cls, func,
+                                        1 if name == 'validate' else 0)
+            else:
+                traced = _traced_method(op, original)
+            setattr(cls, name, traced)
+            _patched.append((cls, name, original))
+    logger.debug("Tracing %d methods", len(_patched))
+
+
+def _uninstall():
+    while _patched:
+        cls, name, original = _patched.pop()
+        setattr(cls, name, original)
+
+
+def add_hook(hook):
+    """Calls `hook(span)` after every traced operation"""
+    global _hooks
+    with _lock:
+        if hook in _hooks:
+            return hook
+        if not _hooks:
+            _install()
+        _hooks = _hooks + (hook,)
+    return hook
+
+
+def remove_hook(hook):
+    """Stops calling `hook`, the classes are restored after the last one"""
+    global _hooks
+    with _lock:
+        if hook not in _hooks:
+            raise ValueError("%r is not a registered tracing hook" % (hook,))
+        _hooks = tuple(h for h in _hooks if h is not hook)
+        if not _hooks:
+            _uninstall()
+
+
+def is_enabled():
+    return bool(_hooks)
+
+
+@contextlib.contextmanager
+def traced(hook):
+    """Registers `hook` for the duration of the block"""
+    add_hook(hook)
+    try:
+        yield hook
+    finally:
+        remove_hook(hook)
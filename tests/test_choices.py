@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+"""
+UnitTest framework for validating option choices
+"""
+import gc
+import sys
+import time
+import threading
+try:
+    import unittest2 as unittest
+except:
+    import unittest
+from mock import patch, MagicMock
+from creoconfig import choices
+from creoconfig.choices import *
+from creoconfig.exceptions import IllegalArgumentError
+from creoconfig.configobject import ConfigObject
+
+
+class TestCaseChoices(unittest.TestCase):
+
+    def test_membership(self):
+        c = Choices([1, 2, 3, 10, 2])
+        self.assertTrue('10' in c)
+        self.assertFalse(10 in c)
+        self.assertFalse([] in c)
+        self.assertEqual(list(c), ['1', '2', '3', '10'])
+        self.assertEqual(len(c), 4)
+        self.assertEqual(c, ['1', '2', '3', '10'])
+        self.assertFalse(Choices())
+
+    def test_complete(self):
+        c = Choices(['web2', 'db1', 'web1', 'web10', 'dbx'])
+        self.assertEqual(c.complete('web1'), ['web1', 'web10'])
+        self.assertEqual(c.complete('db', limit=1), ['db1'])
+        self.assertEqual(c.complete('x'), [])
+        self.assertEqual(len(c.complete('')), 5)
+
+    def test_summary(self):
+        c = Choices('host%d' % i for i in range(50000))
+        self.assertEqual(c.summary(limit=2), 'host0, host1, ... (49998 more)')
+        self.assertEqual(Choices(['a', 'b']).summary(), 'a, b')
+
+    def test_completer(self):
+        complete = Completer(Choices(['web1', 'web2', 'db1']))
+        self.assertEqual(complete('we', 0), 'web1')
+        self.assertEqual(complete('we', 1), 'web2')
+        self.assertEqual(complete('we', 2), None)
+
+    def test_large_choice_set(self):
+        c = Choices('host-%06d.example.com' % i for i in range(100000))
+        start = time.time()
+        for i in range(1000):
+            self.assertTrue('host-%06d.example.com' % (i * 97) in c)
+            self.assertEqual(len(c.complete('host-%05d' % i)), 10)
+        # Both are sub-millisecond even on a slow test machine
+        self.assertTrue(time.time() - start < 1.0)
+
+    @patch('__builtin__.raw_input', return_value='host-000002')
+    def test_prompt_summary(self, raw_input):
+        option = ConfigObject('host', prefix='Host',
+                              choices=['host-%06d' % i for i in range(1000)])
+        self.assertEqual(option.prompt(), 'host-000002')
+        self.assertTrue(option.msg.startswith('Host [host-000000, '))
+        self.assertTrue('(990 more)' in option.msg)
+
+
+class TestCaseProvidedChoices(unittest.TestCase):
+
+    def setUp(self):
+        clear_provided_choices()
+        self.calls = 0
+        self.now = 1000.0
+        patcher = patch('time.time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def clusters(self):
+        self.calls += 1
+        return ['east', 'west']
+
+    def test_lazy(self):
+        option = ConfigObject('cluster', choices=self.clusters)
+        self.assertEqual(self.calls, 0)
+        self.assertTrue('east' in option.choices)
+        self.assertEqual(option.choices.complete('w'), ['west'])
+        self.assertEqual(self.calls, 1)
+
+    def test_shared(self):
+        a = ConfigObject('a', choices=self.clusters)
+        b = ConfigObject('b', choices=self.clusters)
+        self.assertEqual(list(a.choices), list(b.choices))
+        self.assertEqual(self.calls, 1)
+
+    def test_ttl(self):
+        option = ConfigObject('cluster', choices=self.clusters,
+                              choices_ttl=60)
+        len(option.choices)
+        self.now += 30
+        len(option.choices)
+        self.assertEqual(self.calls, 1)
+        self.now += 30
+        len(option.choices)
+        self.assertEqual(self.calls, 2)
+
+    def test_generator(self):
+        option = ConfigObject('n', type=int, choices=(i for i in range(3)))
+        self.assertEqual(list(option.choices), ['0', '1', '2'])
+        self.assertEqual(list(option.choices), ['0', '1', '2'])
+
+    def test_type_checked_on_use(self):
+        option = ConfigObject('n', type=int, choices=lambda: ['1', 2])
+        self.assertRaises(IllegalArgumentError, len, option.choices)
+
+    @patch('__builtin__.raw_input', return_value='west')
+    def test_prompt(self, raw_input):
+        option = ConfigObject('cluster', prefix='Cluster',
+                              choices=self.clusters)
+        self.assertEqual(option.prompt(), 'west')
+        self.assertEqual(option.msg, 'Cluster [east, west]: ')
+
+    @patch('__builtin__.raw_input', return_value='west')
+    def test_prompt_readline(self, raw_input):
+        readline = MagicMock(__doc__='Importing this module enables '
+                             'command line editing using GNU readline.')
+        readline.get_completer.return_value = None
+        readline.get_completer_delims.return_value = ' \t\n'
+        option = ConfigObject('cluster', choices=self.clusters)
+        with patch.dict(sys.modules, {'readline': readline}):
+            self.assertEqual(option.prompt(), 'west')
+            completer = readline.set_completer.call_args_list[0][0][0]
+            self.assertEqual(completer('w', 0), 'west')
+            # Restored afterwards and GNU key bindings are untouched
+            readline.set_completer.assert_called_with(None)
+            readline.set_completer_delims.assert_called_with(' \t\n')
+            self.assertFalse(readline.parse_and_bind.called)
+            readline.__doc__ = 'Importing this module enables ... libedit'
+            option.prompt()
+            readline.parse_and_bind.assert_called_with('bind ^I rl_complete')
+
+    def test_computed_once_concurrently(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow():
+            self.calls += 1
+            started.set()
+            release.wait(5)
+            return ['east']
+        results = []
+        threads = [threading.Thread(
+            target=lambda: results.append(provided_choices(slow)))
+            for _ in range(4)]
+        threads[0].start()
+        started.wait(5)
+        for t in threads[1:]:
+            t.start()
+        release.set()
+        for t in threads:
+            t.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(len(set(map(id, results))), 1)
+
+    def test_dropped_with_provider(self):
+        class Inventory(object):
+            def hosts(self):
+                return ['a']
+        inventory = Inventory()
+
+        def clusters():
+            return ['east']
+        provided_choices(inventory.hosts)
+        provided_choices(clusters)
+        self.assertEqual(len(choices._provided), 2)
+        # A bound method is created again on every access
+        self.assertTrue(provided_choices(inventory.hosts) is
+                        provided_choices(inventory.hosts))
+        del inventory, clusters
+        gc.collect()
+        self.assertEqual(choices._provided, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
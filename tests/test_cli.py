@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+"""
+UnitTest framework for validating the command line tool
+"""
+import os
+import sys
+import json
+import base64
+import subprocess
+from StringIO import StringIO
+try:
+    import unittest2 as unittest
+except:
+    import unittest
+from mock import patch
+from creoconfig.cli import main
+from creoconfig.storagebackend import JsonStorageBackend
+
+
+class TestCaseCli(unittest.TestCase):
+
+    def setUp(self):
+        self.filename = 'tmp_%s.json' % base64.b16encode(os.urandom(16))
+        self.uri = 'json://' + self.filename
+
+    def run_cli(self, *argv, **kwargs):
+        stdout = StringIO()
+        with patch('sys.stderr', StringIO()) as stderr:
+            status = main(list(argv), StringIO(kwargs.get('stdin', '')),
+                          stdout)
+        return status, stdout.getvalue(), stderr.getvalue()
+
+    def test_set_get_delete(self):
+        self.assertEqual(self.run_cli(self.uri, 'set', 'mykey', 'myval')[0],
+                         0)
+        self.assertEqual(self.run_cli(self.uri, 'get', 'mykey'),
+                         (0, 'myval\n', ''))
+        self.assertEqual(self.run_cli(self.uri, 'delete', 'mykey')[0], 0)
+        status, out, err = self.run_cli(self.uri, 'get', 'mykey')
+        self.assertEqual(status, 1)
+        self.assertTrue("'mykey' was not found" in err)
+        self.assertEqual(self.run_cli(self.uri, 'get', 'mykey', '-d', 'x'),
+                         (0, 'x\n', ''))
+
+    def test_dump(self):
+        self.run_cli(self.uri, 'set', 'mykey', 'myval')
+        status, out, err = self.run_cli(self.uri, 'dump')
+        self.assertEqual(json.loads(out), ['mykey', 'myval'])
+        self.assertTrue('[DEFAULT]' in
+                        self.run_cli(self.uri, 'dump', '-f', 'ini')[1])
+
+    def test_apply_single_sync(self):
+        script = ('# deploy\n'
+                  'set db_host localhost\n'
+                  'set motd "hello world"\n'
+                  '\n'
+                  'set old gone\n'
+                  'delete old\n'
+                  'get motd\n')
+        with patch.object(JsonStorageBackend, 'sync',
+                          autospec=True,
+                          side_effect=JsonStorageBackend.sync) as sync:
+            status, out, err = self.run_cli(self.uri, 'apply', stdin=script)
+        self.assertEqual((status, out, err), (0, 'hello world\n', ''))
+        self.assertEqual(sync.call_count, 1)
+        s = JsonStorageBackend(self.filename)
+        self.assertItemsEqual(s.items(), [('db_host', 'localhost'),
+                                          ('motd', 'hello world')])
+
+    def test_apply_error(self):
+        status, out, err = self.run_cli(self.uri, 'apply',
+                                        stdin='set a 1\nfrobnicate b\n')
+        self.assertEqual(status, 1)
+        self.assertTrue('line 2' in err)
+        # Nothing is applied from a script with an invalid line
+        self.assertFalse(os.path.exists(self.filename))
+        status, out, err = self.run_cli(self.uri, 'apply',
+                                        stdin='set a\n')
+        self.assertEqual(status, 1)
+
+    def test_apply_missing_key(self):
+        self.run_cli(self.uri, 'set', 'b', '1')
+        status, out, err = self.run_cli(self.uri, 'apply',
+                                        stdin='set a 1\ndelete missing\n')
+        self.assertEqual(status, 1)
+        self.assertTrue("operation 2: key 'missing' was not found" in err)
+        status, out, err = self.run_cli(self.uri, 'apply',
+                                        stdin='delete b\nget b\n')
+        self.assertEqual(status, 1)
+        # Nothing was changed by the failed scripts
+        s = JsonStorageBackend(self.filename)
+        self.assertEqual(s.items(), [('b', '1')])
+        status, out, err = self.run_cli(self.uri, 'apply',
+                                        stdin='delete b\nset b 2\nget b\n')
+        self.assertEqual((status, out), (0, '2\n'))
+
+    def test_fsck(self):
+        xml = self.filename[:-5] + '.xml'
+        self.addCleanup(os.remove, xml)
+        with open(xml, 'w') as f:
+            f.write('<config version="1.0.0"><var>'
+                    '<name>k</name><value type="str">a</value>'
+                    '<name>k</name><value type="str">b</value>'
+                    '</var></config>')
+        status, out, err = self.run_cli(xml, 'fsck')
+        self.assertEqual(status, 1)
+        self.assertTrue('1 duplicate: k' in out)
+        status, out, err = self.run_cli('xml://' + os.path.abspath(xml),
+                                        'fsck')
+        self.assertEqual(status, 1)
+        self.assertTrue('1 duplicate: k' in out)
+        status, out, err = self.run_cli(xml, 'fsck', '--repair')
+        self.assertEqual(status, 0)
+        self.assertTrue('reclaimed' in out)
+        status, out, err = self.run_cli(self.uri, 'fsck')
+        self.assertEqual(status, 1)
+        self.assertTrue('only checks xml configs' in err)
+
+    def test_lazy_imports(self):
+        out = subprocess.check_output([sys.executable, '-c', (
+            'import sys, creoconfig.cli; '
+            'print(sorted(m for m in sys.modules if sys.modules[m] and '
+            'm.split(".")[-1] in ("streaming", "expiry", "history", '
+            '"subscriptions", "choices", "durability", "storagebackend")))'
+        )])
+        self.assertEqual(out.strip(), '[]')
+
+    def test_module_entry_point(self):
+        out = subprocess.check_output(
+            [sys.executable, '-m', 'creoconfig', self.uri, 'get', 'nokey',
+             '-d', 'fallback'])
+        self.assertEqual(out, 'fallback\n')
+
+    def tearDown(self):
+        try:
+            os.remove(self.filename)
+        except OSError:
+            pass
+
+
+if __name__ == '__main__':
+    unittest.main()
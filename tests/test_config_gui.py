@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+"""
+UnitTest framework for validating the config editor
+"""
+try:
+    import unittest2 as unittest
+except:
+    import unittest
+from mock import patch
+from creoconfig import Config
+from creoconfig.configobject import ConfigObject
+from creoconfig.config_gui import (
+    KeyIndex, Debouncer, check_value, ConfigEditor, Tkinter)
+
+
+class FakeTimer(object):
+    """Stands in for the `after` scheduling of a Tk widget"""
+
+    def __init__(self):
+        self.calls = {}
+        self.next_id = 0
+
+    def after(self, delay, func):
+        self.next_id += 1
+        self.calls[self.next_id] = func
+        return self.next_id
+
+    def after_cancel(self, timer):
+        del self.calls[timer]
+
+    def fire(self):
+        calls, self.calls = self.calls, {}
+        for func in calls.values():
+            func()
+
+
+class FakeWidget(object):
+    """Records the options of a Tk widget"""
+
+    def __init__(self, parent=None, **options):
+        self.options = options
+        self.bindings = {}
+
+    def pack(self, **options):
+        pass
+
+    def bind(self, event, func):
+        self.bindings[event] = func
+
+    def config(self, **options):
+        self.options.update(options)
+
+    def set(self, *args):
+        self.options['view'] = args
+
+
+class FakeStringVar(object):
+
+    def __init__(self):
+        self.value = ''
+        self.callbacks = []
+
+    def trace(self, mode, func):
+        self.callbacks.append(func)
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+        for func in self.callbacks:
+            func('name', '', 'w')
+
+
+class FakeRoot(FakeTimer):
+
+    def __init__(self):
+        super(FakeRoot, self).__init__()
+        self.destroyed = False
+
+    def title(self, text):
+        self.text = text
+
+    def protocol(self, name, func):
+        pass
+
+    def destroy(self):
+        self.destroyed = True
+
+
+class FakeTkinter(object):
+    """The parts of the Tkinter module used by the editor"""
+    Frame = Scrollbar = Label = Entry = Button = FakeWidget
+    StringVar = FakeStringVar
+    RIGHT = LEFT = TOP = BOTTOM = X = Y = BOTH = YES = None
+
+
+class TestCaseKeyIndex(unittest.TestCase):
+
+    def test_search(self):
+        index = KeyIndex(['db_port', 'db_host', 'web_host'])
+        self.assertEqual(index.search(''), ['db_host', 'db_port', 'web_host'])
+        self.assertEqual(index.search('HOST'), ['db_host', 'web_host'])
+        self.assertEqual(index.search('b_h'), ['db_host', 'web_host'])
+        self.assertEqual(index.search('db'), ['db_host', 'db_port'])
+
+    def test_incremental(self):
+        index = KeyIndex(['key%d' % i for i in range(100)])
+        self.assertEqual(len(index.search('key1')), 11)
+        # The narrowed search only looks at the previous matches
+        index.keys = []
+        self.assertEqual(index.search('key10'), ['key10'])
+
+    def test_add_remove(self):
+        index = KeyIndex(['b'])
+        index.search('a')
+        index.add('a')
+        index.add('a')
+        self.assertEqual(index.keys, ['a', 'b'])
+        self.assertEqual(index.matches, ['a'])
+        index.remove('a')
+        self.assertEqual(index.matches, [])
+
+
+class TestCaseDebouncer(unittest.TestCase):
+
+    def test_batched_save(self):
+        c = Config()
+        timer = FakeTimer()
+        saver = Debouncer(c, timer.after, timer.after_cancel)
+        with patch.object(c._store, 'deferred_sync',
+                          wraps=c._store.deferred_sync) as deferred:
+            for text in ['l', 'lo', 'loc', 'localhost']:
+                saver.schedule('host', text)
+            saver.schedule('port', '80')
+            self.assertEqual(len(timer.calls), 1)
+            self.assertRaises(KeyError, c.get, 'host', None)
+            timer.fire()
+        self.assertEqual(deferred.call_count, 1)
+        self.assertEqual(c.host, 'localhost')
+        self.assertEqual(c.port, '80')
+        self.assertEqual(saver.flush(), 0)
+
+
+class TestCaseCheckValue(unittest.TestCase):
+
+    def test_check_value(self):
+        option = ConfigObject('port', type=int)
+        self.assertEqual(check_value(option, '80'), None)
+        self.assertTrue('int' in check_value(option, 'eighty'))
+        option = ConfigObject('mode', choices=['a', 'b'])
+        self.assertTrue('a, b' in check_value(option, 'c'))
+        self.assertEqual(check_value(None, 'anything'), None)
+
+
+class TestCaseFakeConfigEditor(unittest.TestCase):
+    """Runs the editor against fake widgets where Tk is not available"""
+
+    def setUp(self):
+        patcher = patch('creoconfig.config_gui.Tkinter', FakeTkinter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.root = FakeRoot()
+        self.config = Config(batch=True)
+        for i in range(20):
+            self.config['key%02d' % i] = i
+        self.config.add_option('mode', help='The mode', choices=['a', 'b'])
+        self.editor = ConfigEditor(self.root, self.config, rows=5)
+
+    def texts(self):
+        return [l.options['text'] for l in self.editor.list.labels]
+
+    def test_list(self):
+        editor = self.editor
+        self.assertEqual(self.texts(),
+                         ['key00', 'key01', 'key02', 'key03', 'key04'])
+        editor.list.scroll(100)
+        self.assertEqual(self.texts(),
+                         ['key16', 'key17', 'key18', 'key19', 'mode'])
+        editor.list.yview('moveto', '0.5')
+        self.assertEqual(self.texts()[0], 'key10')
+        editor.search.set('key1')
+        self.assertEqual(len(editor.list.items), 10)
+        self.assertEqual(editor.list.offset, 0)
+        editor.search.set('nothing')
+        self.assertEqual(self.texts(), [''] * 5)
+        self.assertEqual(editor.list.scrollbar.options['view'], (0.0, 1.0))
+
+    def test_edit(self):
+        editor = self.editor
+        editor.search.set('mode')
+        editor.list.labels[0].bindings['<Button-1>'](None)
+        self.assertEqual(editor.key, 'mode')
+        self.assertEqual(editor.help.options['text'],
+                         'The mode\nChoices: a, b')
+        # Loading the value is not an edit
+        self.assertEqual(self.root.calls, {})
+        editor.value.set('c')
+        self.assertTrue('a, b' in editor.error.options['text'])
+        self.assertEqual(self.root.calls, {})
+        editor.value.set('b')
+        self.assertEqual(editor.error.options['text'], '')
+        self.assertEqual(len(self.root.calls), 1)
+        self.assertRaises(KeyError, self.config.get, 'mode', None)
+        # Selecting the key again shows the pending edit
+        editor.list.click(0)
+        self.assertEqual(editor.value.get(), 'b')
+        editor.close()
+        self.assertTrue(self.root.destroyed)
+        self.assertEqual(self.config.mode, 'b')
+
+
+class TestCaseConfigEditor(unittest.TestCase):
+
+    def setUp(self):
+        try:
+            self.root = Tkinter.Tk()
+        except Exception, msg:
+            self.skipTest("Tk is not available: %s" % msg)
+
+    def test_edit(self):
+        c = Config(batch=True)
+        for i in range(10000):
+            c['key%d' % i] = i
+        c.add_option('newkey', help='A new key')
+        editor = ConfigEditor(self.root, c, rows=10)
+        self.assertEqual(len(editor.list.labels), 10)
+        editor.search.set('key999')
+        self.assertEqual(editor.list.items,
+                         ['key999', 'key9990', 'key9991', 'key9992',
+                          'key9993', 'key9994', 'key9995', 'key9996',
+                          'key9997', 'key9998', 'key9999'])
+        editor.list.click(0)
+        self.assertEqual(editor.value.get(), '999')
+        editor.value.set('changed')
+        self.assertEqual(c.key999, '999')
+        editor.close()
+        self.assertEqual(c.key999, 'changed')
+
+    def tearDown(self):
+        try:
+            self.root.destroy()
+        except Exception:
+            pass
+
+
+if __name__ == '__main__':
+    unittest.main()
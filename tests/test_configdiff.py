@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+"""
+UnitTest framework for validating config diffs and patches
+"""
+import os
+import collections
+import base64
+try:
+    import unittest2 as unittest
+except:
+    import unittest
+from mock import patch
+import creoconfig
+from creoconfig import Config, ConfigDiff
+from creoconfig.storagebackend import XmlStorageBackend
+
+
+class DictBackend(collections.MutableMapping):
+    """A registered backend with only the mapping methods"""
+
+    def __init__(self):
+        self.store = {}
+
+    def __getitem__(self, key):
+        return self.store[key]
+
+    def __setitem__(self, key, value):
+        self.store[key] = value
+
+    def __delitem__(self, key):
+        del self.store[key]
+
+    def __iter__(self):
+        return iter(self.store)
+
+    def __len__(self):
+        return len(self.store)
+
+    def iteritems(self):
+        return self.store.iteritems()
+
+    def set(self, key, value):
+        self[key] = value
+
+    def get(self, key):
+        return self[key]
+
+    def delete(self, key):
+        del self[key]
+
+
+class TestCaseDiff(unittest.TestCase):
+
+    def setUp(self):
+        self.files = []
+
+    def gen_new_filename(self, base='tmp_%s.xml'):
+        f = base % base64.b16encode(os.urandom(16))
+        self.files.append(f)
+        return f
+
+    def test_diff_dicts(self):
+        d = creoconfig.diff({'same': '1', 'changed': 'a', 'removed': 'x'},
+                            {'same': '1', 'changed': 'b', 'added': 'y'})
+        self.assertEqual(d.added, {'added': 'y'})
+        self.assertEqual(d.removed, {'removed': 'x'})
+        self.assertEqual(d.changed, {'changed': ('a', 'b')})
+        self.assertTrue(d)
+
+    def test_diff_equal(self):
+        d = creoconfig.diff({'same': '1'}, {'same': '1'})
+        self.assertEqual(d, ConfigDiff({}, {}, {}))
+        self.assertFalse(d)
+
+    def test_reverse(self):
+        a = {'same': '1', 'changed': 'a', 'removed': 'x'}
+        b = {'same': '1', 'changed': 'b', 'added': 'y'}
+        self.assertEqual(creoconfig.diff(a, b).reverse(),
+                         creoconfig.diff(b, a))
+
+    def test_diff_configs(self):
+        a = Config(defaults={'fromdefault': 'd'})
+        a.mykey = 'a'
+        b = Config()
+        b.mykey = 'b'
+        d = creoconfig.diff(a, b)
+        self.assertEqual(d.removed, {'fromdefault': 'd'})
+        self.assertEqual(d.changed, {'mykey': ('a', 'b')})
+
+    def test_diff_single_pass(self):
+        golden = XmlStorageBackend(self.gen_new_filename(), autosync=False)
+        for i in range(20):
+            golden.set('key%d' % i, 'value%d' % i)
+        node = {'key0': 'changed'}
+        with patch.object(XmlStorageBackend, '__getitem__') as getitem:
+            d = creoconfig.diff(node, golden)
+        self.assertFalse(getitem.called)
+        self.assertEqual(len(d.added), 19)
+        self.assertEqual(d.changed, {'key0': ('changed', 'value0')})
+
+    def test_apply_patch(self):
+        golden = {'mykey': 'new', 'added': 'value'}
+        c = Config('json://' + self.gen_new_filename('tmp_%s.json'))
+        c.mykey = 'old'
+        c.removed = 'value'
+        d = creoconfig.diff(c, golden)
+        with patch.object(c._store, 'sync', wraps=c._store.sync) as sync:
+            self.assertEqual(c.apply_patch(d), 3)
+        self.assertEqual(sync.call_count, 1)
+        self.assertEqual(dict(c.iteritems()), golden)
+        self.assertFalse(creoconfig.diff(c, golden))
+
+    def test_apply_patch_missing_key(self):
+        c = Config()
+        self.assertEqual(c.apply_patch(ConfigDiff({}, {'gone': 'x'}, {})), 0)
+
+    def test_apply_patch_plain_backend(self):
+        c = Config(backend=DictBackend())
+        c.mykey = 'old'
+        d = creoconfig.diff(c, {'mykey': 'new', 'added': 'value'})
+        self.assertEqual(c.apply_patch(d), 2)
+        self.assertEqual(c._store.store, {'mykey': 'new', 'added': 'value'})
+        c.save_defaults()
+        c.set('session', 'token', ttl=60)
+        self.assertEqual(c.get('session'), 'token')
+
+    def tearDown(self):
+        while len(self.files):
+            try:
+                os.remove(self.files.pop())
+            except OSError:
+                pass
+
+
+if __name__ == '__main__':
+    unittest.main()
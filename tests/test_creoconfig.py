@@ -56,6 +56,36 @@ class TestCaseConfig(unittest.TestCase):
         # FIXME: Configs always return things as strings.
         self.assertEqual(c.bravo, 'None')
 
+    def test_defaults_not_stored(self):
+        c = self.cfg(defaults={'foo': 'bar'})
+        self.assertEqual(c.foo, 'bar')
+        self.assertEqual(len(c._store), 0)
+        self.assertEqual(len(c), 1)
+        self.assertEqual(list(c), ['foo'])
+
+    def test_defaults_overridden(self):
+        c = self.cfg(defaults={'foo': 'bar', 'alpha': 'beta'})
+        c.foo = 'baz'
+        self.assertEqual(c.foo, 'baz')
+        self.assertEqual(len(c), 2)
+        self.assertItemsEqual(c.keys(), ['foo', 'alpha'])
+        del c.foo
+        self.assertRaises(KeyError, lambda: c['foo'])
+        self.assertEqual(len(c), 1)
+
+    def test_defaults_clear(self):
+        c = self.cfg(defaults={'foo': 'bar', 'alpha': 'beta'})
+        c.foo = 'baz'
+        c.clear()
+        self.assertEqual(len(c), 0)
+
+    def test_save_defaults(self):
+        c = self.cfg(defaults={'foo': 'bar', 'alpha': 'beta'})
+        c.foo = 'baz'
+        self.assertTrue(c.save_defaults())
+        self.assertEqual(c._store.get('foo'), 'baz')
+        self.assertEqual(c._store.get('alpha'), 'beta')
+
     def test_options(self):
         c = self.cfg()
         c.add_option('strkey', help='This is a string key')
@@ -414,6 +444,13 @@ class TestCaseConfig(unittest.TestCase):
         c = self.cfg()
         self.assertIsInstance(c._store, MemStorageBackend)
 
+    def test_backend_instance(self):
+        backend = MemStorageBackend()
+        c = self.cfg(backend=backend)
+        c.mykey = 'myvalue'
+        self.assertIs(c._store, backend)
+        self.assertEqual(backend.get('mykey'), 'myvalue')
+
 # class TestConfigOptionChoices(unittest.TestCase):
 
 #     def setUp(self):
@@ -649,6 +686,46 @@ class TestConfigFileBackend(unittest.TestCase):
         self.assertEqual(c.anotherkey, 'someothervalue')
 
 
+    def test_defaults_keep_persisted_values(self):
+        f = self.gen_new_filename()
+        c = self.cfg(f)
+        c.mykey = 'stored'
+        c = self.cfg(f, defaults={'mykey': 'default', 'other': 'value'})
+        self.assertEqual(c.mykey, 'stored')
+        self.assertEqual(c.other, 'value')
+        self.assertEqual(len(c._store), 1)
+
+    def test_save_defaults_single_sync(self):
+        f = self.gen_new_filename()
+        c = self.cfg(f, defaults=dict(('key%d' % i, i) for i in range(10)))
+        with patch.object(c._store, 'sync') as sync:
+            c.save_defaults()
+        self.assertEqual(sync.call_count, 1)
+        self.assertEqual(len(c._store), 10)
+
+    def test_deferred_written_when_dropped(self):
+        f = self.gen_new_filename(base='tmp_%s.ini')
+        c = self.cfg('multiini://' + f)
+        c.set('sec.x', '1')
+        self.assertFalse(os.path.exists(f))
+        del c
+        self.assertEqual(self.cfg('multiini://' + f).get('sec.x'), '1')
+
+    def test_sync_and_close(self):
+        f = self.gen_new_filename(base='tmp_%s.ini')
+        with self.cfg('multiini://' + f) as c:
+            c.set('sec.x', '1')
+            c.sync()
+            self.assertEqual(self.cfg('multiini://' + f).get('sec.x'), '1')
+            c.set('sec.y', '2')
+        self.assertFalse(c._store.dirty)
+        self.assertEqual(self.cfg('multiini://' + f).get('sec.y'), '2')
+        c = self.cfg('xml://%s?autosync=false' % self.gen_new_filename())
+        c.mykey = 'value'
+        c.close()
+        self.assertFalse(c._store.dirty)
+        self.cfg().close()
+
     #
     # Test last_modified method
     #
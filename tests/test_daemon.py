@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+"""
+UnitTest framework for validating the local config daemon
+"""
+import os
+import time
+import shutil
+import socket
+import tempfile
+try:
+    import unittest2 as unittest
+except:
+    import unittest
+from StringIO import StringIO
+from creoconfig import Config
+from creoconfig.configdiff import diff
+from creoconfig.daemon import *
+from creoconfig.exceptions import *
+from creoconfig.storagebackend import MemStorageBackend, XmlStorageBackend
+
+
+def _wait_for(func, timeout=5.0):
+    """Waits until `func` returns True, invalidations are asynchronous"""
+    deadline = time.time() + timeout
+    while not func():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+class TestCaseConfigDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='tmp_creoconfig_')
+        self.path = os.path.join(self.tmpdir, 'config.sock')
+        self.backend = MemStorageBackend()
+        self.daemon = ConfigDaemon(self.backend, self.path).start()
+        self.clients = []
+
+    def client(self):
+        c = DaemonStorageBackend(self.path)
+        self.clients.append(c)
+        return c
+
+    def test_get_set_delete(self):
+        c = self.client()
+        self.assertTrue(c.set('mykey', 'myval'))
+        self.assertEqual(self.backend.get('mykey'), 'myval')
+        self.assertEqual(c.get('mykey'), 'myval')
+        self.assertEqual(len(c), 1)
+        self.assertEqual(list(c), ['mykey'])
+        c.delete('mykey')
+        self.assertRaises(KeyError, c.get, 'mykey')
+        self.assertRaises(KeyError, c.delete, 'mykey')
+
+    def test_cached_reads(self):
+        c = self.client()
+        c.set('mykey', 'myval')
+        self.assertEqual(c.get('mykey'), 'myval')
+        # The daemon is not asked again for cached keys
+        self.backend.store['mykey'] = 'changed behind the daemon'
+        self.assertEqual(c.get('mykey'), 'myval')
+
+    def test_invalidation(self):
+        a = self.client()
+        b = self.client()
+        a.set('mykey', 'first')
+        self.assertEqual(b.get('mykey'), 'first')
+        # A read racing with the invalidation of the set is not cached
+        self.assertTrue(_wait_for(
+            lambda: b.get('mykey') == 'first' and 'mykey' in b.cache))
+        a.set('mykey', 'second')
+        self.assertTrue(_wait_for(lambda: 'mykey' not in b.cache))
+        self.assertEqual(b.get('mykey'), 'second')
+        a.delete('mykey')
+        self.assertTrue(_wait_for(lambda: 'mykey' not in b.cache))
+        self.assertRaises(KeyError, b.get, 'mykey')
+
+    def test_set_racing_invalidation(self):
+        a = self.client()
+        a.set('mykey', 'first')
+        request = a._request
+
+        def racing(op, **kwargs):
+            value = request(op, **kwargs)
+            # Another client's invalidation arrives before the response
+            # is processed
+            with a._cond:
+                a._epoch += 1
+            return value
+        a._request = racing
+        a.set('mykey', 'second')
+        self.assertNotIn('mykey', a.cache)
+        a._request = request
+        self.backend.store['mykey'] = 'third'
+        self.assertEqual(a.get('mykey'), 'third')
+
+    def test_config_api(self):
+        a = Config(backend=self.client(), batch=True)
+        b = Config(backend=self.client(), batch=True)
+        a.mykey = 'myvalue'
+        self.assertEqual(b.mykey, 'myvalue')
+        b['mykey'] = 1234
+        self.assertTrue(_wait_for(lambda: a.mykey == '1234'))
+        self.assertEqual(len(a), 1)
+        del a.mykey
+        self.assertRaises(AttributeError, getattr, a, 'mykey')
+
+    def test_config_batched_and_expiring(self):
+        a = Config(backend=self.client(), batch=True,
+                   defaults={'port': '80'})
+        a.save_defaults()
+        self.assertEqual(self.backend.get('port'), '80')
+        a.set('session', 'token', ttl=60)
+        self.assertTrue(0 < a.ttl('session') <= 60)
+        self.assertIn('session', self.backend.expiries())
+        # A new client learns the expiry from the daemon
+        b = Config(backend=self.client(), batch=True)
+        self.assertIn('session', b._expiry)
+        a.set('session', 'other')
+        self.assertEqual(self.backend.expiries(), {})
+        self.assertEqual(a.apply_patch(diff(a, {'port': '8080'})), 2)
+        self.assertEqual(dict(self.backend.items()), {'port': '8080'})
+        a.import_(StringIO('["mykey", "myval"]\n'))
+        self.assertEqual(self.backend.get('mykey'), 'myval')
+
+    def test_config_reload(self):
+        a = Config(backend=self.client(), batch=True)
+        b = Config(backend=self.client(), batch=True)
+        a.mykey = 'first'
+        self.assertEqual(b.mykey, 'first')
+        self.assertEqual(a.mykey, 'first')
+        self.backend.store['mykey'] = 'changed behind the daemon'
+        a.reload()
+        self.assertEqual(a.mykey, 'changed behind the daemon')
+        self.assertTrue(_wait_for(lambda: 'mykey' not in b._store.cache))
+        self.assertEqual(b.mykey, 'changed behind the daemon')
+
+    def test_remote_error(self):
+        c = self.client()
+        self.assertRaises(RemoteError, c._request, 'badop')
+
+    def test_daemon_stopped(self):
+        c = self.client()
+        self.daemon.stop()
+        self.assertRaises((RemoteError, socket.error), c.get, 'mykey')
+
+    def test_sync(self):
+        filename = os.path.join(self.tmpdir, 'config.xml')
+        path = os.path.join(self.tmpdir, 'xml.sock')
+        daemon = ConfigDaemon(
+            XmlStorageBackend(filename, autosync=False), path).start()
+        try:
+            c = DaemonStorageBackend(path)
+            c.set('mykey', 'myval')
+            self.assertFalse(os.path.exists(filename))
+            self.assertTrue(c.sync())
+            self.assertEqual(XmlStorageBackend(filename).get('mykey'),
+                             'myval')
+            c.close()
+        finally:
+            daemon.stop()
+
+    def test_uri(self):
+        c = Config('daemon://' + self.path)
+        c.mykey = 'myvalue'
+        self.assertEqual(self.backend.get('mykey'), 'myvalue')
+        c._store.close()
+
+    def tearDown(self):
+        for c in self.clients:
+            c.close()
+        self.daemon.stop()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+"""
+UnitTest framework for validating crash consistent writes
+"""
+import os
+import stat
+import base64
+import signal
+try:
+    import unittest2 as unittest
+except:
+    import unittest
+from mock import patch
+from creoconfig import durability
+from creoconfig.durability import atomic_write
+from creoconfig.exceptions import IllegalArgumentError
+from creoconfig.registry import open_backend
+from creoconfig.storagebackend import XmlStorageBackend, JsonStorageBackend
+
+
+class TestCaseDurability(unittest.TestCase):
+
+    def setUp(self):
+        self.files = []
+
+    def tearDown(self):
+        for f in self.files:
+            if os.path.lexists(f):
+                os.remove(f)
+
+    def gen_new_filename(self, base='tmp_%s.xml'):
+        f = base % base64.b16encode(os.urandom(16))
+        self.files.append(f)
+        return f
+
+    def temp_files(self, f):
+        return [n for n in os.listdir('.') if n.startswith('.' + f)]
+
+    def test_atomic_write(self):
+        f = self.gen_new_filename('tmp_%s.txt')
+        with atomic_write(f, fsync='never') as out:
+            out.write('first')
+        with atomic_write(f, fsync='never') as out:
+            out.write('second')
+            # Readers still see the old content while writing
+            with open(f) as old:
+                self.assertEqual(old.read(), 'first')
+        with open(f) as new:
+            self.assertEqual(new.read(), 'second')
+        self.assertEqual(self.temp_files(f), [])
+
+    def test_failed_write_keeps_file(self):
+        f = self.gen_new_filename('tmp_%s.txt')
+        with atomic_write(f, fsync='never') as out:
+            out.write('first')
+
+        def fail():
+            with atomic_write(f, fsync='never') as out:
+                out.write('partial')
+                raise IOError('disk full')
+        self.assertRaises(IOError, fail)
+        with open(f) as old:
+            self.assertEqual(old.read(), 'first')
+        self.assertEqual(self.temp_files(f), [])
+
+    def test_keeps_permissions(self):
+        f = self.gen_new_filename('tmp_%s.txt')
+        with atomic_write(f, fsync='never') as out:
+            out.write('first')
+        os.chmod(f, 0640)
+        with atomic_write(f, fsync='never') as out:
+            out.write('second')
+        self.assertEqual(stat.S_IMODE(os.stat(f).st_mode), 0640)
+
+    def test_compression_follows_real_name(self):
+        f = self.gen_new_filename('tmp_%s.json.gz')
+        b = JsonStorageBackend(f, fsync='never')
+        b.set('mykey', 'value')
+        with open(f, 'rb') as data:
+            self.assertEqual(data.read(2), b'\x1f\x8b')
+        self.assertEqual(JsonStorageBackend(f).get('mykey'), 'value')
+
+    def test_policies(self):
+        f = self.gen_new_filename('tmp_%s.txt')
+        with patch('os.fsync') as fsync:
+            with atomic_write(f, fsync='never') as out:
+                out.write('data')
+            self.assertEqual(fsync.call_count, 0)
+            with atomic_write(f, fsync='always') as out:
+                out.write('data')
+            # The file and its directory
+            self.assertEqual(fsync.call_count, 2)
+
+    def test_batched(self):
+        f = self.gen_new_filename('tmp_%s.txt')
+        durability.flush()
+        with patch('os.fsync') as fsync:
+            with atomic_write(f, fsync='batched') as out:
+                out.write('data')
+            with atomic_write(f, fsync='batched') as out:
+                out.write('data')
+            # The data is always flushed before the rename
+            self.assertEqual(fsync.call_count, 2)
+            # Only the directory is batched
+            self.assertEqual(durability.flush(), 1)
+            self.assertEqual(fsync.call_count, 3)
+            with patch('creoconfig.durability.BATCH_INTERVAL', 0):
+                with atomic_write(f, fsync='batched') as out:
+                    out.write('data')
+            self.assertEqual(fsync.call_count, 5)
+
+    @unittest.skipUnless(hasattr(os, 'symlink'), 'requires symlinks')
+    def test_symlink(self):
+        target = self.gen_new_filename()
+        link = self.gen_new_filename()
+        XmlStorageBackend(target).set('a', '1')
+        os.symlink(target, link)
+        XmlStorageBackend(link).set('b', '2')
+        self.assertTrue(os.path.islink(link))
+        self.assertEqual(XmlStorageBackend(target).get('b'), '2')
+        self.assertEqual(self.temp_files(target), [])
+
+    def test_invalid_policy(self):
+        f = self.gen_new_filename()
+        self.assertRaises(IllegalArgumentError, XmlStorageBackend, f,
+                          fsync='sometimes')
+
+    def test_uri_option(self):
+        f = self.gen_new_filename('tmp_%s.json')
+        b = open_backend('json://%s?fsync=always' % f)
+        self.assertEqual(b.fsync, 'always')
+        self.assertEqual(open_backend(f).fsync, 'batched')
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requires fork')
+    def test_crash_while_writing(self):
+        f = self.gen_new_filename()
+        XmlStorageBackend(f).set('mykey', 'before')
+        pid = os.fork()
+        if pid == 0:
+            b = XmlStorageBackend(f, autosync=False)
+            b.set('mykey', 'after')
+            with b._replace() as out:
+                out.write('<?xml version="1.0" ?><config><var>')
+                os.kill(os.getpid(), signal.SIGKILL)
+        os.waitpid(pid, 0)
+        self.assertEqual(XmlStorageBackend(f).get('mykey'), 'before')
+        for name in self.temp_files(f):
+            os.remove(name)
+
+
+if __name__ == '__main__':
+    unittest.main()
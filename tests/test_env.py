@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""
+UnitTest framework for validating the environment variable overlay
+"""
+import os
+from StringIO import StringIO
+try:
+    import unittest2 as unittest
+except:
+    import unittest
+from mock import patch
+from creoconfig import Config
+from creoconfig.exceptions import IllegalArgumentError
+
+
+class TestCaseEnvOverlay(unittest.TestCase):
+
+    def setUp(self):
+        self.env = patch.dict(os.environ, {
+            'APP_DB_HOST': 'db.example.com',
+            'APP_PORT': '8080',
+            'APP_': 'ignored',
+            'OTHER_KEY': 'ignored',
+        })
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+
+    def test_prefix_maps_to_key(self):
+        c = Config(env_prefix='APP_')
+        self.assertEqual(c.db_host, 'db.example.com')
+        self.assertEqual(c['db_host'], 'db.example.com')
+        self.assertEqual(c.get('port'), '8080')
+        self.assertRaises(KeyError, lambda: c['other_key'])
+        self.assertEqual(sorted(c._env), ['db_host', 'port'])
+
+    def test_no_prefix(self):
+        c = Config()
+        self.assertRaises(KeyError, lambda: c['db_host'])
+        self.assertRaises(IllegalArgumentError, c.refresh_env)
+
+    def test_typed_by_option(self):
+        c = Config(env_prefix='APP_')
+        c.add_option('port', type=int)
+        self.assertEqual(c.port, 8080)
+        c = Config(env_prefix='APP_', batch=True)
+        c.add_option('db_host', type=int)
+        self.assertRaises(KeyError, lambda: c['db_host'])
+
+    def test_choices_checked(self):
+        c = Config(env_prefix='APP_', batch=True)
+        with patch('creoconfig.config.logger') as logger:
+            c.add_option('port', type=int, choices=[80, 443])
+        self.assertTrue(logger.warn.called)
+        self.assertRaises(KeyError, lambda: c['port'])
+        c = Config(env_prefix='APP_')
+        c.add_option('port', type=int, choices=[80, 8080])
+        self.assertEqual(c.port, 8080)
+
+    def test_type_error_ignored(self):
+        c = Config(env_prefix='APP_', batch=True)
+        # xrange raises TypeError, not ValueError, for a string
+        c.add_option('port', type=xrange)
+        self.assertRaises(KeyError, lambda: c['port'])
+
+    def test_override(self):
+        c = Config(env_prefix='APP_')
+        c.db_host = 'localhost'
+        self.assertEqual(c.db_host, 'db.example.com')
+        self.assertEqual(c._store.get('db_host'), 'localhost')
+
+    def test_fallback(self):
+        c = Config(env_prefix='APP_', env_override=False,
+                   defaults={'port': '80'})
+        self.assertEqual(c.db_host, 'db.example.com')
+        c.db_host = 'localhost'
+        self.assertEqual(c.db_host, 'localhost')
+        # The environment comes before the defaults
+        self.assertEqual(c.port, '8080')
+
+    def test_iteration(self):
+        c = Config(env_prefix='APP_', defaults={'port': '80', 'user': 'app'})
+        c.mykey = 'myvalue'
+        c.db_host = 'localhost'
+        self.assertEqual(sorted(c), ['db_host', 'mykey', 'port', 'user'])
+        self.assertEqual(len(c), 4)
+        self.assertEqual(dict(c.items()), {
+            'db_host': 'db.example.com', 'mykey': 'myvalue', 'port': '8080',
+            'user': 'app'})
+        self.assertEqual(dict(c.items()), dict((k, c.get(k)) for k in c))
+        c = Config(env_prefix='APP_', env_override=False)
+        c.db_host = 'localhost'
+        self.assertEqual(dict(c.items()), {'db_host': 'localhost',
+                                           'port': '8080'})
+
+    def test_export(self):
+        c = Config(env_prefix='APP_')
+        c.add_option('port', type=int)
+        c.db_host = 'localhost'
+        out = StringIO()
+        self.assertEqual(c.export(out), 2)
+        self.assertEqual(sorted(out.getvalue().splitlines()), [
+            '["db_host", "db.example.com"]', '["port", "8080"]'])
+
+    def test_read_once(self):
+        c = Config(env_prefix='APP_')
+        os.environ['APP_DB_HOST'] = 'changed'
+        os.environ['APP_NEW'] = 'new'
+        self.assertEqual(c.db_host, 'db.example.com')
+        self.assertRaises(KeyError, lambda: c['new'])
+        c.refresh_env()
+        self.assertEqual(c.db_host, 'changed')
+        self.assertEqual(c.new, 'new')
+
+    def test_lookup_does_not_query_environment(self):
+        c = Config(env_prefix='APP_')
+        with patch('os.getenv') as getenv:
+            with patch.dict(os.environ, clear=True):
+                self.assertEqual(c.db_host, 'db.example.com')
+        self.assertFalse(getenv.called)
+
+
+if __name__ == '__main__':
+    unittest.main()
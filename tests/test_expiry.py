@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+"""
+UnitTest framework for validating key expiry
+"""
+import os
+import time
+import base64
+try:
+    import unittest2 as unittest
+except:
+    import unittest
+from mock import patch
+from creoconfig import Config
+from creoconfig.expiry import ExpirySchedule
+
+
+class TestCaseExpirySchedule(unittest.TestCase):
+
+    def test_pop_expired(self):
+        s = ExpirySchedule({'a': 10.0, 'b': 30.0})
+        s.schedule('c', 20.0)
+        self.assertEqual(s.pop_expired(now=5.0), [])
+        self.assertEqual(s.pop_expired(now=25.0), ['a', 'c'])
+        self.assertEqual(len(s), 1)
+        self.assertEqual(s.next_expiry(), 30.0)
+
+    def test_reschedule_and_cancel(self):
+        s = ExpirySchedule()
+        s.schedule('a', 10.0)
+        s.schedule('a', 50.0)
+        s.schedule('b', 20.0)
+        self.assertTrue(s.cancel('b'))
+        self.assertFalse(s.cancel('b'))
+        self.assertEqual(s.next_expiry(), 50.0)
+        self.assertEqual(s.pop_expired(now=30.0), [])
+        self.assertFalse(s.expired('a', now=30.0))
+        self.assertTrue(s.expired('a', now=50.0))
+
+    def test_heap_trimmed(self):
+        s = ExpirySchedule()
+        for i in range(1000):
+            s.schedule('a', float(i))
+        self.assertTrue(len(s.heap) < 100)
+        self.assertEqual(s.next_expiry(), 999.0)
+
+
+class TestCaseConfigTtl(unittest.TestCase):
+
+    def setUp(self):
+        self.files = []
+        self.now = 1000.0
+        patcher = patch('time.time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def gen_new_filename(self, base='tmp_%s.json'):
+        f = base % base64.b16encode(os.urandom(16))
+        self.files.append(f)
+        return f
+
+    def test_expire_on_read(self):
+        c = Config()
+        c.set('token', 'abc', ttl=10)
+        c.set('other', 'value')
+        self.assertEqual(c.token, 'abc')
+        self.assertEqual(c.ttl('token'), 10)
+        self.assertEqual(c.ttl('other'), None)
+        self.now += 10
+        self.assertRaises(AttributeError, getattr, c, 'token')
+        self.assertRaises(KeyError, c._store.get, 'token')
+        self.assertEqual(c.get('token', 'fallback'), 'fallback')
+
+    def test_expire_on_iter(self):
+        c = Config()
+        c.set('a', '1', ttl=5)
+        c.set('b', '2', ttl=20)
+        c.set('c', '3')
+        self.now += 10
+        self.assertItemsEqual(list(c), ['b', 'c'])
+        self.assertEqual(len(c), 2)
+        self.assertEqual(c.evict_expired(), [])
+
+    def test_set_clears_expiry(self):
+        c = Config()
+        c.set('token', 'abc', ttl=5)
+        c.token = 'forever'
+        self.now += 10
+        self.assertEqual(c.token, 'forever')
+
+    def test_delete_clears_expiry(self):
+        c = Config()
+        c.set('token', 'abc', ttl=5)
+        del c.token
+        self.assertEqual(len(c._expiry), 0)
+
+    def test_expiry_notifies(self):
+        c = Config()
+        events = []
+        c.subscribe('token', events.append)
+        c.set('token', 'abc', ttl=5)
+        self.now += 5
+        self.assertEqual(c.evict_expired(), ['token'])
+        self.assertEqual([e.action for e in events], ['set', 'delete'])
+
+    def test_persisted_json(self):
+        f = self.gen_new_filename()
+        c = Config('json://' + f)
+        with patch.object(c._store, 'sync', wraps=c._store.sync) as sync:
+            c.set('token', 'abc', ttl=10)
+        self.assertEqual(sync.call_count, 1)
+        c = Config('json://' + f)
+        self.assertEqual(c.ttl('token'), 10)
+        self.now += 10
+        self.assertRaises(KeyError, c.get, 'token', None)
+        self.assertEqual(Config('json://' + f)._expiry, None)
+
+    def test_single_sync_when_clearing(self):
+        f = self.gen_new_filename()
+        c = Config('json://' + f)
+        c.set('a', '1', ttl=10)
+        c.set('b', '2', ttl=10)
+        c.set('c', '3', ttl=10)
+        with patch.object(c._store, 'sync', wraps=c._store.sync) as sync:
+            c.a = 'forever'
+            self.assertEqual(sync.call_count, 1)
+            del c.b
+            self.assertEqual(sync.call_count, 2)
+            self.now += 10
+            self.assertRaises(KeyError, c.get, 'c', None)
+            self.assertEqual(sync.call_count, 3)
+        self.assertEqual(Config('json://' + f)._store.expiries(), {})
+
+    def test_persisted_xml(self):
+        f = self.gen_new_filename(base='tmp_%s.xml')
+        c = Config(f)
+        c.set('token', 'abc', ttl=10)
+        c = Config(f)
+        self.assertEqual(c.ttl('token'), 10)
+        self.now += 11
+        self.assertEqual(len(c), 0)
+
+    def tearDown(self):
+        while len(self.files):
+            try:
+                os.remove(self.files.pop())
+            except OSError:
+                pass
+
+
+class TestCaseReaper(unittest.TestCase):
+
+    def test_reaper(self):
+        c = Config()
+        c.start_reaper(interval=0.01)
+        self.addCleanup(c.stop_reaper)
+        c.set('token', 'abc', ttl=0.05)
+        deadline = time.time() + 5
+        while 'token' in c._store and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertFalse('token' in c._store)
+
+
+if __name__ == '__main__':
+    unittest.main()
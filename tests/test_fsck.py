@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+UnitTest framework for validating fsck and compaction of xml configs
+"""
+import os
+import base64
+try:
+    import unittest2 as unittest
+except:
+    import unittest
+from creoconfig import Config
+from creoconfig.exceptions import IllegalArgumentError
+from creoconfig.fsck import fsck, check
+from creoconfig.storagebackend import XmlStorageBackend
+
+
+DAMAGED = '''<?xml version="1.0" ?>
+<config version="1.0.0">
+    <var>
+        <name>dup</name><value type="str">old</value>
+        <name>dup</name><value type="str">new</value>
+    </var>
+    <var><name>twice</name><value type="str">first</value></var>
+    <var><name>twice</name><value type="str">second</value></var>
+    <var><value type="str">no name</value></var>
+    <stray>text</stray>
+    <var signature="bad" timestamp="1.0">
+        <name>edited</name><value type="str">by hand</value>
+    </var>
+</config>
+'''
+
+
+class TestCaseFsck(unittest.TestCase):
+
+    def setUp(self):
+        self.filename = 'tmp_%s.xml' % base64.b16encode(os.urandom(16))
+        with open(self.filename, 'w') as f:
+            f.write(DAMAGED)
+
+    def test_check(self):
+        report = check(self.filename)
+        self.assertFalse(report.ok)
+        self.assertEqual(report.duplicates, ['dup', 'twice'])
+        self.assertEqual(report.orphans, ['<var #3>', '<stray #4>'])
+        self.assertEqual(report.bad_signatures, ['edited'])
+        self.assertEqual(report.entries_before, 6)
+        self.assertEqual(report.bytes_before, len(DAMAGED))
+        self.assertFalse(report.repaired)
+        # Checking does not modify the file
+        self.assertEqual(open(self.filename).read(), DAMAGED)
+
+    def test_repair(self):
+        report = fsck(self.filename, repair=True)
+        self.assertTrue(report.repaired)
+        self.assertEqual(report.entries_after, 3)
+        self.assertEqual(report.reclaimed_entries, 3)
+        self.assertTrue(report.reclaimed_bytes > 0)
+        self.assertTrue('reclaimed 3 entries' in str(report))
+        s = XmlStorageBackend(self.filename)
+        self.assertEqual(dict(s.items()), {'dup': 'new', 'twice': 'second',
+                                           'edited': 'by hand'})
+        again = check(self.filename)
+        self.assertEqual(again.duplicates + again.orphans, [])
+        self.assertEqual(again.bad_signatures, ['edited'])
+        self.assertEqual([f for f in os.listdir('.') if f.endswith('.tmp')],
+                         [])
+
+    def test_config_compact(self):
+        c = Config('xml://%s?autosync=false' % self.filename)
+        c.newkey = 'value'
+        report = c.compact()
+        self.assertEqual(report.duplicates, ['dup', 'twice'])
+        self.assertEqual(report.entries_after, 4)
+        self.assertFalse(c._store.dirty)
+        self.assertEqual(Config(self.filename).newkey, 'value')
+
+    def test_compact_unsupported(self):
+        self.assertRaises(IllegalArgumentError, Config().compact)
+
+    def tearDown(self):
+        try:
+            os.remove(self.filename)
+        except OSError:
+            pass
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+"""
+UnitTest framework for validating the key version history
+"""
+import os
+import json
+import base64
+try:
+    import unittest2 as unittest
+except:
+    import unittest
+from mock import patch
+from creoconfig import Config
+from creoconfig.history import KeyHistory
+from creoconfig.exceptions import *
+
+
+class TestCaseKeyHistory(unittest.TestCase):
+
+    def test_value_at(self):
+        h = KeyHistory()
+        h.record('mykey', 'a', timestamp=100)
+        h.record('mykey', 'b', timestamp=200)
+        h.record('mykey', None, timestamp=300)
+        self.assertRaises(KeyError, h.value_at, 'mykey', 50)
+        self.assertEqual(h.value_at('mykey', 100), 'a')
+        self.assertEqual(h.value_at('mykey', 199), 'a')
+        self.assertEqual(h.value_at('mykey', 250), 'b')
+        self.assertRaises(KeyError, h.value_at, 'mykey', 300)
+        self.assertRaises(KeyError, h.value_at, 'otherkey', 300)
+
+    def test_max_versions(self):
+        h = KeyHistory(max_versions=3)
+        for i in range(10):
+            h.record('mykey', str(i), timestamp=i)
+        self.assertEqual(h.history('mykey'), [(7, '7'), (8, '8'), (9, '9')])
+
+    def test_max_age(self):
+        h = KeyHistory(max_age=10)
+        h.record('mykey', 'a', timestamp=100)
+        h.record('mykey', 'b', timestamp=105)
+        h.record('mykey', 'c', timestamp=120)
+        self.assertEqual(h.history('mykey'), [(120, 'c')])
+        h.record('other', 'a', timestamp=100)
+        # The latest version is always kept
+        self.assertEqual(h.history('other'), [(100, 'a')])
+
+    def test_clock_backwards(self):
+        h = KeyHistory()
+        h.record('mykey', 'a', timestamp=100)
+        h.record('mykey', 'b', timestamp=90)
+        self.assertEqual(h.value_at('mykey', 100), 'b')
+
+
+class TestCaseConfigHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.files = []
+
+    def gen_new_filename(self, base='tmp_%s.xml'):
+        f = base % base64.b16encode(os.urandom(16))
+        self.files.append(f)
+        self.files.append(f + '.history')
+        return f
+
+    def test_disabled(self):
+        c = Config()
+        c.mykey = 'a'
+        self.assertRaises(IllegalArgumentError, c.history, 'mykey')
+        self.assertRaises(IllegalArgumentError, c.get, 'mykey', as_of=1)
+
+    @patch('creoconfig.history.time.time')
+    def test_history(self, now):
+        c = Config(history=5)
+        now.return_value = 100
+        c.mykey = 'a'
+        now.return_value = 200
+        c.mykey = 'b'
+        now.return_value = 300
+        del c.mykey
+        self.assertEqual(c.history('mykey'),
+                         [(100, 'a'), (200, 'b'), (300, None)])
+        self.assertEqual(c.get('mykey', as_of=150), 'a')
+        self.assertEqual(c.get('mykey', as_of=250), 'b')
+        self.assertRaises(KeyError, c.get, 'mykey', as_of=350)
+        self.assertEqual(c.get('mykey', 'gone', as_of=350), 'gone')
+        self.assertEqual(c.history('unknown'), [])
+
+    def test_unchanged_key(self):
+        c = Config(defaults={'mykey': 'default'}, history=True)
+        self.assertEqual(c.get('mykey', as_of=1), 'default')
+
+    @patch('creoconfig.history.time.time')
+    def test_persisted(self, now):
+        f = self.gen_new_filename()
+        c = Config(f, history=True)
+        now.return_value = 100
+        c.mykey = 'a'
+        now.return_value = 200
+        c.mykey = 'b'
+        self.assertTrue(os.path.exists(f + '.history'))
+
+        c = Config(f, history=True)
+        self.assertFalse(c._history._loaded)
+        self.assertEqual(c.get('mykey', as_of=150), 'a')
+        self.assertEqual(c.history('mykey'), [(100, 'a'), (200, 'b')])
+
+    def test_compaction(self):
+        f = self.gen_new_filename(base='tmp_%s.json')
+        with open(f + '.history', 'w') as fh:
+            for i in range(200):
+                fh.write(json.dumps([100 + i, 'mykey', str(i)]) + '\n')
+        c = Config('json://' + f, history=2)
+        self.assertEqual([v for t, v in c.history('mykey')], ['198', '199'])
+        with open(f + '.history') as fh:
+            self.assertEqual(len(fh.readlines()), 2)
+
+    def test_compaction_without_query(self):
+        f = self.gen_new_filename(base='tmp_%s.json')
+        c = Config('json://' + f, history=2)
+        c.mykey = 'first'
+        c = Config('json://' + f, history=2)
+        for i in range(500):
+            c.mykey = i
+        # Written only, the log is compacted without a query
+        with open(f + '.history') as fh:
+            self.assertLess(len(fh.readlines()), 110)
+        self.assertEqual([v for t, v in c.history('mykey')], ['498', '499'])
+
+    def tearDown(self):
+        while len(self.files):
+            try:
+                os.remove(self.files.pop())
+            except OSError:
+                pass
+
+
+if __name__ == '__main__':
+    unittest.main()
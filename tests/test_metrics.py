@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+"""
+UnitTest framework for validating the metrics exporter
+"""
+import gc
+import os
+import base64
+import urllib2
+try:
+    import unittest2 as unittest
+except:
+    import unittest
+from creoconfig import Config, metrics, tracing
+from creoconfig.storagebackend import MemStorageBackend, XmlStorageBackend
+
+
+class TestCaseMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.files = []
+        self.registry = metrics.MetricRegistry()
+
+    def tearDown(self):
+        for f in self.files:
+            if os.path.exists(f):
+                os.remove(f)
+
+    def gen_new_filename(self, base='tmp_%s.xml'):
+        f = base % base64.b16encode(os.urandom(16))
+        self.files.append(f)
+        return f
+
+    def test_counter_exposition(self):
+        c = metrics.Counter('test_total', 'A test.', ('path',))
+        c.child('a"b\\c\n').inc()
+        c.child('a"b\\c\n').inc(2)
+        self.assertEqual(c.render(), '# HELP test_total A test.\n'
+                                     '# TYPE test_total counter\n'
+                                     'test_total{path="a\\"b\\\\c\\n"} 3.0')
+        self.assertRaises(ValueError, c.child)
+
+    def test_histogram_exposition(self):
+        h = metrics.Histogram('test_seconds', 'A test.', buckets=(.1, 1))
+        h.observe(.05)
+        h.observe(.5)
+        h.observe(5)
+        self.assertEqual(h.render().splitlines()[2:], [
+            'test_seconds_bucket{le="0.1"} 1.0',
+            'test_seconds_bucket{le="1.0"} 2.0',
+            'test_seconds_bucket{le="+Inf"} 3.0',
+            'test_seconds_sum 5.55',
+            'test_seconds_count 3.0',
+        ])
+
+    def test_gauge_exposition(self):
+        g = metrics.Gauge('test_bytes', 'A test.', ('path',))
+        g.child('a').set(10)
+        g.child('b')
+        g.set_function(lambda: 5, 'c')
+        self.assertEqual(g.render().splitlines()[2:], [
+            'test_bytes{path="a"} 10.0',
+            'test_bytes{path="c"} 5.0',
+        ])
+        g = metrics.Gauge('test_bytes', 'A test.')
+        g.set(1)
+        self.assertEqual(g.render().splitlines()[2:], ['test_bytes 1.0'])
+        self.assertRaises(RuntimeError, metrics.Metric('m', 'M.').samples)
+
+    def test_instrument_config(self):
+        f = self.gen_new_filename()
+        c = Config(f, batch=True)
+        metrics.instrument(c, self.registry)
+        metrics.instrument(c, self.registry)
+        c.mykey = 'value'
+        c.mykey
+        c.get('mykey')
+        del c.mykey
+        c.add_option('port', default='80')
+        self.assertEqual(c.port, '80')
+        c.reload()
+
+        r = self.registry
+        label = 'XmlStorageBackend'
+        self.assertEqual(r.operations.value(label, 'get'), 3)
+        self.assertEqual(r.operations.value(label, 'set'), 2)
+        self.assertEqual(r.operations.value(label, 'delete'), 1)
+        self.assertEqual(r.reloads.value(label), 1)
+        self.assertEqual(r.prompts.value(), 1)
+        self.assertEqual(r.sync_seconds.children[(label,)].count, 3)
+        text = r.exposition()
+        self.assertIn('creoconfig_file_size_bytes{backend="%s",path="%s"} '
+                      '%s' % (label, os.path.abspath(f),
+                              float(os.path.getsize(f))), text)
+        # Config values are not touched by the instrumentation
+        self.assertEqual(list(c), ['port'])
+
+    def test_signature_mismatch(self):
+        f = self.gen_new_filename()
+        b = XmlStorageBackend(f)
+        b.set('mykey', 'value')
+        b.store['mykey'].value = 'edited'
+        metrics.instrument_backend(b, self.registry)
+        b.last_modified('mykey')
+        self.assertEqual(self.registry.signature_mismatches.value(
+            'XmlStorageBackend'), 1)
+
+    def test_file_size_removed(self):
+        f = self.gen_new_filename()
+        b = metrics.instrument_backend(XmlStorageBackend(f), self.registry)
+        b.set('mykey', 'value')
+        self.assertEqual(len(self.registry.file_size.children), 1)
+        del b
+        gc.collect()
+        self.assertEqual(self.registry.file_size.children, {})
+
+    def test_traced_after_instrument(self):
+        b = metrics.instrument_backend(MemStorageBackend(), self.registry)
+        spans = []
+        with tracing.traced(spans.append):
+            b.set('mykey', 'value')
+            self.assertEqual(b.get('mykey'), 'value')
+        self.assertEqual([s.op for s in spans], ['set', 'get'])
+        self.assertEqual(self.registry.operations.value(
+            'MemStorageBackend', 'get'), 1)
+
+    def test_uninstrumented(self):
+        c = Config()
+        c.mykey = 'value'
+        self.assertFalse(hasattr(c._store, '_metrics'))
+        self.assertNotIn('get', c._store.__dict__)
+
+    def test_serve(self):
+        server = metrics.serve(0, registry=self.registry)
+        try:
+            self.registry.reloads.child('test').inc()
+            url = 'http://127.0.0.1:%d' % server.server_port
+            response = urllib2.urlopen(url + '/metrics')
+            self.assertTrue(response.info()['Content-Type'].startswith(
+                'text/plain; version=0.0.4'))
+            self.assertIn('creoconfig_reloads_total{backend="test"} 1.0',
+                          response.read())
+            self.assertRaises(urllib2.HTTPError, urllib2.urlopen,
+                              url + '/other')
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
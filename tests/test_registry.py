@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+"""
+UnitTest framework for validating the backend registry
+"""
+import os
+import sys
+import base64
+import subprocess
+try:
+    import unittest2 as unittest
+except:
+    import unittest
+from mock import patch
+from creoconfig import Config, registry
+from creoconfig.registry import *
+from creoconfig.registry import _shared
+from creoconfig.lazyimport import LazyModule, is_available
+from creoconfig.storagebackend import *
+
+
+class TestCaseRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.files = []
+
+    def gen_new_filename(self, base='tmp_%s.xml'):
+        f = base % base64.b16encode(os.urandom(16))
+        self.files.append(f)
+        return f
+
+    def test_parse_uri(self):
+        self.assertEqual(parse_uri('settings.xml'), ('xml', 'settings.xml', {}))
+        self.assertEqual(parse_uri('mem://'), ('mem', '', {}))
+        self.assertEqual(parse_uri('ini:///etc/app.cfg?section=app'),
+                         ('ini', '/etc/app.cfg', {'section': 'app'}))
+        self.assertEqual(parse_uri('xml://a.xml?hashentries=false'),
+                         ('xml', 'a.xml', {'hashentries': False}))
+
+    def test_open_backend(self):
+        self.assertIsInstance(open_backend('mem://'), MemStorageBackend)
+        f = self.gen_new_filename(base='tmp_%s.json')
+        s = open_backend('json://' + f)
+        self.assertIsInstance(s, JsonStorageBackend)
+        self.assertEqual(s.filename, f)
+        s = open_backend(self.gen_new_filename())
+        self.assertIsInstance(s, XmlStorageBackend)
+        f = self.gen_new_filename(base='tmp_%s.ini')
+        s = open_backend('multiini://%s?default=app' % f)
+        self.assertIsInstance(s, IniStorageBackend)
+        self.assertEqual(s.default, 'app')
+
+    def test_open_backend_kwargs(self):
+        f = self.gen_new_filename(base='tmp_%s.cfg')
+        s = open_backend('ini://%s?section=app' % f, autosync=False)
+        self.assertEqual(s.section, 'app')
+        self.assertFalse(s.autosync)
+
+    def test_unknown_scheme(self):
+        self.assertRaises(ValueError, open_backend, 'nosuch://path')
+
+    @patch.dict(registry._backends)
+    def test_register_backend(self):
+        register_backend('test', 'creoconfig.storagebackend:MemStorageBackend')
+        self.assertIs(get_backend('test'), MemStorageBackend)
+        register_backend('test2', JsonStorageBackend)
+        self.assertIs(get_backend('TEST2'), JsonStorageBackend)
+
+    def test_register_backend_restored(self):
+        self.test_register_backend()
+        self.assertRaises(ValueError, get_backend, 'test')
+
+    def test_config_uri(self):
+        f = self.gen_new_filename(base='tmp_%s.json')
+        c = Config('json://' + f)
+        c.mykey = 'myvalue'
+        self.assertIsInstance(c._store, JsonStorageBackend)
+        self.assertEqual(Config('json://' + f).mykey, 'myvalue')
+
+    def test_open_shared(self):
+        f = self.gen_new_filename(base='tmp_%s.json')
+        a = open_shared('json://' + f)
+        self.assertIs(open_shared('json://' + os.path.abspath(f)), a)
+        self.assertIsNot(open_shared('json://' + f, hashentries=False), a)
+        self.assertIsNot(open_backend('json://' + f), a)
+
+    def test_shared_config(self):
+        f = self.gen_new_filename(base='tmp_%s.json')
+        a = Config('json://' + f, shared=True)
+        b = Config('json://' + f, shared=True)
+        self.assertIs(a._store, b._store)
+        a.mykey = 'myvalue'
+        self.assertEqual(b.mykey, 'myvalue')
+        del b.mykey
+        self.assertRaises(AttributeError, getattr, a, 'mykey')
+        self.assertIsNot(Config('json://' + f)._store, a._store)
+
+    def test_shared_released(self):
+        import gc
+        f = self.gen_new_filename(base='tmp_%s.json')
+        a = open_shared('json://' + f)
+        del a
+        gc.collect()
+        self.assertFalse(any(b.filename == f for b in
+                             _shared.values()))
+
+    def test_shared_reload_on_external_change(self):
+        f = self.gen_new_filename(base='tmp_%s.json')
+        a = Config('json://' + f, shared=True)
+        a.mykey = 'old'
+        other = JsonStorageBackend(f)
+        other.set('mykey', 'new')
+        os.utime(f, (0, 0))
+        b = Config('json://' + f, shared=True)
+        self.assertIs(a._store, b._store)
+        self.assertEqual(a.mykey, 'new')
+
+    def tearDown(self):
+        while len(self.files):
+            try:
+                os.remove(self.files.pop())
+            except OSError:
+                pass
+
+
+class TestCaseLazyImport(unittest.TestCase):
+
+    def test_lazy_module(self):
+        m = LazyModule('nosuchmodule', 'string')
+        self.assertTrue(repr(m).startswith('<lazy module'))
+        self.assertEqual(m.ascii_lowercase, 'abcdefghijklmnopqrstuvwxyz')
+        self.assertTrue(is_available(m))
+
+    def test_lazy_module_missing(self):
+        m = LazyModule('nosuchmodule')
+        self.assertFalse(is_available(m))
+        self.assertRaises(ImportError, getattr, m, 'anything')
+
+    def test_import_is_light(self):
+        code = ("import sys; from creoconfig import Config; Config().a = 1; "
+                "print(' '.join(m for m in ['readline', 'ConfigParser', "
+                "'hmac', 'xml.dom.minidom', 'xml.etree.ElementTree'] "
+                "if m in sys.modules))")
+        out = subprocess.check_output([sys.executable, '-c', code])
+        self.assertEqual(out.strip(), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
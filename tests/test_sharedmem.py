@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""
+UnitTest framework for validating the shared memory config export
+"""
+import os
+import base64
+import multiprocessing
+try:
+    import unittest2 as unittest
+except:
+    import unittest
+from StringIO import StringIO
+from creoconfig import Config, ConfigDiff
+from creoconfig.sharedmem import *
+from creoconfig.exceptions import *
+
+
+def _worker_read(name, key, queue):
+    queue.put(attach(name)[key])
+
+
+class TestCaseSharedMem(unittest.TestCase):
+
+    def setUp(self):
+        self.name = 'tmp_creoconfig_%s' % base64.b16encode(os.urandom(8))
+        self.config = Config(defaults={'foo': 'bar', 'alpha': 'beta'})
+        self.config['db.host'] = 'localhost'
+        self.publisher = publish(self.config, self.name)
+
+    def test_segment_path(self):
+        self.assertEqual(segment_path('/tmp/mysegment'), '/tmp/mysegment')
+        self.assertTrue(segment_path('mysegment').endswith('/mysegment'))
+
+    def test_attach_get(self):
+        c = attach(self.name)
+        self.assertEqual(c.foo, 'bar')
+        self.assertEqual(c['alpha'], 'beta')
+        self.assertEqual(c['db.host'], 'localhost')
+        self.assertEqual(len(c), 3)
+        self.assertItemsEqual(c.keys(), ['foo', 'alpha', 'db.host'])
+        self.assertRaises(KeyError, lambda: c['missing'])
+        self.assertRaises(AttributeError, getattr, c, 'missing')
+
+    def test_empty_config(self):
+        publisher = publish({}, self.name + '_empty')
+        try:
+            c = attach(self.name + '_empty')
+            self.assertEqual(len(c), 0)
+            self.assertEqual(list(c), [])
+            self.assertRaises(KeyError, lambda: c['foo'])
+            self.assertRaises(ReadOnlyError, c.__setitem__, 'foo', 'bar')
+            c._store.close()
+        finally:
+            publisher.close(unlink=True)
+
+    def test_read_only(self):
+        c = attach(self.name)
+        self.assertRaises(ReadOnlyError, c.__setitem__, 'foo', 'baz')
+        self.assertRaises(ReadOnlyError, c.__delitem__, 'foo')
+
+    def test_read_only_config_api(self):
+        c = attach(self.name, auto_reattach=False)
+        patch = ConfigDiff({'new': 'value'}, {}, {})
+        self.assertRaises(ReadOnlyError, c.apply_patch, patch)
+        self.assertRaises(ReadOnlyError, c.set, 'foo', 'baz', ttl=60)
+        self.assertRaises(ReadOnlyError, c.import_,
+                          StringIO('["foo", "baz"]\n'))
+        self.assertEqual(c.evict_expired(), [])
+        self.config['foo'] = 'updated'
+        self.publisher.publish(self.config)
+        self.assertEqual(c.foo, 'bar')
+        c.reload()
+        self.assertEqual(c.foo, 'updated')
+
+    def test_generation(self):
+        s = SharedMemStorageBackend(self.name)
+        self.assertEqual(s.generation, 1)
+        self.assertFalse(s.stale())
+        self.config['foo'] = 'updated'
+        self.assertEqual(self.publisher.publish(self.config), 2)
+        self.assertTrue(s.stale())
+        # Still reads the old snapshot until it re-attaches
+        self.assertEqual(s['foo'], 'bar')
+        self.assertTrue(s.refresh())
+        self.assertEqual(s['foo'], 'updated')
+        self.assertFalse(s.refresh())
+
+    def test_auto_reattach(self):
+        c = attach(self.name, auto_reattach=True)
+        self.assertEqual(c.foo, 'bar')
+        self.config['foo'] = 'updated'
+        self.publisher.publish(self.config)
+        self.assertEqual(c.foo, 'updated')
+
+    def test_invalid_segment(self):
+        path = segment_path(self.name + '_bad')
+        with open(path, 'wb') as f:
+            f.write('x' * HEADER.size)
+        try:
+            self.assertRaises(ConfigException, SharedMemStorageBackend, path)
+        finally:
+            os.remove(path)
+
+    def test_worker_process(self):
+        queue = multiprocessing.Queue()
+        p = multiprocessing.Process(target=_worker_read,
+                                    args=(self.name, 'db.host', queue))
+        p.start()
+        p.join()
+        self.assertEqual(queue.get(timeout=5), 'localhost')
+
+    def test_uri(self):
+        c = Config('shm://' + self.name)
+        self.assertEqual(c.foo, 'bar')
+
+    def tearDown(self):
+        self.publisher.close(unlink=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
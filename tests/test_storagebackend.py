@@ -4,11 +4,15 @@ UnitTest framework for validating StorageBackends
 """
 import os
 import base64
+import shutil
 try:
     import unittest2 as unittest
 except:
     import unittest
+from mock import patch
 from creoconfig.storagebackend import *
+from creoconfig import compression
+from creoconfig import storagebackend
 
 
 class TestCaseMemStorageBackend(unittest.TestCase):
@@ -142,6 +146,62 @@ class TestCaseXMLStorageBackend(TestCaseMemStorageBackend):
                 pass
 
 
+class TestCaseXmlRecordStore(unittest.TestCase):
+
+    def setUp(self):
+        self.filename = 'tmp_%s.xml' % base64.b16encode(os.urandom(16))
+
+    def test_overwrite_persistance(self):
+        s = XmlStorageBackend(self.filename)
+        s.set('mykey', 'old')
+        s.set('mykey', 'new')
+        s = XmlStorageBackend(self.filename)
+        self.assertEqual(s.get('mykey'), 'new')
+        self.assertEqual(len(s), 1)
+
+    def test_last_modified(self):
+        s = XmlStorageBackend(self.filename)
+        s.set('mykey', 'myval')
+        ts = s.last_modified('mykey')
+        self.assertEqual(XmlStorageBackend(self.filename).last_modified(
+            'mykey'), ts)
+
+    def test_file_order_kept(self):
+        s = XmlStorageBackend(self.filename, autosync=False)
+        for key in ['c', 'a', 'b']:
+            s.set(key, 'myval')
+        s.delete('a')
+        s.set('a', 'myval')
+        s.sync()
+        s = XmlStorageBackend(self.filename)
+        self.assertEqual([r.name for r in s.records()], ['c', 'b', 'a'])
+
+    def test_order_without_sync(self):
+        s = XmlStorageBackend(self.filename, autosync=False)
+        for i in range(100):
+            s.set('mykey', i)
+            s.delete('mykey')
+        s.set('other', 'myval')
+        self.assertLessEqual(len(s.order), 2 * len(s) + 16)
+        self.assertEqual([r.name for r in s.records()], ['other'])
+
+    def test_duplicate_children(self):
+        # Older versions appended a name and value for every overwrite
+        with open(self.filename, 'w') as f:
+            f.write('<config version="1.0.0"><var>'
+                    '<name>mykey</name><value type="str">old</value>'
+                    '<name>mykey</name><value type="str">new</value>'
+                    '</var></config>')
+        s = XmlStorageBackend(self.filename)
+        self.assertEqual(s.get('mykey'), 'new')
+
+    def tearDown(self):
+        try:
+            os.remove(self.filename)
+        except OSError:
+            pass
+
+
 class TestCaseConfigParserStorageBackend(TestCaseXMLStorageBackend):
 
     def setUp(self):
@@ -240,6 +300,288 @@ class TestCaseConfigParserStorageBackend(TestCaseXMLStorageBackend):
         self.assertEqual(len(s), 1)
 
 
+class TestCaseGzipXMLStorageBackend(TestCaseXMLStorageBackend):
+
+    def setUp(self):
+        self.files = []
+        self.filename = self.gen_new_filename(base='tmp_%s.xml.gz')
+        self.s = XmlStorageBackend(self.filename)
+
+    def test_file_is_compressed(self):
+        self.s.set('mykey', 'myval')
+        self.assertEqual(compression.detect(self.filename), 'gzip')
+
+    def test_detect_by_magic(self):
+        # Content is detected even if the extension does not match
+        filename = self.gen_new_filename(base='tmp_%s.xml')
+        s = XmlStorageBackend(filename, compression='bz2')
+        s.set('mykey', 'myval')
+        self.assertEqual(compression.detect(filename), 'bz2')
+        s = XmlStorageBackend(filename)
+        self.assertEqual(s.get('mykey'), 'myval')
+        s.set('mykey2', 'myval2')
+        self.assertEqual(compression.detect(filename), 'bz2')
+
+    def test_plain_file_with_extension(self):
+        filename = self.gen_new_filename(base='tmp_%s.xml.gz')
+        s = XmlStorageBackend(filename, compression=compression.PLAIN)
+        s.set('mykey', 'myval')
+        self.assertEqual(compression.detect(filename), None)
+        s = XmlStorageBackend(filename)
+        self.assertEqual(s.get('mykey'), 'myval')
+
+
+class TestCaseBz2ConfigParserStorageBackend(
+        TestCaseConfigParserStorageBackend):
+
+    def setUp(self):
+        self.files = []
+        self.filename = self.gen_new_filename(base='tmp_%s.cfgparser.bz2')
+        self.s = ConfigParserStorageBackend(self.filename)
+
+    def test_file_is_compressed(self):
+        self.s.set('mykey', 'myval')
+        self.assertEqual(compression.detect(self.filename), 'bz2')
+
+
+class TestCaseCompression(unittest.TestCase):
+
+    def test_codec_for_extension(self):
+        self.assertEqual(compression.codec_for_extension('a.xml.gz'), 'gzip')
+        self.assertEqual(compression.codec_for_extension('a.BZ2'), 'bz2')
+        self.assertEqual(compression.codec_for_extension('a.xz'), 'lzma')
+        self.assertEqual(compression.codec_for_extension('a.xml'), None)
+
+    def test_unknown_codec(self):
+        self.assertRaises(ValueError, compression.open_file,
+            'tmp_unused.xml', 'wb', 'zip')
+
+
+class TestCaseJsonStorageBackend(TestCaseXMLStorageBackend):
+
+    def setUp(self):
+        self.files = []
+        self.filename = self.gen_new_filename(base='tmp_%s.json')
+        self.s = JsonStorageBackend(self.filename)
+
+    def test_data_persistance(self):
+        s = JsonStorageBackend(self.filename)
+        s.set('mykeys', 'myvalues')
+        s.set('intkey', 123)
+        s = JsonStorageBackend(self.filename)
+        self.assertEqual(len(s), 2)
+        self.assertEqual(s.get('mykeys'), 'myvalues')
+        self.assertEqual(s.get('intkey'), '123')
+        self.assertEqual(s.store['intkey'][1], 'int')
+        del s['mykeys']
+        s = JsonStorageBackend(self.filename)
+        self.assertRaises(KeyError, s.get, 'mykeys')
+        self.assertEqual(len(s), 1)
+
+    def test_last_modified(self):
+        self.s.set('mykey', 'myval')
+        ts = self.s.last_modified('mykey')
+        self.assertEqual(ts, self.s.store['mykey'][2])
+        self.assertRaises(KeyError, self.s.last_modified, 'badkey')
+
+    def test_last_modified_tampered(self):
+        self.s.set('mykey', 'myval')
+        self.s.store['mykey'][0] = 'altered'
+        ts = self.s.store['mykey'][2]
+        self.assertNotEqual(self.s.last_modified('mykey'), ts)
+
+    def test_no_hashentries(self):
+        s = JsonStorageBackend(self.filename, hashentries=False)
+        s.set('mykey', 'myval')
+        self.assertEqual(s.store['mykey'], ['myval', 'str'])
+        self.assertEqual(s.last_modified('mykey'), None)
+
+    def test_invalid_file(self):
+        with open(self.filename, 'w') as f:
+            f.write('{not json')
+        self.assertRaises(RuntimeError, JsonStorageBackend, self.filename)
+
+    def test_non_ascii_reopen(self):
+        self.s.set('k', '\xc3\xa9')
+        self.s.set(u'caf\xe9', u'\xe9')
+        s = JsonStorageBackend(self.filename)
+        self.assertEqual(s.get('k'), '\xc3\xa9')
+        self.assertIsInstance(s.get('k'), str)
+        self.assertEqual(s.get('caf\xc3\xa9'), '\xc3\xa9')
+        self.assertEqual(s.last_modified('k'), s.store['k'][2])
+        self.assertEqual(s.last_modified('caf\xc3\xa9'),
+                         s.store['caf\xc3\xa9'][2])
+
+    def test_unsupported_version(self):
+        with patch.object(storagebackend, 'logger') as logger:
+            JsonStorageBackend(self.filename)
+            self.assertFalse(logger.warn.called)
+            with open(self.filename, 'w') as f:
+                f.write('{"version": "0.1", "vars": {}}')
+            JsonStorageBackend(self.filename)
+            self.assertTrue(logger.warn.called)
+
+
+class TestCaseShardedStorageBackend(TestCaseXMLStorageBackend):
+
+    def setUp(self):
+        self.files = []
+        self.filename = self.gen_new_filename(base='tmp_%s.shards')
+        self.s = ShardedStorageBackend(self.filename)
+
+    def test_data_persistance(self):
+        s = ShardedStorageBackend(self.filename)
+        s.set('db.host', 'localhost')
+        s.set('web.port', '8080')
+        s.set('toplevel', 'value')
+        self.assertItemsEqual(os.listdir(self.filename),
+            ['db.xml', 'web.xml', 'DEFAULT.xml'])
+
+        s = ShardedStorageBackend(self.filename)
+        self.assertEqual(len(s), 3)
+        self.assertEqual(s.get('db.host'), 'localhost')
+        self.assertEqual(s.get('web.port'), '8080')
+        self.assertEqual(s.get('toplevel'), 'value')
+        del s['db.host']
+
+        s = ShardedStorageBackend(self.filename)
+        self.assertRaises(KeyError, s.get, 'db.host')
+        self.assertEqual(len(s), 2)
+
+    def test_lazy_shard_loading(self):
+        s = ShardedStorageBackend(self.filename)
+        s.set('db.host', 'localhost')
+        s.set('web.port', '8080')
+
+        s = ShardedStorageBackend(self.filename)
+        self.assertEqual(s.shards, {})
+        self.assertEqual(s.get('db.host'), 'localhost')
+        self.assertEqual(list(s.shards), ['db'])
+
+    def test_sync_only_dirty_shards(self):
+        s = ShardedStorageBackend(self.filename, autosync=False)
+        s.set('db.host', 'localhost')
+        s.set('web.port', '8080')
+        self.assertEqual(os.listdir(self.filename), [])
+        s.sync()
+        self.assertItemsEqual(os.listdir(self.filename),
+            ['db.xml', 'web.xml'])
+
+        web = os.path.join(self.filename, 'web.xml')
+        os.remove(web)
+        s.set('db.user', 'admin')
+        s.sync()
+        self.assertFalse(os.path.exists(web))
+        self.assertFalse(s.dirty)
+
+    def test_invalid_namespace(self):
+        self.assertRaises(KeyError, self.s.set, '../escape.key', 'myval')
+        self.assertRaises(KeyError, self.s.get, '.hidden')
+
+    def tearDown(self):
+        shutil.rmtree(self.filename, ignore_errors=True)
+
+
+class TestCaseIniStorageBackend(TestCaseXMLStorageBackend):
+
+    def setUp(self):
+        self.files = []
+        self.filename = self.gen_new_filename(base='tmp_%s.ini')
+        self.s = IniStorageBackend(self.filename)
+
+    def test_data_persistance(self):
+        s = IniStorageBackend(self.filename)
+        s.set('db.host', 'localhost')
+        s.set('db.port', '5432')
+        s.set('toplevel', 'multi\nline')
+        self.assertFalse(os.path.exists(self.filename))
+        s.close()
+
+        s = IniStorageBackend(self.filename)
+        self.assertEqual(s.section_names(), ['db', 'DEFAULT'])
+        self.assertEqual(len(s), 3)
+        self.assertEqual(s.get('db.host'), 'localhost')
+        self.assertEqual(s.get('toplevel'), 'multi\nline')
+        del s['db.host']
+        s.sync()
+
+        s = IniStorageBackend(self.filename)
+        self.assertRaises(KeyError, s.get, 'db.host')
+        self.assertEqual(len(s), 2)
+
+    def test_read_configparser_file(self):
+        with open(self.filename, 'w') as f:
+            f.write('# comment\n[DEFAULT]\nname: value\n\n'
+                    '[app]\nport = 80\nmotd = hello\n  world\n')
+        s = IniStorageBackend(self.filename)
+        self.assertItemsEqual(s.items(), [
+            ('name', 'value'), ('app.port', '80'),
+            ('app.motd', 'hello\nworld')])
+
+    def test_invalid_file(self):
+        with open(self.filename, 'w') as f:
+            f.write('no section = here\n')
+        self.assertRaises(RuntimeError, IniStorageBackend, self.filename)
+
+    def test_section_view(self):
+        app = self.s.section('app')
+        self.assertIs(app, self.s.section('app'))
+        self.assertEqual(len(app), 0)
+        app['port'] = 80
+        self.assertEqual(self.s.get('app.port'), '80')
+        self.s.set('app.host', 'localhost')
+        self.assertEqual(dict(app), {'port': '80', 'host': 'localhost'})
+        del app['port']
+        self.assertRaises(KeyError, app.__getitem__, 'port')
+        self.assertEqual(len(self.s), 1)
+
+    def test_default_section(self):
+        s = IniStorageBackend(self.filename, default='app')
+        s.set('port', '80')
+        self.assertEqual(s.section('app')['port'], '80')
+        self.assertEqual(list(s), ['port'])
+
+    def test_single_write(self):
+        for i in range(10):
+            self.s.set('section%d.key' % i, i)
+        self.assertTrue(self.s.dirty)
+        self.assertFalse(os.path.exists(self.filename))
+        self.s.sync()
+        self.assertFalse(self.s.dirty)
+        self.assertEqual(len(IniStorageBackend(self.filename)), 10)
+
+    def test_sync_at_exit(self):
+        self.s.set('app.host', 'localhost')
+        self.assertIn(id(self.s), storagebackend._dirty_at_exit)
+        storagebackend._sync_at_exit()
+        self.assertEqual(IniStorageBackend(self.filename).get('app.host'),
+                         'localhost')
+        self.assertNotIn(id(self.s), storagebackend._dirty_at_exit)
+        self.s.close()
+        self.s.set('app.port', '80')
+        self.assertIn(id(self.s), storagebackend._dirty_at_exit)
+
+    def test_sync_when_collected(self):
+        s = IniStorageBackend(self.filename)
+        s.section('app')['host'] = 'localhost'
+        del s
+        self.assertEqual(IniStorageBackend(self.filename).get('app.host'),
+                         'localhost')
+
+    def test_no_sync_after_remove(self):
+        self.s.sync()
+        self.s.set('app.host', 'otherhost')
+        os.remove(self.filename)
+        storagebackend._sync_at_exit()
+        self.assertFalse(os.path.exists(self.filename))
+        self.assertTrue(self.s.dirty)
+
+    def tearDown(self):
+        # Pending changes are written when the backend is dropped
+        del self.s
+        super(TestCaseIniStorageBackend, self).tearDown()
+
+
 def _alter_str(data, pos=0, incr=1, num=1):
     """Alters a string at the given position by incrementing the char"""
     start = pos
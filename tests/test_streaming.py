@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+"""
+UnitTest framework for validating streaming export and import
+"""
+import os
+import base64
+from StringIO import StringIO
+try:
+    import unittest2 as unittest
+except:
+    import unittest
+from mock import patch
+from creoconfig import Config
+from creoconfig import streaming
+from creoconfig.storagebackend import XmlStorageBackend
+
+
+ITEMS = [
+    ('toplevel', 'value'),
+    ('db.host', 'localhost'),
+    ('db.port', '5432'),
+    ('web.motd', 'hello\nworld & <friends>'),
+]
+
+
+class TestCaseStreaming(unittest.TestCase):
+
+    def setUp(self):
+        self.files = []
+
+    def gen_new_filename(self, base='tmp_%s.json'):
+        f = base % base64.b16encode(os.urandom(16))
+        self.files.append(f)
+        return f
+
+    def roundtrip(self, format):
+        stream = StringIO()
+        self.assertEqual(streaming.export(iter(ITEMS), stream, format), 4)
+        stream.seek(0)
+        return list(streaming.read(stream, format))
+
+    def test_jsonl(self):
+        self.assertEqual(self.roundtrip('jsonl'), ITEMS)
+
+    def test_ini(self):
+        self.assertEqual(self.roundtrip('ini'), ITEMS)
+
+    def test_xml(self):
+        items = [(k, v.strip()) for k, v in ITEMS]
+        self.assertEqual(self.roundtrip('xml'), items)
+
+    def test_xml_readable_by_backend(self):
+        filename = self.gen_new_filename(base='tmp_%s.xml')
+        with open(filename, 'wb') as f:
+            streaming.export(iter(ITEMS), f, 'xml')
+        s = XmlStorageBackend(filename)
+        self.assertEqual(len(s), 4)
+        self.assertEqual(s.get('db.host'), 'localhost')
+
+    def test_unknown_format(self):
+        self.assertRaises(ValueError, streaming.export, ITEMS, StringIO(),
+                          'yaml')
+        self.assertRaises(ValueError, streaming.read, StringIO(), 'yaml')
+
+    def test_invalid_input(self):
+        stream = StringIO('no section = here\n')
+        self.assertRaises(ValueError, list, streaming.read(stream, 'ini'))
+        stream = StringIO('["key", "value"]\n{broken\n')
+        self.assertRaises(ValueError, list, streaming.read(stream, 'jsonl'))
+
+    def test_chunks(self):
+        self.assertEqual(list(streaming.chunks(range(5), 2)),
+                         [[0, 1], [2, 3], [4]])
+
+    def test_config_export(self):
+        c = Config(defaults={'fromdefault': 'd', 'mykey': 'default'})
+        c.mykey = 'myvalue'
+        stream = StringIO()
+        self.assertEqual(c.export(stream), 2)
+        stream.seek(0)
+        self.assertItemsEqual(streaming.read(stream),
+            [('mykey', 'myvalue'), ('fromdefault', 'd')])
+
+    def test_config_import_chunks(self):
+        stream = StringIO()
+        items = [('key%d' % i, 'value%d' % i) for i in range(25)]
+        streaming.export(iter(items), stream, 'jsonl')
+        stream.seek(0)
+        c = Config('json://' + self.gen_new_filename())
+        with patch.object(c._store, 'sync', wraps=c._store.sync) as sync:
+            self.assertEqual(c.import_(stream, chunk_size=10), 25)
+        self.assertEqual(sync.call_count, 3)
+        self.assertEqual(len(c), 25)
+        self.assertEqual(c.key24, 'value24')
+
+    def test_config_copy(self):
+        a = Config('json://' + self.gen_new_filename())
+        for k, v in ITEMS:
+            a[k] = v
+        stream = StringIO()
+        a.export(stream, 'ini')
+        stream.seek(0)
+        b = Config()
+        b.import_(stream, 'ini')
+        self.assertItemsEqual(b.items(), ITEMS)
+
+    def test_config_non_ascii_roundtrip(self):
+        items = [('motd', 'caf\xc3\xa9'), ('caf\xc3\xa9', 'na\xc3\xafve')]
+        for format in ['jsonl', 'xml', 'ini']:
+            a = Config('json://' + self.gen_new_filename())
+            for k, v in items:
+                a[k] = v
+            stream = StringIO()
+            a.export(stream, format)
+            stream.seek(0)
+            b = Config()
+            self.assertEqual(b.import_(stream, format), 2)
+            self.assertItemsEqual(b.items(), items)
+            self.assertTrue(all(type(v) is str
+                                for v in b._store.store.values()))
+
+    def tearDown(self):
+        while len(self.files):
+            try:
+                os.remove(self.files.pop())
+            except OSError:
+                pass
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+"""
+UnitTest framework for validating Config change subscriptions
+"""
+import os
+import base64
+try:
+    import unittest2 as unittest
+except:
+    import unittest
+from creoconfig import Config
+from creoconfig.subscriptions import *
+from creoconfig.storagebackend import JsonStorageBackend
+
+
+class TestCaseSubscriptionIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = SubscriptionIndex()
+        self.events = []
+
+    def callback(self, event):
+        self.events.append(event)
+
+    def test_prefix(self):
+        sub = self.index.add('db_', self.callback)
+        self.assertEqual(sub.prefix, 'db_')
+        self.assertEqual(self.index.match('db_host'), [sub])
+        self.assertEqual(self.index.match('db_'), [sub])
+        self.assertEqual(self.index.match('web_host'), [])
+        self.assertEqual(self.index.match('db'), [])
+
+    def test_glob(self):
+        sub = self.index.add('db_*_port', self.callback)
+        self.assertEqual(sub.prefix, 'db_')
+        self.assertEqual(self.index.match('db_master_port'), [sub])
+        self.assertEqual(self.index.match('db_master_host'), [])
+        sub2 = self.index.add('*', self.callback)
+        self.assertEqual(sub2.prefix, '')
+        self.assertItemsEqual(self.index.match('db_master_port'), [sub, sub2])
+
+    def test_cancel(self):
+        sub = self.index.add('db_', self.callback)
+        sub2 = self.index.add('db_', self.callback)
+        self.assertEqual(len(self.index), 2)
+        sub.cancel()
+        self.assertEqual(self.index.match('db_host'), [sub2])
+        sub2.cancel()
+        self.assertEqual(len(self.index), 0)
+        self.assertEqual(self.index.match('db_host'), [])
+
+    def test_notify(self):
+        self.index.add('db_', self.callback)
+        self.index.notify('set', 'db_host', 'localhost')
+        self.index.notify('set', 'web_host', 'localhost')
+        self.assertEqual(self.events, [('set', 'db_host', 'localhost')])
+
+    def test_failing_callback(self):
+        def fail(event):
+            raise RuntimeError("subscriber bug")
+        self.index.add('db_', fail)
+        self.index.add('db_', self.callback)
+        self.index.notify('delete', 'db_host')
+        self.assertEqual(self.events, [('delete', 'db_host', None)])
+
+    def test_queued(self):
+        self.index.add('db_', self.callback, queued=True)
+        self.index.notify('set', 'db_host', 'localhost')
+        self.index.join()
+        self.assertEqual(self.events, [('set', 'db_host', 'localhost')])
+
+
+class TestCaseConfigSubscribe(unittest.TestCase):
+
+    def setUp(self):
+        self.files = []
+        self.events = []
+
+    def callback(self, event):
+        self.events.append(event)
+
+    def test_no_subscribers(self):
+        c = Config()
+        c.mykey = 'myvalue'
+        self.assertIs(c._subscriptions, None)
+
+    def test_set_delete(self):
+        c = Config()
+        c.subscribe('my*', self.callback)
+        c.mykey = 123
+        c['other'] = 'value'
+        del c.mykey
+        self.assertEqual(self.events, [
+            ('set', 'mykey', '123'),
+            ('delete', 'mykey', None),
+        ])
+
+    def test_unsubscribe(self):
+        c = Config()
+        sub = c.subscribe('my', self.callback)
+        c.mykey = 'a'
+        self.assertTrue(c.unsubscribe(sub))
+        c.mykey = 'b'
+        self.assertEqual(len(self.events), 1)
+
+    def test_queued(self):
+        c = Config()
+        c.subscribe('my', self.callback, queued=True)
+        c.mykey = 'a'
+        c._subscriptions.join()
+        self.assertEqual(self.events, [('set', 'mykey', 'a')])
+
+    def test_reload(self):
+        f = 'tmp_%s.json' % base64.b16encode(os.urandom(16))
+        self.files.append(f)
+        c = Config('json://' + f)
+        c.mykey = 'first'
+        c.removed = 'value'
+        c.subscribe('', self.callback)
+        other = JsonStorageBackend(f)
+        other.set('mykey', 'second')
+        other.set('added', 'value')
+        other.delete('removed')
+        self.assertTrue(c.reload())
+        self.assertEqual(c.mykey, 'second')
+        self.assertItemsEqual(self.events, [
+            ('set', 'mykey', 'second'),
+            ('set', 'added', 'value'),
+            ('delete', 'removed', None),
+        ])
+
+    def tearDown(self):
+        while len(self.files):
+            try:
+                os.remove(self.files.pop())
+            except OSError:
+                pass
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+"""
+UnitTest framework for validating the tracing hooks
+"""
+import os
+import base64
+try:
+    import unittest2 as unittest
+except:
+    import unittest
+from creoconfig import Config, tracing
+from creoconfig.storagebackend import (
+    MemStorageBackend,
+    FileStorageBackend,
+    JsonStorageBackend
+)
+
+
+class TestCaseTracing(unittest.TestCase):
+
+    def setUp(self):
+        self.spans = []
+
+    def tearDown(self):
+        for hook in list(tracing._hooks):
+            tracing.remove_hook(hook)
+
+    def ops(self):
+        return [(s.op, s.component, s.key) for s in self.spans]
+
+    def test_disabled_restores_classes(self):
+        originals = [Config.__dict__['get'], MemStorageBackend.__dict__['get'],
+                     FileStorageBackend.__dict__['sign']]
+        self.assertFalse(tracing.is_enabled())
+        with tracing.traced(self.spans.append):
+            self.assertTrue(tracing.is_enabled())
+            self.assertIsNot(Config.__dict__['get'], originals[0])
+        self.assertFalse(tracing.is_enabled())
+        self.assertEqual([Config.__dict__['get'],
+                          MemStorageBackend.__dict__['get'],
+                          FileStorageBackend.__dict__['sign']], originals)
+
+    def test_operations(self):
+        c = Config()
+        with tracing.traced(self.spans.append):
+            c.mykey = 'value'
+            self.assertEqual(c.mykey, 'value')
+            del c['mykey']
+        self.assertEqual(self.ops(), [
+            ('set', 'MemStorageBackend', 'mykey'),
+            ('set', 'Config', 'mykey'),
+            ('get', 'MemStorageBackend', 'mykey'),
+            ('get', 'Config', 'mykey'),
+            ('delete', 'MemStorageBackend', 'mykey'),
+            ('delete', 'Config', 'mykey'),
+        ])
+        self.assertTrue(all(s.duration >= 0 for s in self.spans))
+        # Nothing is traced once the hook is gone
+        c.other = 'value'
+        self.assertEqual(len(self.spans), 6)
+
+    def test_no_nested_spans(self):
+        c = Config()
+        with tracing.traced(self.spans.append):
+            c.set('mykey', 'value')
+        self.assertEqual(self.ops(), [
+            ('set', 'MemStorageBackend', 'mykey'),
+            ('set', 'Config', 'mykey'),
+        ])
+
+    def test_arguments_forwarded(self):
+        b = MemStorageBackend()
+        b.set(None, 'value')
+        with tracing.traced(self.spans.append):
+            self.assertEqual(b.get(None), 'value')
+            self.assertEqual(b.get(key=None), 'value')
+        self.assertEqual(self.ops(), [('get', 'MemStorageBackend', None)] * 2)
+
+    def test_error(self):
+        c = Config(batch=True)
+        tracing.add_hook(self.spans.append)
+        self.assertRaises(KeyError, lambda: c['missing'])
+        self.assertIsInstance(self.spans[-1].error, KeyError)
+        self.assertEqual(self.spans[-1].op, 'get')
+
+    def test_file_operations(self):
+        f = 'tmp_%s.json' % base64.b16encode(os.urandom(16))
+        try:
+            b = JsonStorageBackend(f)
+            tracing.add_hook(self.spans.append)
+            b.set('mykey', 'value')
+            b.last_modified('mykey')
+            JsonStorageBackend(f)
+        finally:
+            if os.path.exists(f):
+                os.remove(f)
+        ops = [(op, key) for op, _, key in self.ops()]
+        self.assertEqual(ops, [('sign', 'mykey'), ('sync', None),
+                               ('set', 'mykey'), ('sign', 'mykey'),
+                               ('validate', 'mykey'),
+                               ('parse', None)])
+
+    def test_failing_hook(self):
+        def broken(span):
+            raise RuntimeError('broken')
+        tracing.add_hook(broken)
+        tracing.add_hook(self.spans.append)
+        c = Config()
+        c.mykey = 'value'
+        self.assertEqual(c.mykey, 'value')
+        self.assertTrue(self.spans)
+
+    def test_remove_unknown(self):
+        self.assertRaises(ValueError, tracing.remove_hook, self.spans.append)
+
+
+if __name__ == '__main__':
+    unittest.main()